@@ -3,11 +3,27 @@ from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.models import Category
+from app.models.transaction import Transaction
 from app.schemas.category import CategoryCreate, CategoryUpdate, CategoryResponse
+from app.services.stats_service import StatsService
+from app.services.stats_cache import invalidate_trip_stats
 
 router = APIRouter()
 
 
+def _bump_category_trips(category_id: int, db: Session) -> list[int]:
+    """
+    分类名称出现在统计响应中：递增用到该分类的行程的统计版本号（不提交），使其ETag失效
+    
+    统计数据本身按分类ID汇总，不需要重算。
+    """
+    trip_ids = [trip_id for trip_id, in db.query(Transaction.trip_id).filter(
+        Transaction.category_id == category_id
+    ).distinct().all()]
+    StatsService.bump_versions(trip_ids, db)
+    return trip_ids
+
+
 @router.get("/", response_model=list[CategoryResponse])
 def list_categories(db: Session = Depends(get_db)):
     categories = db.query(Category).order_by(Category.sort_order).all()
@@ -38,11 +54,15 @@ def update_category(category_id: int, category: CategoryUpdate, db: Session = De
         raise HTTPException(status_code=404, detail="分类不存在")
     
     update_data = category.model_dump(exclude_unset=True)
+    renamed = 'name' in update_data and update_data['name'] != db_category.name
     for key, value in update_data.items():
         setattr(db_category, key, value)
     
+    trip_ids = _bump_category_trips(category_id, db) if renamed else []
     db.commit()
     db.refresh(db_category)
+    
+    invalidate_trip_stats(*trip_ids)
     return db_category
 
 
@@ -52,6 +72,9 @@ def delete_category(category_id: int, db: Session = Depends(get_db)):
     if not db_category:
         raise HTTPException(status_code=404, detail="分类不存在")
     
+    trip_ids = _bump_category_trips(category_id, db)
     db.delete(db_category)
     db.commit()
+    
+    invalidate_trip_stats(*trip_ids)
     return {"message": "分类已删除"}
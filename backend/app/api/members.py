@@ -4,6 +4,9 @@ from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models.member import Member
 from app.schemas.member import MemberCreate, MemberResponse
+from app.services.stats_queue import StatsRefreshQueue
+from app.services.stats_cache import invalidate_trip_stats
+from app.services.settlement_cache import invalidate_settlements
 
 router = APIRouter()
 
@@ -18,8 +21,13 @@ def list_members(trip_id: int, db: Session = Depends(get_db)):
 def create_member(member: MemberCreate, db: Session = Depends(get_db)):
     db_member = Member(**member.model_dump())
     db.add(db_member)
+    # 成员数量变化影响人均统计：重算登记与成员写入同一事务提交
+    StatsRefreshQueue.enqueue(db_member.trip_id, db, commit=False)
     db.commit()
     db.refresh(db_member)
+    
+    invalidate_trip_stats(db_member.trip_id)
+    invalidate_settlements([db_member.trip_id])
     return db_member
 
 
@@ -37,6 +45,11 @@ def delete_member(member_id: int, db: Session = Depends(get_db)):
     if not db_member:
         raise HTTPException(status_code=404, detail="成员不存在")
     
+    trip_id = db_member.trip_id
     db.delete(db_member)
+    StatsRefreshQueue.enqueue(trip_id, db, commit=False)
     db.commit()
+    
+    invalidate_trip_stats(trip_id)
+    invalidate_settlements([trip_id])
     return {"message": "成员已删除"}
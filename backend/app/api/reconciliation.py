@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import func, exists
+from collections import defaultdict
+from typing import Dict, List, Optional
 from datetime import datetime
 
 from app.core.database import get_db
@@ -9,14 +11,95 @@ from app.models.member import Member
 from app.models.wallet import Wallet
 from app.models.transaction_split import TransactionSplit
 from app.models.transaction import Transaction
-from app.schemas.reconciliation import ReconciliationReport, MemberSettlement, WalletReconciliation
+from app.models.wallet_flow import WalletFlow
+from app.schemas.reconciliation import (
+    ReconciliationReport, MemberSettlement, WalletReconciliation, SimulationRequest, SimulationResult
+)
+from app.services.settlement import STRATEGIES, balances_from_targets, solve_settlements
+from app.services.settlement_cache import cached_solve, settlement_cache
+from app.services.split_engine import amount_to_cents, cents_to_amount, split_equal
 
 router = APIRouter()
 
+STRATEGY_PATTERN = "^(" + "|".join(STRATEGIES) + ")$"
+
+
+def _member_names(member_ids, db: Session) -> Dict[int, str]:
+    """一次查询取出成员名称"""
+    if not member_ids:
+        return {}
+    return dict(db.query(Member.id, Member.name).filter(Member.id.in_(set(member_ids))).all())
+
+
+def _spent_by_wallet_member(db: Session, trip_id: Optional[int] = None, wallet_id: Optional[int] = None) -> Dict[tuple, float]:
+    """按 (钱包, 成员) 汇总分摊金额，只统计指定行程或钱包内的交易"""
+    query = db.query(
+        Transaction.wallet_id,
+        TransactionSplit.member_id,
+        func.sum(TransactionSplit.amount)
+    ).join(
+        Transaction, Transaction.id == TransactionSplit.transaction_id
+    )
+    if trip_id is not None:
+        query = query.filter(Transaction.trip_id == trip_id)
+    if wallet_id is not None:
+        query = query.filter(Transaction.wallet_id == wallet_id)
+    rows = query.group_by(Transaction.wallet_id, TransactionSplit.member_id).all()
+    return {(w_id, member_id): float(amount or 0) for w_id, member_id, amount in rows}
+
+
+def _payer_funded_positions(trip_id: int, db: Session) -> Dict[int, int]:
+    """
+    付款人垫付的支出（有付款人且没有钱包扣款流水）形成的成员净额（分）：
+    付款人应收其垫付交易的分摊合计，分摊成员各自应付自己的份额
+    """
+    rows = db.query(
+        Transaction.payer_id,
+        TransactionSplit.member_id,
+        func.sum(TransactionSplit.amount)
+    ).join(
+        Transaction, Transaction.id == TransactionSplit.transaction_id
+    ).filter(
+        Transaction.trip_id == trip_id,
+        Transaction.payer_id.isnot(None),
+        ~exists().where(WalletFlow.transaction_id == Transaction.id)
+    ).group_by(Transaction.payer_id, TransactionSplit.member_id).all()
+    
+    positions = defaultdict(int)
+    for payer_id, member_id, amount in rows:
+        cents = amount_to_cents(float(amount or 0))
+        positions[payer_id] += cents
+        positions[member_id] -= cents
+    return positions
+
+
+def _member_details(wallet_members: List[WalletMember], spent: Dict[tuple, float], names: Dict[int, str]) -> List[dict]:
+    total_balance = sum(wm.balance for wm in wallet_members)
+    details = []
+    for wm in wallet_members:
+        split_amount = spent.get((wm.wallet_id, wm.member_id), 0.0)
+        details.append({
+            "member_id": wm.member_id,
+            "member_name": names.get(wm.member_id, "未知成员"),
+            "current_balance": wm.balance,
+            "total_deposited": wm.balance + split_amount,
+            "total_spent": split_amount,
+            "share_ratio": round(wm.balance / total_balance * 100, 2) if total_balance > 0 else 0
+        })
+    return details
+
+
+@router.get("/cache")
+def get_settlement_cache_stats():
+    """结算方案缓存的命中/未命中/淘汰计数（用于调试）"""
+    return settlement_cache.stats()
+
 
 @router.get("/wallet/{wallet_id}", response_model=WalletReconciliation)
 def get_wallet_reconciliation(
     wallet_id: int,
+    strategy: Optional[str] = Query(None, pattern=STRATEGY_PATTERN, description="结算策略: auto/greedy/exact/heuristic"),
+    time_budget: Optional[float] = Query(None, gt=0, le=10, description="求解时间预算（秒）"),
     db: Session = Depends(get_db)
 ):
     wallet_members = db.query(WalletMember).filter(WalletMember.wallet_id == wallet_id).all()
@@ -28,105 +111,107 @@ def get_wallet_reconciliation(
     if not wallet:
         raise HTTPException(status_code=404, detail="钱包不存在")
     
-    total_balance = sum(wm.balance for wm in wallet_members)
-    
-    member_details = []
-    for wm in wallet_members:
-        member = db.query(Member).filter(Member.id == wm.member_id).first()
-        
-        splits = db.query(TransactionSplit).filter(TransactionSplit.member_id == wm.member_id).all()
-        split_amount = sum(s.amount for s in splits)
-        
-        member_details.append({
-            "member_id": wm.member_id,
-            "member_name": member.name if member else "未知成员",
-            "current_balance": wm.balance,
-            "total_deposited": wm.balance + split_amount,
-            "total_spent": split_amount,
-            "share_ratio": round(wm.balance / total_balance * 100, 2) if total_balance > 0 else 0
-        })
-    
-    settlements = calculate_settlements(wallet_members, db)
+    spent = _spent_by_wallet_member(db, wallet_id=wallet_id)
+    names = _member_names([wm.member_id for wm in wallet_members], db)
     
     return {
         "wallet_id": wallet_id,
         "wallet_name": wallet.name,
         "total_balance": sum(wm.balance for wm in wallet_members),
         "member_count": len(wallet_members),
-        "members": member_details,
-        "settlements": settlements
+        "members": _member_details(wallet_members, spent, names),
+        "settlements": calculate_settlements(wallet_members, names, strategy, time_budget)
     }
 
 
 @router.get("/trip/{trip_id}", response_model=ReconciliationReport)
 def get_trip_reconciliation(
     trip_id: int,
+    strategy: Optional[str] = Query(None, pattern=STRATEGY_PATTERN, description="结算策略: auto/greedy/exact/heuristic"),
+    time_budget: Optional[float] = Query(None, gt=0, le=10, description="求解时间预算（秒）"),
+    settlement_mode: str = Query("wallet", pattern="^(wallet|trip)$", description="结算模式: wallet 按钱包分别结算 / trip 跨钱包净额后统一结算"),
     db: Session = Depends(get_db)
 ):
+    """
+    行程对账 - 查询次数固定（钱包、钱包成员、分摊汇总、成员名称各1次），与成员数和钱包数无关
+    
+    trip 模式下先把每个成员在各钱包的偏差与垫付支出轧差，再生成整个行程唯一的一份转账方案。
+    """
     wallets = db.query(Wallet).filter(Wallet.trip_id == trip_id).all()
     
     if not wallets:
         raise HTTPException(status_code=404, detail="行程没有钱包")
     
+    members_by_wallet = defaultdict(list)
+    for wm in db.query(WalletMember).filter(
+        WalletMember.wallet_id.in_([wallet.id for wallet in wallets])
+    ).order_by(WalletMember.id).all():
+        members_by_wallet[wm.wallet_id].append(wm)
+    
+    spent = _spent_by_wallet_member(db, trip_id=trip_id)
+    payer_positions = _payer_funded_positions(trip_id, db) if settlement_mode == "trip" else {}
+    names = _member_names(
+        [wm.member_id for wms in members_by_wallet.values() for wm in wms] + list(payer_positions),
+        db
+    )
+    wallet_settlements = settlement_mode == "wallet"
+    
     wallet_reconciliations = []
     all_members = {}
     
     for wallet in wallets:
-        wallet_members = db.query(WalletMember).filter(WalletMember.wallet_id == wallet.id).all()
-        wallet_total_balance = sum(wm.balance for wm in wallet_members)
+        wallet_members = members_by_wallet[wallet.id]
         
-        member_details = []
         for wm in wallet_members:
-            member = db.query(Member).filter(Member.id == wm.member_id).first()
-            
             if wm.member_id not in all_members:
                 all_members[wm.member_id] = {
                     "member_id": wm.member_id,
-                    "member_name": member.name if member else "未知成员",
+                    "member_name": names.get(wm.member_id, "未知成员"),
                     "total_balance": 0,
                     "total_deposited": 0,
                     "total_spent": 0
                 }
             
-            splits = db.query(TransactionSplit).filter(TransactionSplit.member_id == wm.member_id).all()
-            split_amount = sum(s.amount for s in splits)
-            
+            split_amount = spent.get((wallet.id, wm.member_id), 0.0)
             all_members[wm.member_id]["total_balance"] += wm.balance
             all_members[wm.member_id]["total_deposited"] += wm.balance + split_amount
             all_members[wm.member_id]["total_spent"] += split_amount
-            
-            member_details.append({
-                "member_id": wm.member_id,
-                "member_name": member.name if member else "未知成员",
-                "current_balance": wm.balance,
-                "total_deposited": wm.balance + split_amount,
-                "total_spent": split_amount,
-                "share_ratio": round(wm.balance / wallet_total_balance * 100, 2) if wallet_total_balance > 0 else 0
-            })
         
         wallet_reconciliations.append({
             "wallet_id": wallet.id,
             "wallet_name": wallet.name,
-            "total_balance": wallet_total_balance,
+            "total_balance": sum(wm.balance for wm in wallet_members),
             "member_count": len(wallet_members),
-            "members": member_details,
-            "settlements": calculate_settlements(wallet_members, db)
+            "members": _member_details(wallet_members, spent, names),
+            "settlements": calculate_settlements(wallet_members, names, strategy, time_budget) if wallet_settlements else []
         })
     
     overall_balance = sum(m["total_balance"] for m in all_members.values())
     
+    trip_settlements = []
+    if settlement_mode == "trip":
+        positions = trip_net_positions(wallet_balances_in_cents(members_by_wallet), payer_positions)
+        for member_id, cents in positions.items():
+            if member_id in all_members:
+                all_members[member_id]["net_position"] = cents_to_amount(cents)
+        trip_settlements = _to_settlements(cached_solve(('trip', trip_id), positions, strategy, time_budget), names)
+    
     return {
         "trip_id": trip_id,
         "total_wallets": len(wallets),
         "overall_balance": overall_balance,
         "wallets": wallet_reconciliations,
-        "trip_summary": list(all_members.values())
+        "trip_summary": list(all_members.values()),
+        "settlement_mode": settlement_mode,
+        "trip_settlements": trip_settlements
     }
 
 
 @router.get("/settlements/{wallet_id}", response_model=List[MemberSettlement])
 def get_settlements(
     wallet_id: int,
+    strategy: Optional[str] = Query(None, pattern=STRATEGY_PATTERN, description="结算策略: auto/greedy/exact/heuristic"),
+    time_budget: Optional[float] = Query(None, gt=0, le=10, description="求解时间预算（秒）"),
     db: Session = Depends(get_db)
 ):
     wallet_members = db.query(WalletMember).filter(WalletMember.wallet_id == wallet_id).all()
@@ -134,70 +219,235 @@ def get_settlements(
     if not wallet_members:
         return []
     
-    return calculate_settlements(wallet_members, db)
+    names = _member_names([wm.member_id for wm in wallet_members], db)
+    return calculate_settlements(wallet_members, names, strategy, time_budget)
 
 
-def calculate_settlements(wallet_members: List[WalletMember], db: Session) -> List[dict]:
-    if not wallet_members:
+@router.get("/settlements/trip/{trip_id}", response_model=List[MemberSettlement])
+def get_trip_settlements(
+    trip_id: int,
+    strategy: Optional[str] = Query(None, pattern=STRATEGY_PATTERN, description="结算策略: auto/greedy/exact/heuristic"),
+    time_budget: Optional[float] = Query(None, gt=0, le=10, description="求解时间预算（秒）"),
+    db: Session = Depends(get_db)
+):
+    """行程级转账方案：跨钱包、含垫付支出轧差后统一结算"""
+    members_by_wallet = defaultdict(list)
+    for wm in db.query(WalletMember).join(
+        Wallet, Wallet.id == WalletMember.wallet_id
+    ).filter(Wallet.trip_id == trip_id).order_by(WalletMember.id).all():
+        members_by_wallet[wm.wallet_id].append(wm)
+    
+    payer_positions = _payer_funded_positions(trip_id, db)
+    positions = trip_net_positions(wallet_balances_in_cents(members_by_wallet), payer_positions)
+    if not any(positions.values()):
         return []
     
-    total_balance = sum(wm.balance for wm in wallet_members)
-    member_count = len(wallet_members)
+    names = _member_names(list(positions), db)
+    return _to_settlements(cached_solve(('trip', trip_id), positions, strategy, time_budget), names)
+
+
+@router.post("/simulate/{trip_id}", response_model=SimulationResult)
+def simulate_settlements(
+    trip_id: int,
+    request: SimulationRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    假设性交易的结算模拟：在行程余额快照（缓存）上叠加假设交易，返回前后统计与转账方案
     
-    if total_balance == 0 or member_count < 2:
-        return []
+    不写数据库；快照命中缓存时整个请求不访问数据库。
+    """
+    if request.strategy and request.strategy not in STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"未知的结算策略: {request.strategy}")
+    
+    snapshot = _trip_snapshot(trip_id, db)
+    if not snapshot["member_names"]:
+        raise HTTPException(status_code=404, detail="行程没有成员")
+    
+    wallet_balances = {wallet_id: dict(balances) for wallet_id, balances in snapshot["wallet_balances"].items()}
+    payer_positions = defaultdict(int, snapshot["payer_positions"])
+    member_spent = defaultdict(int, snapshot["member_spent"])
+    
+    for txn in request.transactions:
+        try:
+            _apply_simulated_transaction(txn, snapshot, wallet_balances, payer_positions, member_spent)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    names = snapshot["member_names"]
+    positions_before = trip_net_positions(snapshot["wallet_balances"], snapshot["payer_positions"])
+    positions_after = trip_net_positions(wallet_balances, dict(payer_positions))
+    settlements_before = cached_solve(('trip', trip_id), positions_before, request.strategy, request.time_budget)
+    settlements_after = solve_settlements(positions_after, request.strategy, request.time_budget)
+    
+    member_ids = sorted(set(names) | set(positions_after) | set(member_spent))
+    return {
+        "trip_id": trip_id,
+        "total_expense": cents_to_amount(sum(snapshot["member_spent"].values())),
+        "total_expense_after": cents_to_amount(sum(member_spent.values())),
+        "members": [
+            {
+                "member_id": member_id,
+                "member_name": names.get(member_id, "未知成员"),
+                "total_spent": cents_to_amount(snapshot["member_spent"].get(member_id, 0)),
+                "total_spent_after": cents_to_amount(member_spent.get(member_id, 0)),
+                "net_position": cents_to_amount(positions_before.get(member_id, 0)),
+                "net_position_after": cents_to_amount(positions_after.get(member_id, 0))
+            }
+            for member_id in member_ids
+        ],
+        "settlements_before": _to_settlements(settlements_before, names),
+        "settlements": _to_settlements(settlements_after, names)
+    }
+
+
+def _trip_snapshot(trip_id: int, db: Session) -> dict:
+    """
+    行程余额快照（金额均为分）：成员名称、各钱包成员余额、垫付净额、成员分摊合计
+    
+    与结算方案共用缓存，交易和钱包余额变更时随行程一起失效；调用方不得修改返回值。
+    """
+    key = ('trip', trip_id, 'snapshot')
+    snapshot = settlement_cache.get(key)
+    if snapshot is not None:
+        return snapshot
+    generation = settlement_cache.generation
+    
+    member_names = dict(db.query(Member.id, Member.name).filter(Member.trip_id == trip_id).all())
+    wallet_ids = [wallet_id for wallet_id, in db.query(Wallet.id).filter(Wallet.trip_id == trip_id).all()]
+    members_by_wallet = defaultdict(list)
+    if wallet_ids:
+        for wm in db.query(WalletMember).filter(WalletMember.wallet_id.in_(wallet_ids)).all():
+            members_by_wallet[wm.wallet_id].append(wm)
+    wallet_balances = wallet_balances_in_cents(members_by_wallet)
+    for wallet_id in wallet_ids:
+        wallet_balances.setdefault(wallet_id, {})
+    
+    member_spent = {
+        member_id: amount_to_cents(float(amount or 0))
+        for member_id, amount in db.query(
+            TransactionSplit.member_id,
+            func.sum(TransactionSplit.amount)
+        ).join(
+            Transaction, Transaction.id == TransactionSplit.transaction_id
+        ).filter(Transaction.trip_id == trip_id).group_by(TransactionSplit.member_id).all()
+    }
+    
+    snapshot = {
+        "member_names": member_names,
+        "wallet_balances": wallet_balances,
+        "payer_positions": dict(_payer_funded_positions(trip_id, db)),
+        "member_spent": member_spent
+    }
+    settlement_cache.set(key, snapshot, generation=generation)
+    return snapshot
+
+
+def _apply_simulated_transaction(txn, snapshot: dict, wallet_balances: dict, payer_positions: dict, member_spent: dict):
+    """把一笔假设交易叠加到快照副本上（与真实写入的记账口径一致）"""
+    members = snapshot["member_names"]
+    amount = amount_to_cents(txn.amount)
     
-    avg_balance = total_balance / member_count
+    if txn.transaction_type == "deposit":
+        # 与 TransactionService.create_deposit 一致：全额计入存入成员在该钱包的余额，不参与分摊
+        if txn.wallet_id is None:
+            raise ValueError("存入交易必须指定钱包")
+        if not txn.payer_id:
+            raise ValueError("存入交易必须指定存入成员（payer_id）")
+        if txn.splits or txn.split_members:
+            raise ValueError("存入交易不支持分摊")
+        if txn.payer_id not in members:
+            raise ValueError(f"成员不属于该行程: {[txn.payer_id]}")
+        if txn.wallet_id not in wallet_balances:
+            raise ValueError(f"钱包不属于该行程: {txn.wallet_id}")
+        wallet_balances[txn.wallet_id][txn.payer_id] = wallet_balances[txn.wallet_id].get(txn.payer_id, 0) + amount
+        return
     
-    debtors = []
-    creditors = []
+    if txn.splits:
+        shares = defaultdict(int)
+        for split in txn.splits:
+            shares[split.member_id] += amount_to_cents(split.amount)
+        if sum(shares.values()) != amount:
+            raise ValueError("分摊金额之和必须等于交易金额")
+    else:
+        shares = split_equal(amount, txn.split_members or members)
     
+    unknown = [member_id for member_id in list(shares) + ([txn.payer_id] if txn.payer_id else []) if member_id not in members]
+    if unknown:
+        raise ValueError(f"成员不属于该行程: {sorted(set(unknown))}")
+    if txn.wallet_id is not None and txn.wallet_id not in wallet_balances:
+        raise ValueError(f"钱包不属于该行程: {txn.wallet_id}")
+    
+    for member_id, cents in shares.items():
+        member_spent[member_id] += cents
+    if txn.wallet_id is not None:
+        # 钱包支出：从各分摊成员在该钱包的余额中扣除
+        for member_id, cents in shares.items():
+            wallet_balances[txn.wallet_id][member_id] = wallet_balances[txn.wallet_id].get(member_id, 0) - cents
+    elif txn.payer_id:
+        # 付款人垫付：付款人应收全部分摊，分摊成员各自应付
+        payer_positions[txn.payer_id] += amount
+        for member_id, cents in shares.items():
+            payer_positions[member_id] -= cents
+    else:
+        raise ValueError("支出交易必须指定钱包或付款人")
+
+
+def calculate_settlements(
+    wallet_members: List[WalletMember],
+    member_names: Dict[int, str],
+    strategy: Optional[str] = None,
+    time_budget: Optional[float] = None
+) -> List[dict]:
+    """以钱包内人均余额为目标生成转账方案，金额内部按整数分计算"""
+    if not wallet_members:
+        return []
+    
+    current = defaultdict(int)
     for wm in wallet_members:
-        member = db.query(Member).filter(Member.id == wm.member_id).first()
-        member_name = member.name if member else "未知成员"
-        
-        diff = wm.balance - avg_balance
-        
-        if diff < -0.01:
-            debtors.append({
-                "member_id": wm.member_id,
-                "member_name": member_name,
-                "debt_amount": abs(diff)
-            })
-        elif diff > 0.01:
-            creditors.append({
-                "member_id": wm.member_id,
-                "member_name": member_name,
-                "credit_amount": diff
-            })
-    
-    settlements = []
-    
-    debtors_sorted = sorted(debtors, key=lambda x: x["debt_amount"], reverse=True)
-    creditors_sorted = sorted(creditors, key=lambda x: x["credit_amount"], reverse=True)
-    
-    i = j = 0
-    while i < len(debtors_sorted) and j < len(creditors_sorted):
-        debtor = debtors_sorted[i]
-        creditor = creditors_sorted[j]
-        
-        amount = min(debtor["debt_amount"], creditor["credit_amount"])
-        
-        if amount > 0.01:
-            settlements.append({
-                "from_member_id": debtor["member_id"],
-                "from_member_name": debtor["member_name"],
-                "to_member_id": creditor["member_id"],
-                "to_member_name": creditor["member_name"],
-                "amount": round(amount, 2)
-            })
-        
-        debtor["debt_amount"] -= amount
-        creditor["credit_amount"] -= amount
-        
-        if debtor["debt_amount"] < 0.01:
-            i += 1
-        if creditor["credit_amount"] < 0.01:
-            j += 1
+        current[wm.member_id] += amount_to_cents(wm.balance)
+    
+    if sum(current.values()) == 0 or len(current) < 2:
+        return []
     
-    return settlements
+    transfers = cached_solve(('wallet', wallet_members[0].wallet_id), balances_from_targets(current), strategy, time_budget)
+    return _to_settlements(transfers, member_names)
+
+
+def wallet_balances_in_cents(members_by_wallet: Dict[int, List[WalletMember]]) -> Dict[int, Dict[int, int]]:
+    """{钱包ID: {成员ID: 余额(分)}}"""
+    balances = {}
+    for wallet_id, wallet_members in members_by_wallet.items():
+        current = defaultdict(int)
+        for wm in wallet_members:
+            current[wm.member_id] += amount_to_cents(wm.balance)
+        balances[wallet_id] = dict(current)
+    return balances
+
+
+def trip_net_positions(wallet_balances: Dict[int, Dict[int, int]], payer_positions: Dict[int, int]) -> Dict[int, int]:
+    """
+    汇总成员在整个行程的净额（分）：各钱包相对人均余额的偏差之和，加上垫付支出形成的净额
+    
+    每个钱包的偏差与垫付净额各自和为0，合计后仍和为0，可直接求解。
+    """
+    positions = defaultdict(int, payer_positions)
+    for current in wallet_balances.values():
+        if sum(current.values()) == 0 or len(current) < 2:
+            continue
+        for member_id, cents in balances_from_targets(current).items():
+            positions[member_id] += cents
+    return dict(positions)
+
+
+def _to_settlements(transfers: List[tuple], member_names: Dict[int, str]) -> List[dict]:
+    return [
+        {
+            "from_member_id": from_id,
+            "from_member_name": member_names.get(from_id, "未知成员"),
+            "to_member_id": to_id,
+            "to_member_name": member_names.get(to_id, "未知成员"),
+            "amount": cents_to_amount(cents)
+        }
+        for from_id, to_id, cents in transfers
+    ]
@@ -1,27 +1,125 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
-import json
+from datetime import datetime
+from typing import List, Optional
+import hashlib
 
 from app.core.database import get_db
 from app.models.trip_stats import TripStats
 from app.models.member_stats import MemberStats
 from app.models.wallet_stats import WalletStats
+from app.models.category import Category
+from app.models.member import Member
+from app.models.trip import Trip
+from app.models.wallet import Wallet
 from app.services.stats_service import StatsService
+from app.services.stats_queue import StatsRefreshQueue
+from app.services.stats_cache import stats_cache
 
 router = APIRouter()
 
 
+def _stats_etag(trip_id: int, db: Session) -> Optional[str]:
+    """由行程统计版本号生成ETag（尚未生成统计时不返回）"""
+    version = StatsService.get_version(trip_id, db)
+    return f'W/"stats-{trip_id}-v{version}"' if version else None
+
+
+def _batch_etag(ids: List[int], db: Session) -> Optional[str]:
+    """
+    由各行程 (trip_id, 版本号) 组合的摘要生成批量统计的ETag
+    
+    任一行程尚未生成统计（汇总为实时计算、没有版本号）时不返回，避免数据变化后仍命中304。
+    """
+    versions = StatsService.get_versions(ids, db)
+    if not ids or len(versions) < len(ids):
+        return None
+    digest = hashlib.sha1(
+        ','.join(f"{trip_id}:{versions[trip_id]}" for trip_id in ids).encode()
+    ).hexdigest()[:16]
+    return f'W/"stats-batch-{digest}"'
+
+
+def _timeseries_etag(trip_id: int, params: tuple, db: Session) -> Optional[str]:
+    """行程统计版本号加查询参数生成时间序列的ETag（不同区间、粒度的结果各有ETag）"""
+    version = StatsService.get_version(trip_id, db)
+    if not version:
+        return None
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()[:8]
+    return f'W/"stats-{trip_id}-v{version}-ts-{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    if not etag or not if_none_match:
+        return False
+    
+    def opaque(tag: str) -> str:
+        # 弱比较：忽略 W/ 前缀
+        tag = tag.strip()
+        return tag[2:] if tag.startswith('W/') else tag
+    
+    candidates = {opaque(tag) for tag in if_none_match.split(',')}
+    return '*' in candidates or opaque(etag) in candidates
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def _set_etag(response: Response, etag: Optional[str]):
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+
+
+def _cached_response(key: tuple, if_none_match: Optional[str], response: Response):
+    """命中进程内缓存时直接返回（304或缓存的响应体），不访问数据库；未命中返回None"""
+    cached = stats_cache.get(key)
+    if cached is None:
+        return None
+    etag, payload = cached
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    _set_etag(response, etag)
+    return payload
+
+
+def _store_response(key: tuple, etag: Optional[str], payload: dict, generation: int):
+    # 只缓存已有版本号的结果，保证缓存命中时也能返回ETag
+    if etag:
+        stats_cache.set(key, (etag, payload), generation=generation)
+
+
 @router.get("/per-person/{trip_id}")
-def get_per_person_stats(trip_id: int, db: Session = Depends(get_db)):
-    """获取人均支出统计 - 从统计表读取（高性能版本）"""
+def get_per_person_stats(
+    trip_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """获取人均支出统计 - 从统计表读取（高性能版本），支持 If-None-Match 条件请求"""
+    
+    cache_key = ("per-person", trip_id)
+    cached = _cached_response(cache_key, if_none_match, response)
+    if cached is not None:
+        return cached
+    generation = stats_cache.generation
+    
+    # 版本号未变化时直接返回304，不读取统计行
+    etag = _stats_etag(trip_id, db)
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
     
     # 1. 获取行程级统计
     trip_stats = db.query(TripStats).filter(TripStats.trip_id == trip_id).first()
     if not trip_stats:
-        # 如果统计表不存在，则触发计算
-        StatsService.update_trip_stats(trip_id, db)
+        # 行程统计依赖成员，没有成员时重算也不会产生统计行，直接返回404，不写库
+        if not db.query(Member.id).filter(Member.trip_id == trip_id).first():
+            raise HTTPException(status_code=404, detail="该行程暂无统计数据")
+        # 如果统计表不存在，则触发计算（单事务写入行程、成员、钱包统计）
+        StatsService.update_all_stats(trip_id, db)
         trip_stats = db.query(TripStats).filter(TripStats.trip_id == trip_id).first()
+        etag = _stats_etag(trip_id, db)
     
     # 2. 获取成员级统计
     member_stats_list = db.query(MemberStats).filter(
@@ -31,9 +129,20 @@ def get_per_person_stats(trip_id: int, db: Session = Depends(get_db)):
     if not trip_stats:
         raise HTTPException(status_code=404, detail="该行程暂无统计数据")
     
-    # 3. 解析JSON字符串并构建返回结果
-    category_totals = json.loads(trip_stats.category_totals) if trip_stats.category_totals else {}
-    category_ratios = json.loads(trip_stats.category_ratios) if trip_stats.category_ratios else {}
+    # 3. 统计以分类ID为键存储，按当前分类名称组装返回结果（分类改名后历史统计随之更新）
+    category_totals_by_id = trip_stats.category_totals or {}
+    category_ids = set(category_totals_by_id)
+    for ms in member_stats_list:
+        category_ids.update(ms.by_category or {})
+    category_names = {
+        str(category_id): name
+        for category_id, name in db.query(Category.id, Category.name).filter(
+            Category.id.in_([int(category_id) for category_id in category_ids])
+        ).all()
+    } if category_ids else {}
+    
+    def by_name(values: dict) -> dict:
+        return {category_names.get(key, f"已删除分类#{key}"): value for key, value in (values or {}).items()}
     
     result = {
         "trip_id": trip_id,
@@ -45,33 +154,56 @@ def get_per_person_stats(trip_id: int, db: Session = Depends(get_db)):
                 "member_id": ms.member_id,
                 "member_name": ms.member_name,
                 "total_amount": ms.total_amount,
-                "by_category": json.loads(ms.by_category) if ms.by_category else {},
-                "by_wallet": json.loads(ms.by_wallet) if ms.by_wallet else {}
+                "by_category": by_name(ms.by_category),
+                "by_wallet": ms.by_wallet or {},
+                "should_pay": ms.should_pay,
+                "actual_paid": ms.actual_paid,
+                "balance": ms.balance
             }
             for ms in member_stats_list
         ],
-        "category_totals": category_totals,
-        "category_ratios": category_ratios
+        "category_totals": by_name(category_totals_by_id),
+        "category_ratios": by_name(trip_stats.category_ratios),
+        "category_totals_by_id": category_totals_by_id
     }
     
+    _store_response(cache_key, etag, result, generation)
+    _set_etag(response, etag)
     return result
 
 
 @router.get("/wallet-summary/{trip_id}")
-def get_wallet_summary(trip_id: int, db: Session = Depends(get_db)):
-    """获取钱包汇总统计 - 从统计表读取（高性能版本）"""
+def get_wallet_summary(
+    trip_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """获取钱包汇总统计 - 从统计表读取（高性能版本），支持 If-None-Match 条件请求"""
+    
+    cache_key = ("wallet-summary", trip_id)
+    cached = _cached_response(cache_key, if_none_match, response)
+    if cached is not None:
+        return cached
+    generation = stats_cache.generation
+    
+    etag = _stats_etag(trip_id, db)
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
     
     # 获取钱包统计
     wallet_stats_list = db.query(WalletStats).filter(
         WalletStats.trip_id == trip_id
     ).all()
     
-    if not wallet_stats_list:
+    # 行程没有钱包时无需重算（重算不产生统计行），直接返回空列表，不写库
+    if not wallet_stats_list and db.query(Wallet.id).filter(Wallet.trip_id == trip_id).first():
         # 如果统计表不存在，则触发计算
         StatsService.update_wallet_stats(trip_id, db)
         wallet_stats_list = db.query(WalletStats).filter(
             WalletStats.trip_id == trip_id
         ).all()
+        etag = _stats_etag(trip_id, db)
     
     result = {
         "trip_id": trip_id,
@@ -79,7 +211,7 @@ def get_wallet_summary(trip_id: int, db: Session = Depends(get_db)):
             {
                 "wallet_id": ws.wallet_id,
                 "wallet_name": ws.wallet_name,
-                "balance_by_member": json.loads(ws.balance_by_member) if ws.balance_by_member else {},
+                "balance_by_member": ws.balance_by_member or {},
                 "total_balance": ws.total_balance,
                 "transaction_count": ws.transaction_count,
                 "total_deposited": ws.total_deposited,
@@ -90,9 +222,109 @@ def get_wallet_summary(trip_id: int, db: Session = Depends(get_db)):
         ]
     }
     
+    _store_response(cache_key, etag, result, generation)
+    _set_etag(response, etag)
     return result
 
 
+@router.get("/batch")
+def get_batch_stats(
+    response: Response,
+    trip_ids: Optional[str] = Query(None, description="逗号分隔的行程ID，不传则返回所有未完成的行程"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    批量获取多个行程的汇总统计（仪表盘用），一次查询统计表，缺失的行程统一分组计算
+    
+    所有行程都已生成统计时返回ETag（由各行程版本号组合而成），支持 If-None-Match 条件请求。
+    """
+    if trip_ids:
+        try:
+            ids = list(dict.fromkeys(int(trip_id) for trip_id in trip_ids.split(',') if trip_id.strip()))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="trip_ids 格式错误，应为逗号分隔的整数")
+    else:
+        ids = [trip_id for trip_id, in db.query(Trip.id).filter(Trip.status != 'completed').order_by(Trip.id).all()]
+    
+    stats_rows = db.query(
+        TripStats.trip_id,
+        TripStats.total_expense,
+        TripStats.average_expense,
+        TripStats.member_count,
+        TripStats.transaction_count
+    ).filter(TripStats.trip_id.in_(ids)).all() if ids else []
+    
+    summaries = {
+        trip_id: {
+            "trip_id": trip_id,
+            "total_expense": total_expense,
+            "average_expense": average_expense,
+            "member_count": member_count,
+            "transaction_count": transaction_count
+        }
+        for trip_id, total_expense, average_expense, member_count, transaction_count in stats_rows
+    }
+    
+    # 尚未生成统计的行程：一次分组聚合算出汇总，不逐个触发全量计算
+    missing = [trip_id for trip_id in ids if trip_id not in summaries]
+    if missing:
+        summaries.update(StatsService.compute_trip_summaries(missing, db))
+        etag = None
+    else:
+        etag = _batch_etag(ids, db)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+    
+    _set_etag(response, etag)
+    return {
+        "trips": [summaries[trip_id] for trip_id in ids],
+        "computed_trip_ids": missing
+    }
+
+
+@router.get("/timeseries/{trip_id}")
+def get_timeseries_stats(
+    trip_id: int,
+    response: Response,
+    start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD"),
+    granularity: str = Query("day", pattern="^(day|week)$", description="粒度: day/week"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """按日/按周的支出时间序列 - 从按日汇总表读取，耗时与区间天数成正比，支持 If-None-Match 条件请求"""
+    try:
+        start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式错误，应为 YYYY-MM-DD")
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="开始日期不能晚于结束日期")
+    
+    etag = _timeseries_etag(trip_id, (start, end, granularity), db)
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    
+    series = StatsService.query_timeseries(trip_id, db, start, end, granularity)
+    
+    category_ids = {int(key) for point in series for key in point['by_category']}
+    category_names = {
+        str(category_id): name
+        for category_id, name in db.query(Category.id, Category.name).filter(Category.id.in_(category_ids)).all()
+    } if category_ids else {}
+    
+    _set_etag(response, etag)
+    return {
+        "trip_id": trip_id,
+        "granularity": granularity,
+        "start_date": start_date,
+        "end_date": end_date,
+        "category_names": category_names,
+        "series": series
+    }
+
+
 @router.post("/refresh/{trip_id}")
 def refresh_stats(trip_id: int, db: Session = Depends(get_db)):
     """手动刷新统计数据 - 管理员接口"""
@@ -103,9 +335,16 @@ def refresh_stats(trip_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"刷新失败: {str(e)}")
 
 
+@router.get("/cache")
+def get_cache_stats():
+    """统计响应缓存的命中/未命中/淘汰计数（用于调试）"""
+    return stats_cache.stats()
+
+
 @router.get("/info/{trip_id}")
 def get_stats_info(trip_id: int, db: Session = Depends(get_db)):
-    """获取统计表元信息（用于调试）"""
+    """获取统计表元信息（用于调试），包含刷新队列延迟与最近一次成功刷新时间"""
+    queue_status = StatsRefreshQueue.get_status(trip_id, db)
     trip_stats = db.query(TripStats).filter(TripStats.trip_id == trip_id).first()
     member_stats_count = db.query(MemberStats).filter(MemberStats.trip_id == trip_id).count()
     wallet_stats_count = db.query(WalletStats).filter(WalletStats.trip_id == trip_id).count()
@@ -114,7 +353,8 @@ def get_stats_info(trip_id: int, db: Session = Depends(get_db)):
         return {
             "trip_id": trip_id,
             "has_stats": False,
-            "message": "统计数据未生成，请先创建交易或手动刷新"
+            "message": "统计数据未生成，请先创建交易或手动刷新",
+            "queue": queue_status
         }
     
     return {
@@ -123,5 +363,18 @@ def get_stats_info(trip_id: int, db: Session = Depends(get_db)):
         "trip_stats_updated_at": trip_stats.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
         "member_stats_count": member_stats_count,
         "wallet_stats_count": wallet_stats_count,
-        "transaction_count": trip_stats.transaction_count
+        "transaction_count": trip_stats.transaction_count,
+        "stats_version": StatsService.get_version(trip_id, db),
+        "queue": queue_status
+    }
+
+
+@router.get("/verify/{trip_id}")
+def verify_stats(trip_id: int, db: Session = Depends(get_db)):
+    """校验统计表与全量重算结果是否一致（用于检查增量维护）"""
+    mismatches = StatsService.verify_stats(trip_id, db)
+    return {
+        "trip_id": trip_id,
+        "consistent": not mismatches,
+        "mismatches": mismatches
     }
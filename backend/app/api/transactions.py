@@ -1,31 +1,98 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_
+from collections import defaultdict
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
+import base64
+import json
 
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
+from app.core.fast_json import FastJSONResponse
 from app.core.logging import get_logger
 from app.models.transaction import Transaction
 from app.models.wallet import Wallet
 from app.models.category import Category
 from app.models.member import Member
-from app.schemas.transaction import TransactionCreate, TransactionUpdate, TransactionResponse
-from app.services.stats_service import StatsService
+from app.models.transaction_split import TransactionSplit
+from app.models.trip_stats import TripStats
+from app.schemas.transaction import (
+    TransactionCreate, TransactionUpdate, TransactionResponse, ExpenseCreate, DepositCreate,
+    TransactionImportResult, TransactionPage, TransactionSearchResult, TransactionFacets
+)
+from app.services.transaction_service import TransactionService, TransactionError
+from app.services.transaction_import import detect_format, iter_rows, import_transactions as import_rows
+from app.services.transaction_search import search_transactions as search_remarks
+from app.services.transaction_facets import compute_facets
+from app.services.fast_reads import transaction_rows
+from app.services.transaction_export import (
+    EXPORT_FORMATS, STREAM_WRITERS, export_filename, iter_export_rows, load_name_maps
+)
+from app.services.stats_service import StatsService, TransactionSnapshot
+from app.services.stats_queue import StatsRefreshQueue
+from app.services.stats_cache import invalidate_trip_stats
+from app.services.settlement_cache import invalidate_settlements
 
 router = APIRouter()
 logger = get_logger(__name__)
 
+INCLUDE_OPTIONS = {'splits', 'facets'}
 
-@router.get("/", response_model=list[TransactionResponse])
-def list_transactions(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000),
-    trip_id: Optional[int] = Query(None),
-    wallet_id: Optional[int] = Query(None),
-    category_id: Optional[int] = Query(None),
-    start_date: Optional[str] = Query(None),
-    end_date: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+
+def _stage_stats(
+    old: Optional[TransactionSnapshot],
+    new: Optional[TransactionSnapshot],
+    db: Session
+):
+    """
+    在交易写入所在的事务内维护统计（不提交）
+    
+    优先增量调整；无法增量（统计未生成或调整出错）时回滚到保存点，改为登记刷新队列，
+    登记随交易一起提交，由后台全量重算，进程在提交前后崩溃都不会丢失。
+    """
+    trip_ids = {snap.trip_id for snap in (old, new) if snap is not None}
+    savepoint = db.begin_nested()
+    try:
+        applied = StatsService.apply_transaction_delta(old, new, db)
+    except Exception as e:
+        logger.warning(f"Incremental stats update failed for trips {sorted(trip_ids)}: {e}")
+        applied = False
+    
+    if applied:
+        savepoint.commit()
+        return
+    savepoint.rollback()
+    for trip_id in sorted(trip_ids):
+        StatsRefreshQueue.enqueue(trip_id, db, commit=False)
+
+
+def _commit_with_stats(
+    old: Optional[TransactionSnapshot],
+    new: Optional[TransactionSnapshot],
+    db: Session
+):
+    """交易、统计调整（或重算登记）一次提交，提交成功后清除相关行程的统计与结算缓存"""
+    try:
+        _stage_stats(old, new, db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    
+    snapshots = [snap for snap in (old, new) if snap is not None]
+    trip_ids = {snap.trip_id for snap in snapshots}
+    invalidate_trip_stats(*trip_ids)
+    invalidate_settlements(trip_ids, {snap.wallet_id for snap in snapshots})
+
+
+def _filtered_query(
+    db: Session,
+    trip_id: Optional[int] = None,
+    wallet_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
 ):
     query = db.query(Transaction)
     
@@ -39,25 +106,50 @@ def list_transactions(
         query = query.filter(Transaction.transaction_date >= start_date)
     if end_date:
         query = query.filter(Transaction.transaction_date <= end_date)
+    return query
+
+
+def _parse_include(include: Optional[str]) -> set:
+    """解析 include 参数（逗号分隔）：splits 分摊明细，facets 筛选维度统计（仅 /page 返回）"""
+    parts = {part.strip() for part in (include or '').split(',') if part.strip()}
+    unknown = parts - INCLUDE_OPTIONS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"不支持的 include 选项: {', '.join(sorted(unknown))}")
+    return parts
+
+
+def _serialize_transactions(transactions: list, db: Session, include_splits: bool = False) -> list:
+    """
+    组装列表响应：钱包、分类、成员名称各批量查询1次
     
-    transactions = query.order_by(Transaction.transaction_date.desc()).offset(skip).limit(limit).all()
-    
+    include_splits 时本页所有交易的分摊明细用一条 IN 查询取回，分摊成员与付款人共用一次成员查询，
+    每页查询数固定，与页大小无关。
+    """
     if not transactions:
         return []
     
     wallet_ids = list({t.wallet_id for t in transactions})
     category_ids = list({t.category_id for t in transactions if t.category_id})
-    payer_ids = list({t.payer_id for t in transactions if t.payer_id})
+    member_ids = {t.payer_id for t in transactions if t.payer_id}
+    
+    splits_by_transaction = defaultdict(list)
+    if include_splits:
+        splits = db.query(TransactionSplit).filter(
+            TransactionSplit.transaction_id.in_([t.id for t in transactions])
+        ).order_by(TransactionSplit.transaction_id, TransactionSplit.id).all()
+        for split in splits:
+            splits_by_transaction[split.transaction_id].append(split)
+            member_ids.add(split.member_id)
     
     wallets_map = {w.id: w for w in db.query(Wallet).filter(Wallet.id.in_(wallet_ids)).all()}
     categories_map = {c.id: c for c in db.query(Category).filter(Category.id.in_(category_ids)).all()}
-    payers_map = {p.id: p for p in db.query(Member).filter(Member.id.in_(payer_ids)).all()}
+    members_map = {m.id: m for m in db.query(Member).filter(Member.id.in_(list(member_ids))).all()}
     
     result = []
     for txn in transactions:
         wallet = wallets_map.get(txn.wallet_id)
         category = categories_map.get(txn.category_id) if txn.category_id else None
-        payer = payers_map.get(txn.payer_id) if txn.payer_id else None
+        payer = members_map.get(txn.payer_id) if txn.payer_id else None
         
         result.append({
             "id": txn.id,
@@ -73,12 +165,183 @@ def list_transactions(
             "wallet": {"id": wallet.id, "name": wallet.name} if wallet else None,
             "category": {"id": category.id, "name": category.name} if category else None,
             "payer": {"id": payer.id, "name": payer.name} if payer else None,
-            "splits": []
+            "splits": [
+                {
+                    "id": split.id,
+                    "transaction_id": split.transaction_id,
+                    "member_id": split.member_id,
+                    "member_name": members_map[split.member_id].name if split.member_id in members_map else "",
+                    "amount": split.amount,
+                    "split_method": split.split_method
+                }
+                for split in splits_by_transaction.get(txn.id, ())
+            ]
         })
     
     return result
 
 
+def _encode_cursor(txn: Transaction) -> str:
+    """游标为最后一行的 (transaction_date, id)，base64 编码后对客户端不透明"""
+    payload = json.dumps([txn.transaction_date.isoformat(), txn.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        transaction_date, transaction_id = json.loads(payload)
+        return datetime.fromisoformat(transaction_date), int(transaction_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="分页游标无效")
+
+
+@router.get("/", response_model=list[TransactionResponse])
+def list_transactions(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    trip_id: Optional[int] = Query(None),
+    wallet_id: Optional[int] = Query(None),
+    category_id: Optional[int] = Query(None),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    include: Optional[str] = Query(None, description="附加内容，逗号分隔：splits"),
+    fast: bool = Query(False, description="轻量读取：按列查询并直接编码JSON，跳过ORM对象与响应模型校验"),
+    db: Session = Depends(get_db)
+):
+    include_options = _parse_include(include)
+    query = _filtered_query(db, trip_id, wallet_id, category_id, start_date, end_date)
+    if fast:
+        return FastJSONResponse(transaction_rows(query, db, skip, limit, include_splits='splits' in include_options))
+    transactions = query.order_by(Transaction.transaction_date.desc()).offset(skip).limit(limit).all()
+    return _serialize_transactions(transactions, db, include_splits='splits' in include_options)
+
+
+@router.get("/page", response_model=TransactionPage)
+def page_transactions(
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，首页不传"),
+    limit: int = Query(100, ge=1, le=1000),
+    trip_id: Optional[int] = Query(None),
+    wallet_id: Optional[int] = Query(None),
+    category_id: Optional[int] = Query(None),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    include_total: bool = Query(False, description="返回行程交易总数（取自行程统计，仅按行程筛选时提供）"),
+    include: Optional[str] = Query(None, description="附加内容，逗号分隔：splits, facets"),
+    db: Session = Depends(get_db)
+):
+    """
+    按 (transaction_date, id) 倒序的游标分页（include=facets 时同时返回当前筛选条件下的维度统计）
+    
+    每页从上一页最后一行之后继续读取，沿 idx_trip_date 索引定位，深翻页不再扫描并丢弃前面的行；
+    新增交易也不会让已翻过的行在页间移动。
+    """
+    include_options = _parse_include(include)
+    query = _filtered_query(db, trip_id, wallet_id, category_id, start_date, end_date)
+    facets = compute_facets(query, db) if 'facets' in include_options else None
+    if cursor:
+        last_date, last_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            Transaction.transaction_date < last_date,
+            and_(Transaction.transaction_date == last_date, Transaction.id < last_id)
+        ))
+    
+    # 多取一行判断是否还有下一页
+    transactions = query.order_by(
+        Transaction.transaction_date.desc(),
+        Transaction.id.desc()
+    ).limit(limit + 1).all()
+    has_more = len(transactions) > limit
+    transactions = transactions[:limit]
+    
+    total = None
+    if include_total and trip_id and not (wallet_id or category_id or start_date or end_date):
+        total = db.query(TripStats.transaction_count).filter(TripStats.trip_id == trip_id).scalar()
+    
+    return {
+        "items": _serialize_transactions(transactions, db, include_splits='splits' in include_options),
+        "next_cursor": _encode_cursor(transactions[-1]) if has_more else None,
+        "total": total,
+        "facets": facets
+    }
+
+
+@router.get("/facets", response_model=TransactionFacets)
+def transaction_facets(
+    trip_id: Optional[int] = Query(None),
+    wallet_id: Optional[int] = Query(None),
+    category_id: Optional[int] = Query(None),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """当前筛选条件下按分类、钱包、付款人、日期的笔数与金额（一条分组查询）"""
+    query = _filtered_query(db, trip_id, wallet_id, category_id, start_date, end_date)
+    return compute_facets(query, db)
+
+
+@router.get("/search", response_model=TransactionSearchResult)
+def search_transactions(
+    q: str = Query(..., min_length=1, max_length=100, description="备注关键词，空格分隔的多个词需同时命中"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    trip_id: Optional[int] = Query(None),
+    wallet_id: Optional[int] = Query(None),
+    category_id: Optional[int] = Query(None),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    include: Optional[str] = Query(None, description="附加内容，逗号分隔：splits"),
+    db: Session = Depends(get_db)
+):
+    """按备注全文检索交易（MySQL FULLTEXT ngram / SQLite FTS5），结果按相关度排序"""
+    include_options = _parse_include(include)
+    query = _filtered_query(db, trip_id, wallet_id, category_id, start_date, end_date)
+    mode, hits = search_remarks(query, q, db, skip=skip, limit=limit + 1)
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    
+    items = _serialize_transactions([txn for txn, _ in hits], db, include_splits='splits' in include_options)
+    for item, (_, score) in zip(items, hits):
+        item["score"] = score
+    return {"items": items, "has_more": has_more, "mode": mode}
+
+
+@router.get("/export")
+def export_transactions(
+    trip_id: int = Query(...),
+    file_format: str = Query("csv", alias="format", description="csv/ndjson/xlsx"),
+    wallet_id: Optional[int] = Query(None),
+    category_id: Optional[int] = Query(None),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """
+    流式导出行程交易
+    
+    名称映射先一次性加载，交易行通过服务端游标分批读取并边读边写出，首块数据立即返回，
+    内存占用与导出行数无关。流式读取使用独立的Session，响应结束时关闭。
+    """
+    file_format = file_format.lower()
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {file_format}")
+    name_maps = load_name_maps(trip_id, db)
+    
+    def generate():
+        session = SessionLocal()
+        try:
+            query = _filtered_query(session, trip_id, wallet_id, category_id, start_date, end_date)
+            yield from STREAM_WRITERS[file_format](iter_export_rows(query, name_maps))
+        finally:
+            session.close()
+    
+    return StreamingResponse(
+        generate(),
+        media_type=EXPORT_FORMATS[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(trip_id, file_format)}"'}
+    )
+
+
 @router.post("/", response_model=TransactionResponse)
 def create_transaction(transaction: TransactionCreate, db: Session = Depends(get_db)):
     transaction_data = transaction.model_dump()
@@ -90,16 +353,110 @@ def create_transaction(transaction: TransactionCreate, db: Session = Depends(get
         transaction_date=transaction_date
     )
     db.add(db_transaction)
-    db.commit()
+    db.flush()
+    
+    # 交易与统计数据同一事务提交
+    _commit_with_stats(None, StatsService.snapshot_transaction(db_transaction, db), db)
     db.refresh(db_transaction)
     
-    # 更新统计数据
+    return db_transaction
+
+
+def _transaction_detail(txn: Transaction, splits: list, db: Session) -> dict:
+    """组装带分摊明细的交易响应（钱包、分类、成员名称各查询1次）"""
+    member_ids = {split.member_id for split in splits} | ({txn.payer_id} if txn.payer_id else set())
+    members_map = {m.id: m for m in db.query(Member).filter(Member.id.in_(member_ids)).all()} if member_ids else {}
+    wallet = db.query(Wallet).filter(Wallet.id == txn.wallet_id).first()
+    category = db.query(Category).filter(Category.id == txn.category_id).first() if txn.category_id else None
+    payer = members_map.get(txn.payer_id)
+    
+    return {
+        "id": txn.id,
+        "trip_id": txn.trip_id,
+        "wallet_id": txn.wallet_id,
+        "category_id": txn.category_id,
+        "transaction_type": txn.transaction_type,
+        "amount": txn.amount,
+        "payer_id": txn.payer_id,
+        "transaction_date": txn.transaction_date.strftime('%Y-%m-%d'),
+        "remark": txn.remark,
+        "created_at": txn.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        "wallet": {"id": wallet.id, "name": wallet.name} if wallet else None,
+        "category": {"id": category.id, "name": category.name} if category else None,
+        "payer": {"id": payer.id, "name": payer.name} if payer else None,
+        "splits": [
+            {
+                "id": split.id,
+                "transaction_id": split.transaction_id,
+                "member_id": split.member_id,
+                "member_name": members_map[split.member_id].name if split.member_id in members_map else "",
+                "amount": split.amount,
+                "split_method": split.split_method
+            }
+            for split in splits
+        ]
+    }
+
+
+@router.post("/expense", response_model=TransactionResponse)
+def create_expense(expense: ExpenseCreate, db: Session = Depends(get_db)):
+    """创建支出：按 equal/ratio/custom 分摊，分摊明细、扣款流水、余额扣减在同一事务内完成"""
     try:
-        StatsService.update_all_stats(db_transaction.trip_id, db)
-    except Exception as e:
-        print(f"Warning: Failed to update stats: {e}")
+        db_transaction, splits = TransactionService.create_expense(expense, db)
+    except TransactionError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return db_transaction
+    _commit_with_stats(None, StatsService.snapshot_transaction(db_transaction, db), db)
+    return _transaction_detail(db_transaction, splits, db)
+
+
+@router.post("/deposit", response_model=TransactionResponse)
+def create_deposit(deposit: DepositCreate, db: Session = Depends(get_db)):
+    """成员向钱包存入：存入流水与余额增加在同一事务内完成"""
+    try:
+        db_transaction = TransactionService.create_deposit(deposit, db)
+    except TransactionError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    _commit_with_stats(None, StatsService.snapshot_transaction(db_transaction, db), db)
+    return _transaction_detail(db_transaction, [], db)
+
+
+@router.post("/import", response_model=TransactionImportResult)
+def import_transactions(
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Query(None, alias="format", description="csv/ndjson，默认按文件扩展名判断"),
+    db: Session = Depends(get_db)
+):
+    """
+    批量导入交易（CSV 或 NDJSON，字段同 POST /api/transactions/）
+    
+    上传内容由 multipart 解析器流式落入临时文件，这里逐行读取、分批写入；
+    逐行报告错误。统计重算随每批交易登记到刷新队列，由后台每个行程只重算一次，不阻塞请求。
+    """
+    try:
+        file_format = detect_format(file.filename, file_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    result = import_rows(iter_rows(file.file, file_format), db)
+    
+    trip_ids = sorted(result['trip_ids'])
+    if trip_ids:
+        invalidate_trip_stats(*trip_ids)
+        invalidate_settlements(trip_ids, result['wallet_ids'])
+    
+    return {
+        "format": file_format,
+        "total_rows": result['total_rows'],
+        "imported": result['imported'],
+        "failed": result['failed'],
+        "errors": result['errors'],
+        "errors_truncated": result['errors_truncated'],
+        "trip_ids": trip_ids
+    }
 
 
 @router.get("/{transaction_id}", response_model=TransactionResponse)
@@ -113,45 +470,38 @@ def get_transaction(transaction_id: int, db: Session = Depends(get_db)):
 
 @router.put("/{transaction_id}", response_model=TransactionResponse)
 def update_transaction(transaction_id: int, transaction: TransactionUpdate, db: Session = Depends(get_db)):
-    db_transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+    # 锁定交易行，并发修改同一交易时旧快照不会被重复扣减
+    db_transaction = db.query(Transaction).filter(Transaction.id == transaction_id).with_for_update().first()
     if not db_transaction:
         raise HTTPException(status_code=404, detail="支出明细不存在")
     
-    update_data = transaction.model_dump(exclude_unset=True)
-    
-    if 'transaction_date' in update_data:
-        transaction_date_str = update_data.pop('transaction_date')
-        update_data['transaction_date'] = datetime.strptime(transaction_date_str, '%Y-%m-%d')
-    
-    for key, value in update_data.items():
-        setattr(db_transaction, key, value)
+    old_snapshot = StatsService.snapshot_transaction(db_transaction, db)
+    try:
+        # 分摊支出/存入修改金额、钱包或分摊时，撤销原记账后重新分摊并调整余额
+        TransactionService.update_transaction(db_transaction, transaction, db)
+    except TransactionError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     
-    db.commit()
+    _commit_with_stats(old_snapshot, StatsService.snapshot_transaction(db_transaction, db), db)
     db.refresh(db_transaction)
     
-    # 更新统计数据
-    try:
-        StatsService.update_all_stats(db_transaction.trip_id, db)
-    except Exception as e:
-        print(f"Warning: Failed to update stats: {e}")
-    
-    return db_transaction
+    splits = db.query(TransactionSplit).filter(
+        TransactionSplit.transaction_id == db_transaction.id
+    ).order_by(TransactionSplit.id).all()
+    return _transaction_detail(db_transaction, splits, db)
 
 
 @router.delete("/{transaction_id}")
 def delete_transaction(transaction_id: int, db: Session = Depends(get_db)):
-    db_transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+    db_transaction = db.query(Transaction).filter(Transaction.id == transaction_id).with_for_update().first()
     if not db_transaction:
         raise HTTPException(status_code=404, detail="支出明细不存在")
     
-    trip_id = db_transaction.trip_id
-    db.delete(db_transaction)
-    db.commit()
+    old_snapshot = StatsService.snapshot_transaction(db_transaction, db)
+    # 按余额流水恢复钱包成员余额，并删除流水与分摊明细
+    TransactionService.delete_transaction(db_transaction, db)
     
-    # 更新统计数据
-    try:
-        StatsService.update_all_stats(trip_id, db)
-    except Exception as e:
-        print(f"Warning: Failed to update stats: {e}")
+    _commit_with_stats(old_snapshot, None, db)
     
     return {"message": "支出明细已删除"}
@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
+from app.core.fast_json import FastJSONResponse
 from app.models.trip import Trip
 from app.models.member import Member
 from app.schemas.trip import TripCreate, TripUpdate, TripResponse
+from app.services.fast_reads import trip_rows
 
 router = APIRouter()
 
 
 @router.get("/", response_model=list[TripResponse])
-def list_trips(db: Session = Depends(get_db)):
+def list_trips(
+    fast: bool = Query(False, description="轻量读取：按列查询并直接编码JSON，跳过ORM对象与响应模型校验"),
+    db: Session = Depends(get_db)
+):
+    if fast:
+        return FastJSONResponse(trip_rows(db))
     trips = db.query(Trip).order_by(Trip.created_at.desc()).all()
     result = []
     for trip in trips:
@@ -1,19 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
 
 from app.core.database import get_db
+from app.core.fast_json import FastJSONResponse
 from app.models.wallet import Wallet
 from app.models.wallet_member import WalletMember
 from app.models.member import Member
 from app.schemas.wallet import WalletCreate, WalletUpdate, WalletResponse, WalletMemberResponse
+from app.services.fast_reads import wallet_rows
+from app.services.stats_queue import StatsRefreshQueue
+from app.services.stats_cache import invalidate_trip_stats
+from app.services.settlement_cache import invalidate_settlements
 
 router = APIRouter()
 
 
 @router.get("/")
-def list_wallets(trip_id: int = None, db: Session = Depends(get_db)):
+def list_wallets(
+    trip_id: int = None,
+    fast: bool = Query(False, description="轻量读取：按列查询并直接编码JSON，跳过ORM对象与响应模型校验"),
+    db: Session = Depends(get_db)
+):
     """获取钱包列表 - 优化版本（使用JOIN避免N+1）"""
+    if fast:
+        return FastJSONResponse(wallet_rows(db, trip_id))
+    
     query = db.query(Wallet)
     if trip_id:
         query = query.filter(Wallet.trip_id == trip_id)
@@ -83,9 +95,14 @@ def list_wallets(trip_id: int = None, db: Session = Depends(get_db)):
 def create_wallet(wallet: WalletCreate, db: Session = Depends(get_db)):
     db_wallet = Wallet(**wallet.model_dump())
     db.add(db_wallet)
+    # 重算登记与钱包写入同一事务提交
+    StatsRefreshQueue.enqueue(db_wallet.trip_id, db, commit=False)
     db.commit()
     db.refresh(db_wallet)
     
+    invalidate_trip_stats(db_wallet.trip_id)
+    invalidate_settlements([db_wallet.trip_id], [db_wallet.id])
+    
     return {
         "id": db_wallet.id,
         "name": db_wallet.name,
@@ -146,8 +163,13 @@ def delete_wallet(wallet_id: int, db: Session = Depends(get_db)):
     if not db_wallet:
         raise HTTPException(status_code=404, detail="钱包不存在")
     
+    trip_id = db_wallet.trip_id
     db.delete(db_wallet)
+    StatsRefreshQueue.enqueue(trip_id, db, commit=False)
     db.commit()
+    
+    invalidate_trip_stats(trip_id)
+    invalidate_settlements([trip_id], [wallet_id])
     return {"message": "钱包已删除"}
 
 
@@ -200,5 +222,10 @@ def batch_update_wallet_members(
             )
             db.add(wallet_member)
     
+    # 成员余额变化影响钱包统计：重算登记与余额写入同一事务提交
+    StatsRefreshQueue.enqueue(wallet.trip_id, db, commit=False)
     db.commit()
+    
+    invalidate_trip_stats(wallet.trip_id)
+    invalidate_settlements([wallet.trip_id], [wallet_id])
     return {"message": "成员余额已更新"}
@@ -12,6 +12,32 @@ class Settings(BaseSettings):
     DB_PASSWORD: str = ""
     DB_NAME: str = "family_finance"
     
+    # 统计刷新队列
+    STATS_QUEUE_ENABLED: bool = True
+    STATS_QUEUE_DEBOUNCE_SECONDS: float = 2.0
+    STATS_QUEUE_POLL_SECONDS: float = 1.0
+    STATS_QUEUE_BATCH_SIZE: int = 20
+    STATS_QUEUE_MAX_ATTEMPTS: int = 5
+    STATS_QUEUE_RETRY_BASE_SECONDS: float = 5.0
+    STATS_QUEUE_STALE_SECONDS: float = 600.0
+    
+    # 统计接口响应缓存
+    STATS_CACHE_SIZE: int = 1024
+    STATS_CACHE_TTL_SECONDS: float = 60.0
+    
+    # 结算方案求解（auto/greedy/exact/heuristic）
+    SETTLEMENT_STRATEGY: str = "auto"
+    SETTLEMENT_TIME_BUDGET_SECONDS: float = 0.5
+    SETTLEMENT_CACHE_SIZE: int = 512
+    SETTLEMENT_CACHE_TTL_SECONDS: float = 300.0
+    
+    # 交易批量导入
+    TRANSACTION_IMPORT_BATCH_SIZE: int = 500
+    TRANSACTION_IMPORT_MAX_ERRORS: int = 200
+    
+    # 交易流式导出（服务端游标每批读取行数）
+    TRANSACTION_EXPORT_BATCH_SIZE: int = 1000
+    
     @property
     def DATABASE_URL(self) -> str:
         return f"mysql+pymysql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?charset=utf8mb4"
@@ -0,0 +1,36 @@
+from datetime import date, datetime
+from typing import Any
+import json
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 未安装时退回标准库
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    序列化为 UTF-8 JSON 字节
+    
+    优先使用 orjson（C 实现，直接输出 bytes，原生支持 date/datetime 和非字符串键）；
+    未安装时用标准库 json，输出格式一致。
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+class FastJSONResponse(Response):
+    """直接把内容编码为 JSON 的响应，不经过 jsonable_encoder 和 response_model 校验"""
+    media_type = "application/json"
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
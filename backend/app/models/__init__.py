@@ -6,3 +6,5 @@ from .wallet import Wallet
 from .wallet_member import WalletMember
 from .transaction_split import TransactionSplit
 from .wallet_flow import WalletFlow
+from .stats_refresh_job import StatsRefreshJob
+from .stats_version import StatsVersion
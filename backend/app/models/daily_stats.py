@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, Float, Date, DateTime, Index
+from datetime import datetime
+from app.core.database import Base
+
+
+class DailyStats(Base):
+    __tablename__ = "daily_stats"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    trip_id = Column(Integer, nullable=False, comment="行程ID")
+    day = Column(Date, nullable=False, comment="交易日期")
+    category_id = Column(Integer, nullable=False, comment="分类ID")
+    member_id = Column(Integer, nullable=False, comment="成员ID")
+    amount = Column(Float, default=0.0, comment="当日分摊金额")
+    
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    __table_args__ = (
+        Index("ix_daily_stats_trip_day", "trip_id", "day"),
+        Index("ix_daily_stats_updated_at", "updated_at"),
+        Index("ix_daily_stats_trip_day_category_member", "trip_id", "day", "category_id", "member_id", unique=True),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, DateTime, Text, Index
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Index
 from datetime import datetime
 from app.core.database import Base
 
@@ -9,11 +9,11 @@ class MemberStats(Base):
     id = Column(Integer, primary_key=True, index=True)
     trip_id = Column(Integer, nullable=False, comment="行程ID")
     member_id = Column(Integer, nullable=False, comment="成员ID")
-    member_name = Column(Integer, comment="成员名称冗余字段")
+    member_name = Column(String(100), comment="成员名称冗余字段")
     
     total_amount = Column(Float, default=0.0, comment="总支出")
-    by_category = Column(Text, comment="按分类统计JSON字符串")
-    by_wallet = Column(Text, comment="按钱包统计JSON字符串")
+    by_category = Column(JSON, comment="按分类统计（键为分类ID）")
+    by_wallet = Column(JSON, comment="按钱包统计（键为钱包ID）")
     
     should_pay = Column(Float, default=0.0, comment="应付金额（平均值）")
     actual_paid = Column(Float, default=0.0, comment="实际支付金额")
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from datetime import datetime
+
+from app.core.database import Base
+
+
+class StatsRefreshJob(Base):
+    __tablename__ = "stats_refresh_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    trip_id = Column(Integer, nullable=False, unique=True, comment="行程ID（每个行程一行，重复登记合并）")
+    status = Column(String(20), nullable=False, default="pending", comment="pending/running/done/failed")
+    request_seq = Column(Integer, nullable=False, default=0, comment="登记次数，用于识别执行期间的新登记")
+    claimed_seq = Column(Integer, nullable=False, default=0, comment="worker领取时的登记次数")
+    attempts = Column(Integer, nullable=False, default=0, comment="连续失败次数")
+    last_error = Column(Text, nullable=True, comment="最近一次失败原因")
+    dirty_since = Column(DateTime, nullable=True, comment="最早一次未处理登记的时间")
+    available_at = Column(DateTime, nullable=True, comment="最早可执行时间（去抖/重试退避）")
+    started_at = Column(DateTime, nullable=True, comment="最近一次开始执行时间")
+    last_success_at = Column(DateTime, nullable=True, comment="最近一次成功刷新时间")
+    
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    __table_args__ = (
+        Index("ix_stats_refresh_jobs_status_available", "status", "available_at"),
+    )
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime
+from datetime import datetime
+
+from app.core.database import Base
+
+
+class StatsVersion(Base):
+    __tablename__ = "stats_versions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    trip_id = Column(Integer, nullable=False, unique=True, comment="行程ID")
+    version = Column(BigInteger, nullable=False, default=0, comment="统计版本号，每次重写统计数据时递增")
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
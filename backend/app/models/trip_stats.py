@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, DateTime, Text, Index
+from sqlalchemy import Column, Integer, Float, DateTime, JSON, Index
 from datetime import datetime
 from app.core.database import Base
 
@@ -11,8 +11,8 @@ class TripStats(Base):
     total_expense = Column(Float, default=0.0, comment="总支出")
     average_expense = Column(Float, default=0.0, comment="人均支出")
     member_count = Column(Integer, default=0, comment="成员数量")
-    category_totals = Column(Text, comment="分类汇总JSON字符串")
-    category_ratios = Column(Text, comment="分类占比JSON字符串")
+    category_totals = Column(JSON, comment="分类汇总（键为分类ID）")
+    category_ratios = Column(JSON, comment="分类占比（键为分类ID）")
     transaction_count = Column(Integer, default=0, comment="交易总数")
     
     created_at = Column(DateTime, default=datetime.now)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, DateTime, Text, Index
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Index
 from datetime import datetime
 from app.core.database import Base
 
@@ -9,9 +9,9 @@ class WalletStats(Base):
     id = Column(Integer, primary_key=True, index=True)
     trip_id = Column(Integer, nullable=False, comment="行程ID")
     wallet_id = Column(Integer, nullable=False, unique=True, comment="钱包ID")
-    wallet_name = Column(Integer, comment="钱包名称冗余字段")
+    wallet_name = Column(String(100), comment="钱包名称冗余字段")
     
-    balance_by_member = Column(Text, comment="成员余额JSON字符串")
+    balance_by_member = Column(JSON, comment="成员余额（键为成员ID）")
     total_balance = Column(Float, default=0.0, comment="总余额")
     
     transaction_count = Column(Integer, default=0, comment="交易数量")
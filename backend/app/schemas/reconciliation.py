@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 
@@ -34,6 +34,7 @@ class TripSummaryMember(BaseModel):
     total_balance: float
     total_deposited: float
     total_spent: float
+    net_position: Optional[float] = None
 
 
 class ReconciliationReport(BaseModel):
@@ -42,3 +43,43 @@ class ReconciliationReport(BaseModel):
     overall_balance: float
     wallets: List[WalletReconciliation]
     trip_summary: List[TripSummaryMember]
+    settlement_mode: str = "wallet"
+    trip_settlements: List[MemberSettlement] = []
+
+
+class SimulatedSplit(BaseModel):
+    member_id: int
+    amount: float = Field(..., gt=0)
+
+
+class SimulatedTransaction(BaseModel):
+    wallet_id: Optional[int] = Field(None, description="从钱包扣款/存入；为空表示付款人垫付")
+    transaction_type: str = Field(default="expense", pattern="^(expense|deposit)$", description="deposit/expense")
+    amount: float = Field(..., gt=0)
+    payer_id: Optional[int] = Field(None, description="支出的垫付人；存入交易必填，为存入成员")
+    splits: List[SimulatedSplit] = Field(default_factory=list, description="分摊明细，为空时在 split_members（默认全部成员）间均摊；存入交易不可用")
+    split_members: Optional[List[int]] = None
+
+
+class SimulationRequest(BaseModel):
+    transactions: List[SimulatedTransaction] = Field(..., min_length=1)
+    strategy: Optional[str] = None
+    time_budget: Optional[float] = Field(None, gt=0, le=10)
+
+
+class SimulatedMember(BaseModel):
+    member_id: int
+    member_name: str
+    total_spent: float
+    total_spent_after: float
+    net_position: float
+    net_position_after: float
+
+
+class SimulationResult(BaseModel):
+    trip_id: int
+    total_expense: float
+    total_expense_after: float
+    members: List[SimulatedMember]
+    settlements_before: List[MemberSettlement]
+    settlements: List[MemberSettlement]
@@ -63,6 +63,14 @@ class DepositCreate(BaseModel):
     amount: float = Field(..., gt=0)
     transaction_date: str
     remark: Optional[str] = None
+    
+    @field_validator('transaction_date')
+    @classmethod
+    def parse_date(cls, v):
+        try:
+            return str(parse(v).date())
+        except:
+            raise ValueError('日期格式错误,请使用 YYYY-MM-DD 格式')
 
 
 class ExpenseCreate(BaseModel):
@@ -76,6 +84,14 @@ class ExpenseCreate(BaseModel):
     split_ratios: Optional[Dict[int, float]] = None
     transaction_date: str
     remark: Optional[str] = None
+    
+    @field_validator('transaction_date')
+    @classmethod
+    def parse_date(cls, v):
+        try:
+            return str(parse(v).date())
+        except:
+            raise ValueError('日期格式错误,请使用 YYYY-MM-DD 格式')
 
 
 class TransactionCreate(TransactionBase):
@@ -88,6 +104,9 @@ class TransactionUpdate(BaseModel):
     amount: Optional[float] = Field(None, gt=0)
     transaction_date: Optional[str] = None
     remark: Optional[str] = None
+    split_method: Optional[str] = Field(None, description="equal/ratio/custom，仅分摊支出可修改")
+    split_members: Optional[List[int]] = None
+    split_ratios: Optional[Dict[int, float]] = None
 
 
 class TransactionResponse(TransactionBase):
@@ -117,6 +136,43 @@ class TransactionResponse(TransactionBase):
         return v
 
 
+
+class FacetBucket(BaseModel):
+    id: Optional[int] = None
+    name: Optional[str] = None
+    count: int
+    amount: float
+
+
+class DayFacetBucket(BaseModel):
+    date: str
+    count: int
+    amount: float
+
+
+class TransactionFacets(BaseModel):
+    category: List[FacetBucket] = []
+    wallet: List[FacetBucket] = []
+    payer: List[FacetBucket] = []
+    day: List[DayFacetBucket] = []
+
+
+class TransactionPage(BaseModel):
+    items: List[TransactionResponse] = []
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    facets: Optional[TransactionFacets] = None
+
+
+class TransactionSearchHit(TransactionResponse):
+    score: Optional[float] = None
+
+
+class TransactionSearchResult(BaseModel):
+    items: List[TransactionSearchHit] = []
+    has_more: bool = False
+    mode: str = Field(description="fulltext/fts5/like")
+
 class WalletFlowResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
@@ -137,3 +193,18 @@ class WalletFlowResponse(BaseModel):
         if isinstance(v, datetime):
             return v.strftime('%Y-%m-%d %H:%M:%S')
         return v
+
+
+class TransactionImportError(BaseModel):
+    line: int
+    error: str
+
+
+class TransactionImportResult(BaseModel):
+    format: str
+    total_rows: int
+    imported: int
+    failed: int
+    errors: List[TransactionImportError] = []
+    errors_truncated: bool = False
+    trip_ids: List[int] = []
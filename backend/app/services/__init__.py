@@ -1,3 +1,5 @@
 from app.services.stats_service import StatsService
+from app.services.stats_queue import StatsRefreshQueue, StatsRefreshWorker
+from app.services.transaction_service import TransactionService
 
-__all__ = ["StatsService"]
+__all__ = ["StatsService", "StatsRefreshQueue", "StatsRefreshWorker", "TransactionService"]
@@ -0,0 +1,189 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+from collections import defaultdict
+from typing import List
+
+from app.models.transaction import Transaction
+from app.models.transaction_split import TransactionSplit
+from app.models.wallet import Wallet
+from app.models.wallet_member import WalletMember
+from app.models.category import Category
+from app.models.member import Member
+from app.models.trip import Trip
+
+# 只读列表的轻量路径：按列选取 Core 行元组，不构造ORM对象、不进身份映射，
+# 结果直接交给 FastJSONResponse 编码，跳过 response_model 的二次校验。
+# 日期列转成 date 由 JSON 编码器输出 YYYY-MM-DD；时间列输出 YYYY-MM-DD HH:MM:SS，与常规接口一致。
+
+
+def _datetime(value):
+    return value.isoformat(' ', 'seconds') if value else None
+
+
+def _date(value):
+    return value.date() if value else None
+
+
+def transaction_rows(query, db: Session, skip: int, limit: int, include_splits: bool = False) -> List[dict]:
+    """
+    交易列表：钱包、分类、付款人名称通过 LEFT JOIN 在同一条查询中取回
+    
+    query 为已筛选的交易查询，排序与分页同常规列表接口；include_splits 时本页分摊明细（含成员名称）再查询1次。
+    """
+    payer = aliased(Member)
+    stmt = query.with_entities(
+        Transaction.id,
+        Transaction.trip_id,
+        Transaction.wallet_id,
+        Transaction.category_id,
+        Transaction.transaction_type,
+        Transaction.amount,
+        Transaction.payer_id,
+        Transaction.transaction_date,
+        Transaction.remark,
+        Transaction.created_at,
+        Wallet.name,
+        Category.name,
+        payer.name
+    ).outerjoin(
+        Wallet, Wallet.id == Transaction.wallet_id
+    ).outerjoin(
+        Category, Category.id == Transaction.category_id
+    ).outerjoin(
+        payer, payer.id == Transaction.payer_id
+    ).order_by(Transaction.transaction_date.desc()).offset(skip).limit(limit).statement
+    
+    rows = db.execute(stmt).all()
+    if not rows:
+        return []
+    
+    splits_by_transaction = defaultdict(list)
+    if include_splits:
+        split_rows = db.execute(
+            select(
+                TransactionSplit.id,
+                TransactionSplit.transaction_id,
+                TransactionSplit.member_id,
+                Member.name,
+                TransactionSplit.amount,
+                TransactionSplit.split_method
+            ).outerjoin(
+                Member, Member.id == TransactionSplit.member_id
+            ).where(
+                TransactionSplit.transaction_id.in_([row[0] for row in rows])
+            ).order_by(TransactionSplit.transaction_id, TransactionSplit.id)
+        ).all()
+        for split_id, transaction_id, member_id, member_name, amount, split_method in split_rows:
+            splits_by_transaction[transaction_id].append({
+                "id": split_id,
+                "transaction_id": transaction_id,
+                "member_id": member_id,
+                "member_name": member_name or "",
+                "amount": amount,
+                "split_method": split_method
+            })
+    
+    return [
+        {
+            "id": transaction_id,
+            "trip_id": trip_id,
+            "wallet_id": wallet_id,
+            "category_id": category_id,
+            "transaction_type": transaction_type,
+            "amount": amount,
+            "payer_id": payer_id,
+            "transaction_date": _date(transaction_date),
+            "remark": remark,
+            "created_at": _datetime(created_at),
+            "wallet": {"id": wallet_id, "name": wallet_name} if wallet_name is not None else None,
+            "category": {"id": category_id, "name": category_name} if category_name is not None else None,
+            "payer": {"id": payer_id, "name": payer_name} if payer_name is not None else None,
+            "splits": splits_by_transaction.get(transaction_id, [])
+        }
+        for (transaction_id, trip_id, wallet_id, category_id, transaction_type, amount, payer_id,
+             transaction_date, remark, created_at, wallet_name, category_name, payer_name) in rows
+    ]
+
+
+def trip_rows(db: Session) -> List[dict]:
+    """行程列表：行程1次、全部行程成员1次（常规接口按行程逐个查询成员）"""
+    trips = db.execute(select(
+        Trip.id,
+        Trip.name,
+        Trip.description,
+        Trip.start_date,
+        Trip.end_date,
+        Trip.status,
+        Trip.created_at,
+        Trip.updated_at
+    ).order_by(Trip.created_at.desc())).all()
+    if not trips:
+        return []
+    
+    members_by_trip = defaultdict(list)
+    for member_id, trip_id, name in db.execute(
+        select(Member.id, Member.trip_id, Member.name).where(Member.trip_id.in_([trip[0] for trip in trips]))
+    ):
+        members_by_trip[trip_id].append({"id": member_id, "name": name})
+    
+    return [
+        {
+            "id": trip_id,
+            "name": name,
+            "description": description,
+            "start_date": _date(start_date),
+            "end_date": _date(end_date),
+            "status": status,
+            "created_at": _datetime(created_at),
+            "updated_at": _datetime(updated_at),
+            "members": members_by_trip.get(trip_id, [])
+        }
+        for trip_id, name, description, start_date, end_date, status, created_at, updated_at in trips
+    ]
+
+
+def wallet_rows(db: Session, trip_id: int = None) -> List[dict]:
+    """钱包列表：钱包1次、钱包成员（含成员名称）1次，余额合计与归属比例在遍历元组时顺带算出"""
+    stmt = select(Wallet.id, Wallet.name, Wallet.trip_id, Wallet.created_at, Wallet.updated_at)
+    if trip_id:
+        stmt = stmt.where(Wallet.trip_id == trip_id)
+    wallets = db.execute(stmt.order_by(Wallet.created_at.desc())).all()
+    if not wallets:
+        return []
+    
+    members_by_wallet = defaultdict(list)
+    for wallet_member_id, wallet_id, member_id, balance, member_name in db.execute(
+        select(
+            WalletMember.id,
+            WalletMember.wallet_id,
+            WalletMember.member_id,
+            WalletMember.balance,
+            Member.name
+        ).join(
+            Member, Member.id == WalletMember.member_id
+        ).where(WalletMember.wallet_id.in_([wallet[0] for wallet in wallets]))
+    ):
+        members_by_wallet[wallet_id].append({
+            "id": wallet_member_id,
+            "member_id": member_id,
+            "member_name": member_name or "未知成员",
+            "balance": balance
+        })
+    
+    result = []
+    for wallet_id, name, wallet_trip_id, created_at, updated_at in wallets:
+        members = members_by_wallet.get(wallet_id, [])
+        total_balance = sum(member["balance"] for member in members)
+        result.append({
+            "id": wallet_id,
+            "name": name,
+            "balance": total_balance,
+            "trip_id": wallet_trip_id,
+            "created_at": _datetime(created_at),
+            "updated_at": _datetime(updated_at),
+            "members": members,
+            "ownership": {
+                member["member_id"]: member["balance"] / total_balance for member in members
+            } if total_balance > 0 else {}
+        })
+    return result
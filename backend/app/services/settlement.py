@@ -0,0 +1,224 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import time
+
+from app.core.config import settings
+
+# 转账记录：(付款成员ID, 收款成员ID, 金额分)
+Transfer = Tuple[int, int, int]
+
+STRATEGIES = ('auto', 'greedy', 'exact', 'heuristic')
+
+# 精确求解按子集状态压缩DP，复杂度 O(2^n·n)，只用于小规模
+EXACT_MAX_MEMBERS = 16
+
+
+class SettlementTimeout(Exception):
+    """精确求解超出时间预算"""
+
+
+def _greedy(balances: Dict[int, int]) -> List[Transfer]:
+    """贪心：最大欠款方对最大应收方依次抵扣（原有算法，转账数不保证最少）"""
+    debtors = sorted(((-b, member_id) for member_id, b in balances.items() if b < 0), reverse=True)
+    creditors = sorted(((b, member_id) for member_id, b in balances.items() if b > 0), reverse=True)
+    
+    transfers = []
+    i = j = 0
+    debts = [d for d, _ in debtors]
+    credits = [c for c, _ in creditors]
+    while i < len(debtors) and j < len(creditors):
+        amount = min(debts[i], credits[j])
+        if amount > 0:
+            transfers.append((debtors[i][1], creditors[j][1], amount))
+        debts[i] -= amount
+        credits[j] -= amount
+        if debts[i] == 0:
+            i += 1
+        if credits[j] == 0:
+            j += 1
+    return transfers
+
+
+def _settle_groups(balances: Dict[int, int], groups: List[List[int]]) -> List[Transfer]:
+    """每个零和分组内部用贪心结算，k人的分组最多 k-1 笔转账"""
+    transfers = []
+    for group in groups:
+        transfers.extend(_greedy({member_id: balances[member_id] for member_id in group}))
+    return transfers
+
+
+def _exact(balances: Dict[int, int], deadline: float) -> List[Transfer]:
+    """
+    精确最少转账：把成员划分为尽可能多的零和子组（最少转账数 = 非零人数 - 子组数）
+    
+    dp[mask] 为 mask 内最多可划分出的零和子组数；沿最优链回溯，相邻两个零和状态之差即一个子组。
+    """
+    members = [member_id for member_id, b in balances.items() if b != 0]
+    n = len(members)
+    if n == 0:
+        return []
+    if n > EXACT_MAX_MEMBERS:
+        raise SettlementTimeout(f"精确求解最多支持 {EXACT_MAX_MEMBERS} 人，当前 {n} 人")
+    
+    values = [balances[member_id] for member_id in members]
+    size = 1 << n
+    subset_sum = [0] * size
+    dp = [0] * size
+    for mask in range(1, size):
+        if not mask & 0xFFF and time.monotonic() > deadline:
+            raise SettlementTimeout("精确求解超出时间预算")
+        low = mask & -mask
+        subset_sum[mask] = subset_sum[mask ^ low] + values[low.bit_length() - 1]
+        best = 0
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            if dp[mask ^ bit] > best:
+                best = dp[mask ^ bit]
+            rest ^= bit
+        dp[mask] = best + (1 if subset_sum[mask] == 0 else 0)
+    
+    groups = []
+    mask = size - 1
+    group_end = mask
+    while mask:
+        target = dp[mask] - (1 if subset_sum[mask] == 0 else 0)
+        if subset_sum[mask] == 0 and mask != group_end:
+            groups.append(group_end ^ mask)
+            group_end = mask
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            if dp[mask ^ bit] == target:
+                mask ^= bit
+                break
+            rest ^= bit
+    groups.append(group_end)
+    
+    return _settle_groups(balances, [
+        [members[i] for i in range(n) if group >> i & 1]
+        for group in groups
+    ])
+
+
+def _heuristic(balances: Dict[int, int], deadline: float) -> List[Transfer]:
+    """
+    限时启发式：先配对金额正好相反的两人，再在剩余成员中依次找三人、四人零和组，
+    每个零和组单独结算；超时或找不到时剩余成员用贪心收尾
+    """
+    remaining = {member_id: b for member_id, b in balances.items() if b != 0}
+    groups = []
+    
+    # 两人零和：按金额建索引，一遍配对
+    by_amount = defaultdict(list)
+    for member_id, b in remaining.items():
+        by_amount[b].append(member_id)
+    for amount in list(by_amount):
+        if amount <= 0:
+            continue
+        positives, negatives = by_amount[amount], by_amount.get(-amount, [])
+        while positives and negatives:
+            groups.append([positives.pop(), negatives.pop()])
+    for group in groups:
+        for member_id in group:
+            del remaining[member_id]
+    
+    # 三人零和：枚举两人，查找金额为两人之和相反数的第三人
+    found = True
+    while found and len(remaining) >= 3 and time.monotonic() < deadline:
+        found = False
+        index = defaultdict(set)
+        for member_id, b in remaining.items():
+            index[b].add(member_id)
+        members = sorted(remaining, key=lambda member_id: remaining[member_id])
+        for a_pos, a in enumerate(members):
+            if time.monotonic() > deadline:
+                break
+            for b in members[a_pos + 1:]:
+                candidates = index.get(-(remaining[a] + remaining[b]), set()) - {a, b}
+                if candidates:
+                    c = min(candidates)
+                    groups.append([a, b, c])
+                    for member_id in (a, b, c):
+                        index[remaining.pop(member_id)].discard(member_id)
+                    found = True
+                    break
+            if found:
+                break
+    
+    # 四人零和：按两人之和建索引，查找和互为相反数且不重叠的两对
+    found = True
+    while found and len(remaining) >= 4 and time.monotonic() < deadline:
+        found = False
+        members = sorted(remaining)
+        pair_sums = defaultdict(list)
+        for a_pos, a in enumerate(members):
+            for b in members[a_pos + 1:]:
+                pair_sums[remaining[a] + remaining[b]].append((a, b))
+        for total, pairs in pair_sums.items():
+            if total < 0 or time.monotonic() > deadline:
+                continue
+            for a, b in pairs:
+                match = next((pair for pair in pair_sums.get(-total, []) if a not in pair and b not in pair), None)
+                if match:
+                    groups.append([a, b, *match])
+                    for member_id in (a, b, *match):
+                        del remaining[member_id]
+                    found = True
+                    break
+            if found:
+                break
+    
+    transfers = _settle_groups(balances, groups)
+    transfers.extend(_greedy(remaining))
+    return transfers
+
+
+def solve_settlements(
+    balances: Dict[int, int],
+    strategy: Optional[str] = None,
+    time_budget: Optional[float] = None
+) -> List[Transfer]:
+    """
+    根据成员净额（分，正数应收、负数应付，总和须为0）生成转账方案
+    
+    strategy: greedy 贪心；exact 精确最少转账（小规模）；heuristic 限时启发式（大规模）；
+    auto 按非零人数自动选择。exact 超出时间预算时退回启发式。
+    """
+    strategy = strategy or settings.SETTLEMENT_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"未知的结算策略: {strategy}")
+    if sum(balances.values()) != 0:
+        raise ValueError("成员净额之和必须为0")
+    
+    time_budget = settings.SETTLEMENT_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+    deadline = time.monotonic() + time_budget
+    
+    if strategy == 'greedy':
+        return _greedy(balances)
+    
+    nonzero = sum(1 for b in balances.values() if b != 0)
+    if strategy == 'exact' or (strategy == 'auto' and nonzero <= EXACT_MAX_MEMBERS):
+        try:
+            return _exact(balances, deadline)
+        except SettlementTimeout:
+            # 精确求解用尽预算后，启发式只保证给出可行方案
+            deadline = time.monotonic() + time_budget
+    return _heuristic(balances, deadline)
+
+
+def balances_from_targets(current: Dict[int, int]) -> Dict[int, int]:
+    """
+    以平均值为目标计算每人净额（分）：总额不能整除时，余下的分分给余额最高的成员，
+    保证净额之和严格为0
+    """
+    if not current:
+        return {}
+    total = sum(current.values())
+    base, remainder = divmod(total, len(current))
+    ordered = sorted(current, key=lambda member_id: (-current[member_id], member_id))
+    extra = set(ordered[:remainder])
+    return {
+        member_id: balance - base - (1 if member_id in extra else 0)
+        for member_id, balance in current.items()
+    }
@@ -0,0 +1,41 @@
+from typing import Dict, Iterable, List, Optional
+
+from app.core.cache import LRUTTLCache
+from app.core.config import settings
+from app.services.settlement import Transfer, solve_settlements
+
+
+# 结算方案缓存，键为 ('wallet', wallet_id, 策略, 时间预算) 或 ('trip', trip_id, 策略, 时间预算)，
+# 值为 (余额指纹, 转账方案)
+settlement_cache = LRUTTLCache(maxsize=settings.SETTLEMENT_CACHE_SIZE, ttl=settings.SETTLEMENT_CACHE_TTL_SECONDS)
+
+
+def balance_fingerprint(positions: Dict[int, int]) -> tuple:
+    """成员净额向量的指纹：净额相同则转账方案相同"""
+    return tuple(sorted((member_id, cents) for member_id, cents in positions.items() if cents))
+
+
+def cached_solve(
+    scope: tuple,
+    positions: Dict[int, int],
+    strategy: Optional[str] = None,
+    time_budget: Optional[float] = None
+) -> List[Transfer]:
+    """按余额指纹复用已求解的转账方案；指纹不一致（余额已变化）时重新求解并覆盖"""
+    key = scope + (strategy or settings.SETTLEMENT_STRATEGY, time_budget)
+    fingerprint = balance_fingerprint(positions)
+    cached = settlement_cache.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    
+    generation = settlement_cache.generation
+    transfers = solve_settlements(positions, strategy, time_budget)
+    settlement_cache.set(key, (fingerprint, transfers), generation=generation)
+    return transfers
+
+
+def invalidate_settlements(trip_ids: Iterable[int] = (), wallet_ids: Iterable[int] = ()):
+    """钱包余额或交易变更后，清除相关钱包和行程的缓存方案"""
+    targets = {('trip', trip_id) for trip_id in trip_ids} | {('wallet', wallet_id) for wallet_id in wallet_ids}
+    if targets:
+        settlement_cache.invalidate_where(lambda key: key[:2] in targets)
@@ -0,0 +1,118 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Mapping, Optional
+
+SPLIT_METHODS = ('equal', 'ratio', 'custom')
+
+# 比例换算为整数权重时最多保留的小数位数，之后全程整数运算，不受浮点误差影响
+RATIO_MAX_DECIMALS = 6
+
+_RATIO_SCALE = 10 ** RATIO_MAX_DECIMALS
+_CENT = Decimal('0.01')
+_HALF_CENT_TOLERANCE = 1e-3
+
+
+class SplitError(ValueError):
+    """分摊参数不合法"""
+
+
+def amount_to_cents(amount: float) -> int:
+    """
+    金额（元）转换为整数分，按十进制四舍五入
+    
+    绝大多数金额乘100后离整数很近，直接取整；只有落在半分附近的值才按浮点数的最短十进制表示
+    用 Decimal 舍入，避免 1.005 * 100 = 100.49999... 被舍成 100
+    """
+    cents = amount * 100
+    nearest = round(cents)
+    if abs(abs(cents - nearest) - 0.5) > _HALF_CENT_TOLERANCE:
+        return int(nearest)
+    return int(Decimal(repr(amount)).quantize(_CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def cents_to_amount(cents: int) -> float:
+    """整数分转换为金额（元）"""
+    return round(cents / 100, 2)
+
+
+def ratio_weights(ratios: List[float]) -> List[int]:
+    """
+    比例统一放大 10^RATIO_MAX_DECIMALS 倍并四舍五入为整数权重
+    
+    不超过该位数的十进制比例（如 0.1 : 0.2 : 0.3）换算后是精确的整数，比例关系保持不变
+    """
+    return [round(ratio * _RATIO_SCALE) for ratio in ratios]
+
+
+def largest_remainder(total: int, member_ids: List[int], weights: List[int]) -> Dict[int, int]:
+    """
+    最大余数法：每人先取 floor(total * w / W)，剩余的分按余数从大到小各补1分
+    
+    余数相同时按 member_ids 中的先后顺序补足；剩余的分数一定小于人数，
+    所以只需取余数最大的前若干位，各份额之和严格等于 total。
+    """
+    weight_total = sum(weights)
+    if weight_total <= 0 or any(weight < 0 for weight in weights):
+        raise SplitError("分摊比例必须为非负数且总和大于0")
+    
+    products = [total * weight for weight in weights]
+    shares = [product // weight_total for product in products]
+    remainders = [product % weight_total for product in products]
+    leftover = total - sum(shares)
+    if leftover:
+        # 稳定排序，reverse 时余数相同的成员仍保持原有先后顺序
+        for i in sorted(range(len(shares)), key=remainders.__getitem__, reverse=True)[:leftover]:
+            shares[i] += 1
+    return dict(zip(member_ids, shares))
+
+
+def split_equal(total: int, member_ids: Iterable[int]) -> Dict[int, int]:
+    """平均分摊：除不尽的分依次分给ID最小的成员"""
+    member_ids = sorted(set(member_ids))
+    if not member_ids:
+        raise SplitError("没有可分摊的成员")
+    base, remainder = divmod(total, len(member_ids))
+    return {member_id: base + (1 if i < remainder else 0) for i, member_id in enumerate(member_ids)}
+
+
+def split_ratio(total: int, ratios: Mapping[int, float]) -> Dict[int, int]:
+    """按比例分摊：比例换算为整数权重后用最大余数法取整"""
+    if not ratios:
+        raise SplitError("按比例分摊时必须提供 split_ratios")
+    member_ids = sorted(ratios)
+    return largest_remainder(total, member_ids, ratio_weights([ratios[member_id] for member_id in member_ids]))
+
+
+def split_custom(total: int, amounts: Mapping[int, float]) -> Dict[int, int]:
+    """自定义金额：逐人换算为分，之和必须等于交易金额"""
+    if not amounts:
+        raise SplitError("自定义分摊时必须提供 split_ratios")
+    shares = {member_id: amount_to_cents(amount) for member_id, amount in amounts.items()}
+    if any(cents < 0 for cents in shares.values()):
+        raise SplitError("自定义分摊金额不能为负数")
+    if sum(shares.values()) != total:
+        raise SplitError("自定义分摊金额之和必须等于交易金额")
+    return shares
+
+
+def compute_split(
+    total: int,
+    method: str,
+    split_members: Optional[List[int]] = None,
+    split_ratios: Optional[Mapping[int, float]] = None,
+    default_members: Iterable[int] = ()
+) -> Dict[int, int]:
+    """
+    按分摊方式计算每位成员的份额（分），各份额之和严格等于 total
+    
+    参数与 ExpenseCreate 的 split_method / split_members / split_ratios 对应；
+    平均分摊未指定成员时使用 default_members（通常为钱包全部成员）。
+    """
+    if total < 0:
+        raise SplitError("分摊金额不能为负数")
+    if method == "equal":
+        return split_equal(total, split_members or default_members)
+    if method == "ratio":
+        return split_ratio(total, split_ratios)
+    if method == "custom":
+        return split_custom(total, split_ratios)
+    raise SplitError(f"未知的分摊方式: {method}")
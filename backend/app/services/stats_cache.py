@@ -0,0 +1,19 @@
+from typing import Iterable
+
+from app.core.cache import LRUTTLCache
+from app.core.config import settings
+
+
+# 已组装的统计接口响应缓存，键为 (接口名, trip_id, ...)
+stats_cache = LRUTTLCache(maxsize=settings.STATS_CACHE_SIZE, ttl=settings.STATS_CACHE_TTL_SECONDS)
+
+
+def invalidate_trip_stats(*trip_ids: int):
+    """统计数据或其来源（交易、钱包、成员）变更后，清除相关行程的缓存响应"""
+    targets = set(trip_ids)
+    if targets:
+        stats_cache.invalidate_where(lambda key: key[1] in targets)
+
+
+def invalidate_trips_stats(trip_ids: Iterable[int]):
+    invalidate_trip_stats(*trip_ids)
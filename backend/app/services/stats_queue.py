@@ -0,0 +1,223 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import or_, and_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from datetime import datetime, timedelta
+from typing import List, Optional
+import threading
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.logging import get_logger
+from app.models.stats_refresh_job import StatsRefreshJob
+from app.services.stats_service import StatsService
+
+logger = get_logger(__name__)
+
+
+class StatsRefreshQueue:
+    """统计刷新队列 - 以行程为粒度登记"需要重算"，同一行程的重复登记合并为一个任务"""
+    
+    @staticmethod
+    def enqueue(trip_id: int, db: Session, commit: bool = True):
+        """
+        登记行程统计需要重算（在去抖窗口内重复登记只会执行一次）
+        
+        commit=False 时只写入当前事务，由调用方与业务写入一起提交，"需要重算"的登记随变更一起持久化。
+        """
+        now = datetime.now()
+        try:
+            StatsRefreshQueue._ensure_job(trip_id, db)
+            job = db.query(StatsRefreshJob).filter(
+                StatsRefreshJob.trip_id == trip_id
+            ).with_for_update().one()
+            
+            job.request_seq = (job.request_seq or 0) + 1
+            if job.status in (None, "done", "failed"):
+                # 新一轮脏数据：窗口从首次登记开始计算，持续写入不会无限推迟刷新
+                job.status = "pending"
+                job.attempts = 0
+                job.dirty_since = now
+                job.available_at = now + timedelta(seconds=settings.STATS_QUEUE_DEBOUNCE_SECONDS)
+            elif job.dirty_since is None:
+                job.dirty_since = now
+            
+            if commit:
+                db.commit()
+            else:
+                db.flush()
+        except Exception:
+            if commit:
+                db.rollback()
+            raise
+    
+    @staticmethod
+    def _ensure_job(trip_id: int, db: Session):
+        """行程的任务行不存在时插入（已存在则忽略），并发登记不会因唯一键冲突而中断所在事务"""
+        table = StatsRefreshJob.__table__
+        now = datetime.now()
+        row = {
+            'trip_id': trip_id, 'status': 'done', 'request_seq': 0, 'claimed_seq': 0, 'attempts': 0,
+            'created_at': now, 'updated_at': now
+        }
+        dialect = db.get_bind().dialect.name
+        
+        if dialect == 'mysql':
+            stmt = table.insert().values(row).prefix_with('IGNORE')
+        elif dialect in ('sqlite', 'postgresql'):
+            insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+            stmt = insert(table).values(row).on_conflict_do_nothing(index_elements=['trip_id'])
+        else:
+            if db.query(StatsRefreshJob.id).filter(StatsRefreshJob.trip_id == trip_id).first():
+                return
+            stmt = table.insert().values(row)
+        
+        db.execute(stmt)
+    
+    @staticmethod
+    def claim_due(db: Session, limit: int) -> List[StatsRefreshJob]:
+        """领取到期任务；通过条件UPDATE抢占，多个worker并存时同一任务只会被领取一次"""
+        now = datetime.now()
+        stale_before = now - timedelta(seconds=settings.STATS_QUEUE_STALE_SECONDS)
+        
+        candidates = db.query(StatsRefreshJob).filter(
+            or_(
+                and_(StatsRefreshJob.status == "pending", StatsRefreshJob.available_at <= now),
+                and_(StatsRefreshJob.status == "running", StatsRefreshJob.started_at < stale_before)
+            )
+        ).order_by(StatsRefreshJob.available_at).limit(limit).all()
+        
+        claimed = []
+        for job in candidates:
+            updated = db.query(StatsRefreshJob).filter(
+                StatsRefreshJob.id == job.id,
+                StatsRefreshJob.status == job.status,
+                StatsRefreshJob.request_seq == job.request_seq
+            ).update(
+                {
+                    StatsRefreshJob.status: "running",
+                    StatsRefreshJob.started_at: now,
+                    StatsRefreshJob.claimed_seq: job.request_seq
+                },
+                synchronize_session=False
+            )
+            if updated:
+                claimed.append(job.trip_id)
+        db.commit()
+        
+        if not claimed:
+            return []
+        return db.query(StatsRefreshJob).filter(StatsRefreshJob.trip_id.in_(claimed)).all()
+    
+    @staticmethod
+    def mark_success(job: StatsRefreshJob, db: Session):
+        now = datetime.now()
+        job = db.query(StatsRefreshJob).filter(StatsRefreshJob.id == job.id).with_for_update().one()
+        job.last_success_at = now
+        job.attempts = 0
+        job.last_error = None
+        if job.request_seq > job.claimed_seq:
+            # 执行期间又有新的登记，保留为待处理
+            job.status = "pending"
+            job.dirty_since = job.started_at
+            job.available_at = now + timedelta(seconds=settings.STATS_QUEUE_DEBOUNCE_SECONDS)
+        else:
+            job.status = "done"
+            job.dirty_since = None
+            job.available_at = None
+        db.commit()
+    
+    @staticmethod
+    def mark_failure(job: StatsRefreshJob, error: Exception, db: Session):
+        now = datetime.now()
+        job = db.query(StatsRefreshJob).filter(StatsRefreshJob.id == job.id).with_for_update().one()
+        job.attempts = (job.attempts or 0) + 1
+        job.last_error = str(error)[:2000]
+        if job.attempts >= settings.STATS_QUEUE_MAX_ATTEMPTS:
+            job.status = "failed"
+            job.available_at = None
+        else:
+            backoff = settings.STATS_QUEUE_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+            job.status = "pending"
+            job.available_at = now + timedelta(seconds=backoff)
+        db.commit()
+    
+    @staticmethod
+    def get_status(trip_id: int, db: Session) -> dict:
+        """查询行程的刷新队列状态（排队延迟、最近一次成功刷新）"""
+        job = db.query(StatsRefreshJob).filter(StatsRefreshJob.trip_id == trip_id).first()
+        if not job:
+            return {
+                "status": None,
+                "pending": False,
+                "lag_seconds": 0,
+                "attempts": 0,
+                "last_error": None,
+                "last_success_at": None
+            }
+        
+        pending = job.status in ("pending", "running", "failed")
+        lag_seconds = 0
+        if pending and job.dirty_since:
+            lag_seconds = round((datetime.now() - job.dirty_since).total_seconds(), 1)
+        
+        return {
+            "status": job.status,
+            "pending": pending,
+            "lag_seconds": lag_seconds,
+            "attempts": job.attempts,
+            "last_error": job.last_error,
+            "last_success_at": job.last_success_at.strftime('%Y-%m-%d %H:%M:%S') if job.last_success_at else None
+        }
+
+
+class StatsRefreshWorker:
+    """后台统计刷新worker - 随应用启动，轮询队列并全量重算到期的行程"""
+    
+    def __init__(self, poll_seconds: float = None, batch_size: int = None):
+        self.poll_seconds = poll_seconds or settings.STATS_QUEUE_POLL_SECONDS
+        self.batch_size = batch_size or settings.STATS_QUEUE_BATCH_SIZE
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="stats-refresh-worker", daemon=True)
+        self._thread.start()
+        logger.info("Stats refresh worker started")
+    
+    def stop(self, timeout: float = 10.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        logger.info("Stats refresh worker stopped")
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                logger.error(f"Stats refresh worker loop failed: {e}")
+                processed = 0
+            if not processed:
+                self._stop_event.wait(self.poll_seconds)
+    
+    def run_once(self) -> int:
+        """处理一批到期任务，返回处理数量"""
+        db = SessionLocal()
+        try:
+            jobs = StatsRefreshQueue.claim_due(db, self.batch_size)
+            for job in jobs:
+                try:
+                    StatsService.update_all_stats(job.trip_id, db)
+                    StatsRefreshQueue.mark_success(job, db)
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f"Failed to refresh stats for trip {job.trip_id} (attempt {job.attempts + 1}): {e}")
+                    StatsRefreshQueue.mark_failure(job, e, db)
+            return len(jobs)
+        finally:
+            db.close()
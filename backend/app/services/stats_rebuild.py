@@ -0,0 +1,167 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import or_
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+import json
+import threading
+import time
+
+from app.core.database import SessionLocal
+from app.core.logging import get_logger
+from app.models.trip import Trip
+from app.models.transaction import Transaction
+from app.models.stats_version import StatsVersion
+from app.models.stats_refresh_job import StatsRefreshJob
+from app.services.stats_service import StatsService
+from app.services.stats_cache import invalidate_trip_stats
+
+logger = get_logger(__name__)
+
+
+class RebuildCheckpoint:
+    """重建进度检查点 - 记录已完成的行程ID，重跑时跳过"""
+    
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = set()
+        if path and path.exists():
+            self._done = set(json.loads(path.read_text(encoding='utf-8')).get('done', []))
+    
+    def is_done(self, trip_id: int) -> bool:
+        return trip_id in self._done
+    
+    def mark_done(self, trip_ids: List[int]):
+        with self._lock:
+            self._done.update(trip_ids)
+            if not self.path:
+                return
+            # 先写临时文件再替换，进程中断时不会留下半个检查点
+            tmp_path = self.path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps({'done': sorted(self._done)}), encoding='utf-8')
+            tmp_path.replace(self.path)
+    
+    def clear(self):
+        with self._lock:
+            self._done = set()
+            if self.path and self.path.exists():
+                self.path.unlink()
+
+
+def select_trip_ids(db: Session, since: Optional[datetime] = None) -> List[int]:
+    """
+    获取需要重建的行程ID；指定since时只返回之后有变更的行程
+    
+    变更指：行程本身更新（trips.updated_at）、新增交易、统计版本号递增（交易增删改的增量维护、
+    统计重算，stats_versions.updated_at），或登记过统计重算（成员、钱包、余额变更及增量失败，
+    stats_refresh_jobs.updated_at）。交易表没有 updated_at，修改和删除交易通过后两者体现。
+    """
+    query = db.query(Trip.id)
+    if since:
+        query = query.filter(or_(
+            Trip.updated_at >= since,
+            Trip.id.in_(db.query(Transaction.trip_id).filter(Transaction.created_at >= since)),
+            Trip.id.in_(db.query(StatsVersion.trip_id).filter(StatsVersion.updated_at >= since)),
+            Trip.id.in_(db.query(StatsRefreshJob.trip_id).filter(StatsRefreshJob.updated_at >= since))
+        ))
+    return [trip_id for trip_id, in query.order_by(Trip.id).all()]
+
+
+def chunk_trip_ids(trip_ids: List[int], chunk_size: int) -> List[Tuple[int, int, List[int]]]:
+    """按行程ID区间切块，返回 (起始ID, 结束ID, 块内ID列表)"""
+    chunks = []
+    for i in range(0, len(trip_ids), chunk_size):
+        ids = trip_ids[i:i + chunk_size]
+        chunks.append((ids[0], ids[-1], ids))
+    return chunks
+
+
+def rebuild_stats(
+    workers: int = 4,
+    chunk_size: int = 50,
+    since: Optional[datetime] = None,
+    checkpoint_path: Optional[Path] = None,
+    reset: bool = False,
+    tables: dict = None,
+    progress: Callable[[str], None] = print
+) -> dict:
+    """
+    并行重建所有行程的统计数据
+    
+    每个worker处理一个行程ID区间并使用独立的Session；每完成一个区间写一次检查点，
+    中断后重跑会跳过已完成的行程。tables可指定写入目标（如影子表）。
+    """
+    checkpoint = RebuildCheckpoint(checkpoint_path)
+    if reset:
+        checkpoint.clear()
+    
+    db = SessionLocal()
+    try:
+        trip_ids = select_trip_ids(db, since)
+    finally:
+        db.close()
+    
+    pending_ids = [trip_id for trip_id in trip_ids if not checkpoint.is_done(trip_id)]
+    skipped = len(trip_ids) - len(pending_ids)
+    chunks = chunk_trip_ids(pending_ids, chunk_size)
+    progress(f"🔍 共 {len(trip_ids)} 个行程，跳过已完成 {skipped} 个，待处理 {len(pending_ids)} 个（{len(chunks)} 个区间）")
+    
+    state = {'success': 0, 'failed': 0, 'failures': []}
+    state_lock = threading.Lock()
+    started = time.monotonic()
+    
+    def run_chunk(chunk: Tuple[int, int, List[int]]):
+        start_id, end_id, ids = chunk
+        session = SessionLocal()
+        done, failures = [], []
+        try:
+            for trip_id in ids:
+                try:
+                    rows = StatsService.compute_trip_rows(trip_id, session)
+                    StatsService.write_trip_rows(trip_id, rows, session, tables=tables)
+                    session.commit()
+                    if tables is None:
+                        invalidate_trip_stats(trip_id)
+                    done.append(trip_id)
+                except Exception as e:
+                    session.rollback()
+                    failures.append((trip_id, str(e)))
+        finally:
+            session.close()
+        checkpoint.mark_done(done)
+        return start_id, end_id, done, failures
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(run_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            start_id, end_id, done, failures = future.result()
+            with state_lock:
+                state['success'] += len(done)
+                state['failed'] += len(failures)
+                state['failures'].extend(failures)
+                processed = state['success'] + state['failed']
+            elapsed = time.monotonic() - started
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            progress(
+                f"📊 区间 [{start_id}-{end_id}] 完成：成功 {len(done)}，失败 {len(failures)}"
+                f" | 进度 {processed}/{len(pending_ids)} | {rate:.1f} 行程/秒"
+            )
+            for trip_id, error in failures:
+                logger.warning(f"Failed to rebuild stats for trip {trip_id}: {error}")
+    
+    elapsed = time.monotonic() - started
+    if state['failed'] == 0:
+        # 全部成功后清除检查点，下次运行重新完整重建
+        checkpoint.clear()
+    
+    return {
+        'total': len(trip_ids),
+        'skipped': skipped,
+        'success': state['success'],
+        'failed': state['failed'],
+        'failures': state['failures'],
+        'elapsed_seconds': elapsed,
+        'trips_per_second': (state['success'] + state['failed']) / elapsed if elapsed > 0 else 0.0
+    }
@@ -1,217 +1,800 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case
+from sqlalchemy import func, case, delete, exists, select, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 from collections import defaultdict
-from typing import List
-import json
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
 
 from app.models.trip_stats import TripStats
 from app.models.member_stats import MemberStats
 from app.models.wallet_stats import WalletStats
+from app.models.stats_version import StatsVersion
+from app.models.daily_stats import DailyStats
 from app.models.member import Member
 from app.models.transaction import Transaction
 from app.models.transaction_split import TransactionSplit
 from app.models.wallet import Wallet
 from app.models.wallet_member import WalletMember
+from app.models.wallet_flow import WalletFlow
 from app.models.category import Category
+from app.services.stats_cache import invalidate_trip_stats
+
+
+# 金额比较容差（增量累加存在浮点误差）
+AMOUNT_EPSILON = 0.005
+
+# 统计表（全量重算的默认写入目标）
+STATS_TABLES = {
+    'trip': TripStats.__table__,
+    'members': MemberStats.__table__,
+    'wallets': WalletStats.__table__,
+    'daily': DailyStats.__table__,
+}
+
+
+@dataclass
+class TransactionSnapshot:
+    """交易及其分摊明细的快照，用于增量维护统计数据"""
+    trip_id: int
+    wallet_id: int
+    category_id: Optional[int]
+    category_key: Optional[str]
+    transaction_type: str
+    amount: float
+    payer_id: Optional[int]
+    splits: List[Tuple[int, float]] = field(default_factory=list)
+    day: Optional[date] = None
+    wallet_funded: bool = False
+    
+    @property
+    def split_total(self) -> float:
+        return sum(amount for _, amount in self.splits)
+    
+    @property
+    def funding_payer_id(self) -> Optional[int]:
+        """垫付人：有付款人且不是钱包扣款（没有余额流水）的交易，与对账口径一致"""
+        return self.payer_id if self.payer_id and not self.wallet_funded else None
 
 
 class StatsService:
     """统计数据服务 - 负责维护统计表数据"""
     
+    ALL_PARTS = ('trip', 'members', 'wallets', 'daily')
+    
     @staticmethod
-    def update_trip_stats(trip_id: int, db: Session):
-        """更新行程统计数据"""
-        try:
-            # 获取所有成员
-            members = db.query(Member).filter(Member.trip_id == trip_id).all()
-            if not members:
-                return
-            
-            member_ids = [m.id for m in members]
-            
-            # 获取分类统计
-            category_stats = db.query(
-                Category.name,
-                func.sum(TransactionSplit.amount).label('amount')
+    def compute_trip_rows(trip_id: int, db: Session, parts: Tuple[str, ...] = ALL_PARTS) -> dict:
+        """
+        从明细表计算行程的统计行（不写库）
+        
+        查询次数固定，与成员数、钱包数无关：成员1次、成员×分类×钱包×付款人汇总1次、交易计数1次、
+        钱包1次、钱包交易汇总1次、钱包成员余额1次、按日汇总1次。
+        """
+        now = datetime.now()
+        rows = {'trip': None, 'members': [], 'wallets': [], 'daily': []}
+        
+        if 'trip' in parts or 'members' in parts:
+            members = db.query(Member.id, Member.name).filter(Member.trip_id == trip_id).all()
+            if members:
+                # 按成员×分类×钱包×付款人汇总分摊金额，一次扫描同时得到按分类、按钱包、
+                # 实际支付（付款人垫付的分摊金额）和行程级分类汇总
+                # 分类、钱包以ID为键（JSON对象键为字符串），改名不影响历史统计
+                # 垫付口径与对账一致：有付款人且没有钱包扣款流水；钱包扣款的支出由钱包支付，不计入付款人
+                payer_funded = case(
+                    (~exists().where(WalletFlow.transaction_id == Transaction.id), Transaction.payer_id),
+                    else_=None
+                )
+                member_category_stats = db.query(
+                    TransactionSplit.member_id,
+                    Transaction.category_id,
+                    Transaction.wallet_id,
+                    payer_funded.label('payer_id'),
+                    func.sum(TransactionSplit.amount).label('amount')
+                ).join(
+                    Transaction, Transaction.id == TransactionSplit.transaction_id
+                ).join(
+                    Category, Category.id == Transaction.category_id
+                ).filter(
+                    Transaction.trip_id == trip_id
+                ).group_by(
+                    TransactionSplit.member_id,
+                    Transaction.category_id,
+                    Transaction.wallet_id,
+                    payer_funded
+                ).all()
+                
+                category_totals = defaultdict(float)
+                member_data = defaultdict(lambda: {'by_category': defaultdict(float), 'by_wallet': defaultdict(float), 'total': 0.0})
+                actual_paid = defaultdict(float)
+                for member_id, category_id, wallet_id, payer_id, amount in member_category_stats:
+                    category = str(category_id)
+                    amount_float = float(amount)
+                    category_totals[category] += amount_float
+                    member_data[member_id]['by_category'][category] += amount_float
+                    member_data[member_id]['by_wallet'][str(wallet_id)] += amount_float
+                    member_data[member_id]['total'] += amount_float
+                    if payer_id:
+                        actual_paid[payer_id] += amount_float
+                
+                # 行程级与成员级共用同一个人均值（已删除成员的分摊也计入总支出）
+                total_expense = float(sum(category_totals.values()))
+                average_expense = total_expense / len(members)
+                
+                if 'trip' in parts:
+                    transaction_count = db.query(func.count(Transaction.id)).filter(
+                        Transaction.trip_id == trip_id
+                    ).scalar()
+                    rows['trip'] = {
+                        'trip_id': trip_id,
+                        'total_expense': total_expense,
+                        'average_expense': average_expense,
+                        'member_count': len(members),
+                        'category_totals': dict(category_totals),
+                        'category_ratios': StatsService._category_ratios(category_totals, total_expense),
+                        'transaction_count': transaction_count or 0,
+                        'created_at': now,
+                        'updated_at': now
+                    }
+                
+                if 'members' in parts:
+                    for member_id, member_name in members:
+                        data = member_data.get(member_id, {'by_category': {}, 'by_wallet': {}, 'total': 0.0})
+                        paid = actual_paid.get(member_id, 0.0)
+                        rows['members'].append({
+                            'trip_id': trip_id,
+                            'member_id': member_id,
+                            'member_name': member_name,
+                            'total_amount': data['total'],
+                            'by_category': dict(data['by_category']),
+                            'by_wallet': dict(data['by_wallet']),
+                            'should_pay': average_expense,
+                            'actual_paid': paid,
+                            'balance': paid - average_expense,
+                            'created_at': now,
+                            'updated_at': now
+                        })
+        
+        if 'wallets' in parts:
+            wallets = db.query(Wallet.id, Wallet.name).filter(Wallet.trip_id == trip_id).all()
+            if wallets:
+                wallet_ids = [wallet_id for wallet_id, _ in wallets]
+                
+                # 获取钱包交易统计
+                wallet_stats_data = db.query(
+                    Transaction.wallet_id,
+                    func.count(Transaction.id).label('transaction_count'),
+                    func.sum(case((Transaction.transaction_type == 'expense', Transaction.amount), else_=0)).label('total_spent'),
+                    func.sum(case((Transaction.transaction_type == 'deposit', Transaction.amount), else_=0)).label('total_deposited')
+                ).filter(
+                    Transaction.wallet_id.in_(wallet_ids)
+                ).group_by(Transaction.wallet_id).all()
+                
+                wallet_stats_map = {
+                    wallet_id: (count or 0, float(spent or 0), float(deposited or 0))
+                    for wallet_id, count, spent, deposited in wallet_stats_data
+                }
+                
+                # 一次取出所有钱包的成员余额
+                balances = defaultdict(dict)
+                for wallet_id, member_id, balance in db.query(
+                    WalletMember.wallet_id,
+                    WalletMember.member_id,
+                    WalletMember.balance
+                ).filter(WalletMember.wallet_id.in_(wallet_ids)).all():
+                    balances[wallet_id][member_id] = balance
+                
+                for wallet_id, wallet_name in wallets:
+                    count, spent, deposited = wallet_stats_map.get(wallet_id, (0, 0.0, 0.0))
+                    total_balance = sum(balances[wallet_id].values())
+                    rows['wallets'].append({
+                        'trip_id': trip_id,
+                        'wallet_id': wallet_id,
+                        'wallet_name': wallet_name,
+                        'balance_by_member': {str(member_id): balance for member_id, balance in balances[wallet_id].items()},
+                        'total_balance': total_balance,
+                        'transaction_count': count,
+                        'total_deposited': deposited,
+                        'total_spent': spent,
+                        'remaining': total_balance,
+                        'created_at': now,
+                        'updated_at': now
+                    })
+        
+        if 'daily' in parts:
+            # 按 (交易日期, 分类, 成员) 汇总分摊金额；按行程+日期过滤走 idx_trip_date
+            daily_amounts = defaultdict(float)
+            for transaction_date, category_id, member_id, amount in db.query(
+                Transaction.transaction_date,
+                Transaction.category_id,
+                TransactionSplit.member_id,
+                func.sum(TransactionSplit.amount)
             ).join(
-                Transaction, Transaction.id == TransactionSplit.transaction_id
+                TransactionSplit, TransactionSplit.transaction_id == Transaction.id
             ).join(
                 Category, Category.id == Transaction.category_id
             ).filter(
                 Transaction.trip_id == trip_id
-            ).group_by(Category.name).all()
-            
-            # 计算总支出
-            total_expense = float(sum(amount for _, amount in category_stats))
-            average_expense = total_expense / len(members) if members else 0
+            ).group_by(
+                Transaction.transaction_date,
+                Transaction.category_id,
+                TransactionSplit.member_id
+            ).all():
+                daily_amounts[(transaction_date.date(), category_id, member_id)] += float(amount)
             
-            # 构建分类数据
-            category_totals = {name: float(amount) for name, amount in category_stats}
-            category_ratios = {
-                name: round(amount / total_expense * 100, 2) if total_expense > 0 else 0
-                for name, amount in category_totals.items()
+            rows['daily'] = [
+                {
+                    'trip_id': trip_id,
+                    'day': day,
+                    'category_id': category_id,
+                    'member_id': member_id,
+                    'amount': amount,
+                    'created_at': now,
+                    'updated_at': now
+                }
+                for (day, category_id, member_id), amount in sorted(daily_amounts.items())
+            ]
+        
+        return rows
+    
+    @staticmethod
+    def compute_trip_summaries(trip_ids: List[int], db: Session) -> dict:
+        """
+        批量计算多个行程的汇总统计（总支出、人均、成员数、交易数），不写库
+        
+        口径与 compute_trip_rows 的行程级统计一致；无论行程数量多少，固定3次分组查询。
+        """
+        if not trip_ids:
+            return {}
+        
+        member_counts = dict(db.query(
+            Member.trip_id,
+            func.count(Member.id)
+        ).filter(Member.trip_id.in_(trip_ids)).group_by(Member.trip_id).all())
+        
+        expense_totals = dict(db.query(
+            Transaction.trip_id,
+            func.sum(TransactionSplit.amount)
+        ).join(
+            TransactionSplit, TransactionSplit.transaction_id == Transaction.id
+        ).join(
+            Category, Category.id == Transaction.category_id
+        ).filter(
+            Transaction.trip_id.in_(trip_ids)
+        ).group_by(Transaction.trip_id).all())
+        
+        transaction_counts = dict(db.query(
+            Transaction.trip_id,
+            func.count(Transaction.id)
+        ).filter(Transaction.trip_id.in_(trip_ids)).group_by(Transaction.trip_id).all())
+        
+        summaries = {}
+        for trip_id in trip_ids:
+            member_count = member_counts.get(trip_id, 0)
+            total_expense = float(expense_totals.get(trip_id) or 0)
+            summaries[trip_id] = {
+                'trip_id': trip_id,
+                'total_expense': total_expense,
+                'average_expense': total_expense / member_count if member_count else 0.0,
+                'member_count': member_count,
+                'transaction_count': transaction_counts.get(trip_id, 0)
             }
-            
-            # 获取交易总数
-            transaction_count = db.query(func.count(Transaction.id)).filter(
-                Transaction.trip_id == trip_id
-            ).scalar()
-            
-            # 更新或创建统计记录
-            stats = db.query(TripStats).filter(TripStats.trip_id == trip_id).first()
-            if not stats:
-                stats = TripStats(trip_id=trip_id)
-                db.add(stats)
-            
-            stats.total_expense = total_expense
-            stats.average_expense = average_expense
-            stats.member_count = len(members)
-            stats.category_totals = json.dumps(category_totals, ensure_ascii=False)
-            stats.category_ratios = json.dumps(category_ratios, ensure_ascii=False)
-            stats.transaction_count = transaction_count or 0
-            
+        return summaries
+    
+    @staticmethod
+    def _category_ratios(category_totals: dict, total_expense: float) -> dict:
+        return {
+            name: round(amount / total_expense * 100, 2) if total_expense > 0 else 0
+            for name, amount in category_totals.items()
+        }
+    
+    @staticmethod
+    def _bulk_upsert(db: Session, table, rows: List[dict], conflict_columns: List[str]):
+        """按方言生成单条批量UPSERT语句（MySQL: ON DUPLICATE KEY UPDATE，SQLite/PostgreSQL: ON CONFLICT）"""
+        if not rows:
+            return
+        
+        update_columns = [c for c in rows[0] if c not in conflict_columns and c != 'created_at']
+        dialect = db.get_bind().dialect.name
+        
+        if dialect == 'mysql':
+            stmt = mysql_insert(table).values(rows)
+            stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in update_columns})
+        elif dialect in ('sqlite', 'postgresql'):
+            insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+            stmt = insert(table).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=conflict_columns,
+                set_={c: stmt.excluded[c] for c in update_columns}
+            )
+        else:
+            # 其他方言：先删后插，仍保持固定语句数
+            keys = tuple_(*[table.c[c] for c in conflict_columns])
+            db.execute(delete(table).where(keys.in_([tuple(r[c] for c in conflict_columns) for r in rows])))
+            stmt = table.insert().values(rows)
+        
+        db.execute(stmt)
+    
+    @staticmethod
+    def write_trip_rows(trip_id: int, rows: dict, db: Session, parts: Tuple[str, ...] = ALL_PARTS, tables: dict = None) -> bool:
+        """
+        将compute_trip_rows的结果批量写入统计表（不提交），返回是否写入或删除了统计行
+        
+        tables可替换目标表（如重建用的影子表），默认写入正式统计表，且只在确有写入时递增统计版本号
+        （没有成员、钱包的行程重算不产生任何行，版本号和ETag保持不变）；
+        写入影子表时版本号在替换完成后统一递增。
+        """
+        target = tables or STATS_TABLES
+        changed = False
+        
+        if 'trip' in parts and rows['trip']:
+            StatsService._bulk_upsert(db, target['trip'], [rows['trip']], ['trip_id'])
+            changed = True
+        
+        if 'members' in parts and rows['members']:
+            member_table = target['members']
+            StatsService._bulk_upsert(db, member_table, rows['members'], ['trip_id', 'member_id'])
+            # 清理已删除成员的统计行
+            db.execute(delete(member_table).where(
+                member_table.c.trip_id == trip_id,
+                member_table.c.member_id.notin_([r['member_id'] for r in rows['members']])
+            ))
+            changed = True
+        
+        if 'wallets' in parts:
+            wallet_table = target['wallets']
+            StatsService._bulk_upsert(db, wallet_table, rows['wallets'], ['wallet_id'])
+            deleted = db.execute(delete(wallet_table).where(
+                wallet_table.c.trip_id == trip_id,
+                wallet_table.c.wallet_id.notin_([r['wallet_id'] for r in rows['wallets']])
+            )).rowcount
+            changed = changed or bool(rows['wallets']) or deleted > 0
+        
+        if 'daily' in parts:
+            # 按日汇总行数随天数增长，整体替换比逐行比对更简单
+            daily_table = target['daily']
+            deleted = db.execute(delete(daily_table).where(daily_table.c.trip_id == trip_id)).rowcount
+            if rows['daily']:
+                db.execute(daily_table.insert().values(rows['daily']))
+            changed = changed or bool(rows['daily']) or deleted > 0
+        
+        if tables is None and changed:
+            StatsService.bump_versions([trip_id], db)
+        return changed
+    
+    @staticmethod
+    def bump_versions(trip_ids: List[int], db: Session):
+        """递增行程统计版本号（与统计写入同一事务，不提交），用于生成ETag"""
+        trip_ids = sorted(set(trip_ids))
+        if not trip_ids:
+            return
+        
+        table = StatsVersion.__table__
+        now = datetime.now()
+        rows = [{'trip_id': trip_id, 'version': 1, 'updated_at': now} for trip_id in trip_ids]
+        dialect = db.get_bind().dialect.name
+        
+        if dialect == 'mysql':
+            stmt = mysql_insert(table).values(rows)
+            stmt = stmt.on_duplicate_key_update(version=table.c.version + 1, updated_at=stmt.inserted.updated_at)
+        elif dialect in ('sqlite', 'postgresql'):
+            insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+            stmt = insert(table).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['trip_id'],
+                set_={'version': table.c.version + 1, 'updated_at': stmt.excluded.updated_at}
+            )
+        else:
+            db.execute(table.update().where(table.c.trip_id.in_(trip_ids)).values(version=table.c.version + 1, updated_at=now))
+            existing = {trip_id for trip_id, in db.execute(select(table.c.trip_id).where(table.c.trip_id.in_(trip_ids)))}
+            rows = [row for row in rows if row['trip_id'] not in existing]
+            if not rows:
+                return
+            stmt = table.insert().values(rows)
+        
+        db.execute(stmt)
+    
+    @staticmethod
+    def get_version(trip_id: int, db: Session) -> int:
+        """读取行程统计版本号（尚未生成统计时为0）"""
+        return db.query(StatsVersion.version).filter(StatsVersion.trip_id == trip_id).scalar() or 0
+    
+    @staticmethod
+    def get_versions(trip_ids: List[int], db: Session) -> dict:
+        """批量读取行程统计版本号（一次查询），返回 {trip_id: version}，尚未生成统计的行程不在结果中"""
+        if not trip_ids:
+            return {}
+        return dict(db.query(StatsVersion.trip_id, StatsVersion.version).filter(
+            StatsVersion.trip_id.in_(trip_ids)
+        ).all())
+    
+    @staticmethod
+    def _refresh(trip_id: int, db: Session, parts: Tuple[str, ...]):
+        try:
+            rows = StatsService.compute_trip_rows(trip_id, db, parts)
+            StatsService.write_trip_rows(trip_id, rows, db, parts)
             db.commit()
-            
+            invalidate_trip_stats(trip_id)
         except Exception as e:
             db.rollback()
             raise e
     
+    @staticmethod
+    def update_trip_stats(trip_id: int, db: Session):
+        """更新行程统计数据"""
+        StatsService._refresh(trip_id, db, ('trip',))
+    
     @staticmethod
     def update_member_stats(trip_id: int, db: Session):
         """更新成员统计数据"""
-        try:
-            members = db.query(Member).filter(Member.trip_id == trip_id).all()
-            if not members:
-                return
-            
-            member_ids = [m.id for m in members]
-            
-            # 获取每个成员的总支出和分类支出
-            member_category_stats = db.query(
-                TransactionSplit.member_id,
-                Category.name.label('category_name'),
-                func.sum(TransactionSplit.amount).label('amount')
-            ).join(
-                Transaction, Transaction.id == TransactionSplit.transaction_id
-            ).join(
-                Category, Category.id == Transaction.category_id
-            ).filter(
-                Transaction.trip_id == trip_id,
-                TransactionSplit.member_id.in_(member_ids)
-            ).group_by(
-                TransactionSplit.member_id,
-                Category.name
-            ).all()
-            
-            # 整理数据
-            member_data = defaultdict(lambda: {'by_category': defaultdict(float), 'total': 0.0})
-            for member_id, category, amount in member_category_stats:
-                amount_float = float(amount)
-                member_data[member_id]['by_category'][category] = amount_float
-                member_data[member_id]['total'] += amount_float
-            
-            # 计算平均值
-            total_expense = sum(data['total'] for data in member_data.values())
-            average_expense = total_expense / len(members) if members else 0
-            
-            # 更新或创建每个成员的统计
-            for member in members:
-                data = member_data.get(member.id, {'by_category': {}, 'total': 0.0})
-                
-                stats = db.query(MemberStats).filter(
-                    MemberStats.trip_id == trip_id,
-                    MemberStats.member_id == member.id
-                ).first()
-                
-                if not stats:
-                    stats = MemberStats(trip_id=trip_id, member_id=member.id)
-                    db.add(stats)
-                
-                stats.member_name = member.name
-                stats.total_amount = data['total']
-                stats.by_category = json.dumps(dict(data['by_category']), ensure_ascii=False)
-                stats.by_wallet = json.dumps({}, ensure_ascii=False)
-                stats.should_pay = average_expense
-                stats.balance = data['total'] - average_expense
-            
-            db.commit()
-            
-        except Exception as e:
-            db.rollback()
-            raise e
+        StatsService._refresh(trip_id, db, ('members',))
     
     @staticmethod
     def update_wallet_stats(trip_id: int, db: Session):
         """更新钱包统计数据"""
-        try:
-            wallets = db.query(Wallet).filter(Wallet.trip_id == trip_id).all()
-            if not wallets:
-                return
-            
-            wallet_ids = [w.id for w in wallets]
-            
-            # 获取钱包交易统计
-            wallet_stats_data = db.query(
-                Transaction.wallet_id,
-                func.count(Transaction.id).label('transaction_count'),
-                func.sum(case((Transaction.transaction_type == 'expense', Transaction.amount), else_=0)).label('total_spent'),
-                func.sum(case((Transaction.transaction_type == 'deposit', Transaction.amount), else_=0)).label('total_deposited')
-            ).filter(
-                Transaction.wallet_id.in_(wallet_ids)
-            ).group_by(Transaction.wallet_id).all()
-            
-            wallet_stats_map = {}
-            for wallet_id, count, spent, deposited in wallet_stats_data:
-                wallet_stats_map[wallet_id] = {
-                    'transaction_count': count or 0,
-                    'total_spent': float(spent or 0),
-                    'total_deposited': float(deposited or 0)
-                }
-            
-            # 更新或创建每个钱包的统计
-            for wallet in wallets:
-                stats = wallet_stats_map.get(wallet.id, {
-                    'transaction_count': 0,
-                    'total_spent': 0.0,
-                    'total_deposited': 0.0
-                })
-                
-                # 获取成员余额
-                wallet_members = db.query(WalletMember).filter(
-                    WalletMember.wallet_id == wallet.id
-                ).all()
-                
-                balance_by_member = {wm.member_id: wm.balance for wm in wallet_members}
-                total_balance = sum(wm.balance for wm in wallet_members)
-                
-                wallet_stat = db.query(WalletStats).filter(
-                    WalletStats.wallet_id == wallet.id
-                ).first()
-                
-                if not wallet_stat:
-                    wallet_stat = WalletStats(trip_id=trip_id, wallet_id=wallet.id)
-                    db.add(wallet_stat)
-                
-                wallet_stat.wallet_name = wallet.name
-                wallet_stat.balance_by_member = json.dumps(balance_by_member, ensure_ascii=False)
-                wallet_stat.total_balance = total_balance
-                wallet_stat.transaction_count = stats['transaction_count']
-                wallet_stat.total_deposited = stats['total_deposited']
-                wallet_stat.total_spent = stats['total_spent']
-                wallet_stat.remaining = total_balance
-            
-            db.commit()
-            
-        except Exception as e:
-            db.rollback()
-            raise e
+        StatsService._refresh(trip_id, db, ('wallets',))
     
     @staticmethod
     def update_all_stats(trip_id: int, db: Session):
-        """更新所有统计数据（事务变更时调用）"""
-        try:
-            StatsService.update_trip_stats(trip_id, db)
-            StatsService.update_member_stats(trip_id, db)
-            StatsService.update_wallet_stats(trip_id, db)
-        except Exception as e:
-            raise e
+        """更新所有统计数据（全量重算，单个事务内批量写入并只提交一次）"""
+        StatsService._refresh(trip_id, db, StatsService.ALL_PARTS)
+    
+    @staticmethod
+    def snapshot_transaction(transaction: Transaction, db: Session) -> TransactionSnapshot:
+        """读取交易及其分摊明细，生成增量更新所需的快照"""
+        splits = db.query(
+            TransactionSplit.member_id,
+            TransactionSplit.amount
+        ).filter(
+            TransactionSplit.transaction_id == transaction.id
+        ).all()
+        
+        # 分类已删除的交易不计入分类统计，与全量重算的JOIN口径一致
+        category_key = None
+        if transaction.category_id and db.query(Category.id).filter(
+            Category.id == transaction.category_id
+        ).scalar():
+            category_key = str(transaction.category_id)
+        
+        return TransactionSnapshot(
+            trip_id=transaction.trip_id,
+            wallet_id=transaction.wallet_id,
+            category_id=transaction.category_id,
+            category_key=category_key,
+            transaction_type=transaction.transaction_type,
+            amount=float(transaction.amount),
+            payer_id=transaction.payer_id,
+            splits=[(member_id, float(amount)) for member_id, amount in splits],
+            day=transaction.transaction_date.date() if transaction.transaction_date else None,
+            wallet_funded=db.query(WalletFlow.id).filter(WalletFlow.transaction_id == transaction.id).first() is not None
+        )
+    
+    @staticmethod
+    def apply_transaction_delta(
+        old: Optional[TransactionSnapshot],
+        new: Optional[TransactionSnapshot],
+        db: Session
+    ) -> bool:
+        """
+        按交易变更前后的快照增量调整统计数据（新增时old为None，删除时new为None）
+        
+        只读写受影响的统计行，代价与行程规模无关。在调用方的事务内执行、不提交，
+        统计与交易一起提交；统计行尚未生成时返回False，由调用方回滚本次调整并登记全量重算。
+        """
+        changes = [(snap, sign) for snap, sign in ((old, -1), (new, 1)) if snap is not None]
+        for trip_id in sorted({snap.trip_id for snap, _ in changes}):
+            trip_changes = [(snap, sign) for snap, sign in changes if snap.trip_id == trip_id]
+            if not StatsService._apply_trip_delta(trip_id, trip_changes, db):
+                return False
+        StatsService.bump_versions([snap.trip_id for snap, _ in changes], db)
+        return True
+    
+    @staticmethod
+    def _apply_trip_delta(trip_id: int, changes: List[Tuple[TransactionSnapshot, int]], db: Session) -> bool:
+        trip_stats = db.query(TripStats).filter(
+            TripStats.trip_id == trip_id
+        ).with_for_update().first()
+        if not trip_stats:
+            return False
+        
+        split_member_ids = {
+            member_id
+            for snap, _ in changes if snap.category_key is not None
+            for member_id, _ in snap.splits
+        }
+        payer_ids = {
+            snap.funding_payer_id
+            for snap, _ in changes if snap.category_key is not None and snap.funding_payer_id and snap.splits
+        }
+        member_ids = split_member_ids | payer_ids
+        member_stats_map = {}
+        if member_ids:
+            member_stats_map = {
+                ms.member_id: ms
+                for ms in db.query(MemberStats).filter(
+                    MemberStats.trip_id == trip_id,
+                    MemberStats.member_id.in_(member_ids)
+                ).with_for_update().all()
+            }
+            # 付款人可能已被删除（全量重算同样不计），分摊成员缺行则说明统计未生成
+            if not split_member_ids <= set(member_stats_map):
+                return False
+        
+        wallet_ids = {snap.wallet_id for snap, _ in changes}
+        wallet_stats_map = {
+            ws.wallet_id: ws
+            for ws in db.query(WalletStats).filter(
+                WalletStats.wallet_id.in_(wallet_ids)
+            ).with_for_update().all()
+        }
+        if len(wallet_stats_map) != len(wallet_ids):
+            return False
+        
+        # 行程级：分类汇总只统计有分类的分摊金额，与全量重算口径一致
+        category_totals = dict(trip_stats.category_totals or {})
+        total_expense = trip_stats.total_expense or 0.0
+        for snap, sign in changes:
+            trip_stats.transaction_count = (trip_stats.transaction_count or 0) + sign
+            if snap.category_key is None or not snap.splits:
+                continue
+            delta = sign * snap.split_total
+            total_expense += delta
+            StatsService._add_amount(category_totals, snap.category_key, delta)
+        
+        average_expense = total_expense / trip_stats.member_count if trip_stats.member_count else 0
+        trip_stats.total_expense = total_expense
+        trip_stats.average_expense = average_expense
+        trip_stats.category_totals = category_totals
+        trip_stats.category_ratios = StatsService._category_ratios(category_totals, total_expense)
+        
+        # 成员级：只调整参与分摊的成员和付款人
+        by_category_map = {
+            member_id: dict(ms.by_category or {})
+            for member_id, ms in member_stats_map.items()
+        }
+        by_wallet_map = {
+            member_id: dict(ms.by_wallet or {})
+            for member_id, ms in member_stats_map.items()
+        }
+        for snap, sign in changes:
+            if snap.category_key is None:
+                continue
+            for member_id, amount in snap.splits:
+                ms = member_stats_map[member_id]
+                ms.total_amount = (ms.total_amount or 0.0) + sign * amount
+                StatsService._add_amount(by_category_map[member_id], snap.category_key, sign * amount)
+                StatsService._add_amount(by_wallet_map[member_id], str(snap.wallet_id), sign * amount)
+            payer = member_stats_map.get(snap.funding_payer_id) if snap.funding_payer_id and snap.splits else None
+            if payer:
+                payer.actual_paid = (payer.actual_paid or 0.0) + sign * snap.split_total
+        for member_id, ms in member_stats_map.items():
+            ms.by_category = by_category_map[member_id]
+            ms.by_wallet = by_wallet_map[member_id]
+        
+        # 按日汇总：同一 (日期, 分类, 成员) 的变更先合并，再一条UPSERT累加
+        daily_deltas = defaultdict(float)
+        for snap, sign in changes:
+            if snap.category_key is None or snap.day is None:
+                continue
+            for member_id, amount in snap.splits:
+                daily_deltas[(snap.day, snap.category_id, member_id)] += sign * amount
+        StatsService._increment_daily(trip_id, daily_deltas, db)
+        
+        # 钱包级：交易计数与存入/支出总额
+        for snap, sign in changes:
+            ws = wallet_stats_map[snap.wallet_id]
+            ws.transaction_count = (ws.transaction_count or 0) + sign
+            if snap.transaction_type == 'expense':
+                ws.total_spent = (ws.total_spent or 0.0) + sign * snap.amount
+            elif snap.transaction_type == 'deposit':
+                ws.total_deposited = (ws.total_deposited or 0.0) + sign * snap.amount
+        
+        wallet_members = db.query(WalletMember).filter(
+            WalletMember.wallet_id.in_(wallet_ids)
+        ).all()
+        balances = defaultdict(dict)
+        for wm in wallet_members:
+            balances[wm.wallet_id][wm.member_id] = wm.balance
+        for wallet_id, ws in wallet_stats_map.items():
+            total_balance = sum(balances[wallet_id].values())
+            ws.balance_by_member = {str(member_id): balance for member_id, balance in balances[wallet_id].items()}
+            ws.total_balance = total_balance
+            ws.remaining = total_balance
+        
+        db.flush()
+        
+        # 平均值变化后，所有成员的应付与差额用一条UPDATE同步
+        db.query(MemberStats).filter(MemberStats.trip_id == trip_id).update(
+            {
+                MemberStats.should_pay: average_expense,
+                MemberStats.balance: func.coalesce(MemberStats.actual_paid, 0.0) - average_expense
+            },
+            synchronize_session=False
+        )
+        return True
+    
+    @staticmethod
+    def _increment_daily(trip_id: int, deltas: dict, db: Session):
+        """将 {(日期, 分类ID, 成员ID): 金额变化} 累加到按日汇总表，并清理归零的行"""
+        deltas = {key: amount for key, amount in deltas.items() if abs(amount) >= AMOUNT_EPSILON / 10}
+        if not deltas:
+            return
+        
+        table = DailyStats.__table__
+        now = datetime.now()
+        rows = [
+            {
+                'trip_id': trip_id,
+                'day': day,
+                'category_id': category_id,
+                'member_id': member_id,
+                'amount': amount,
+                'created_at': now,
+                'updated_at': now
+            }
+            for (day, category_id, member_id), amount in deltas.items()
+        ]
+        conflict_columns = ['trip_id', 'day', 'category_id', 'member_id']
+        dialect = db.get_bind().dialect.name
+        
+        if dialect == 'mysql':
+            stmt = mysql_insert(table).values(rows)
+            stmt = stmt.on_duplicate_key_update(amount=table.c.amount + stmt.inserted.amount, updated_at=stmt.inserted.updated_at)
+            db.execute(stmt)
+        elif dialect in ('sqlite', 'postgresql'):
+            insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+            stmt = insert(table).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=conflict_columns,
+                set_={'amount': table.c.amount + stmt.excluded.amount, 'updated_at': stmt.excluded.updated_at}
+            )
+            db.execute(stmt)
+        else:
+            for row in rows:
+                updated = db.execute(table.update().where(
+                    *[table.c[c] == row[c] for c in conflict_columns]
+                ).values(amount=table.c.amount + row['amount'], updated_at=now)).rowcount
+                if not updated:
+                    db.execute(table.insert().values(row))
+        
+        db.execute(delete(table).where(
+            table.c.trip_id == trip_id,
+            table.c.day.in_({day for day, _, _ in deltas}),
+            func.abs(table.c.amount) < AMOUNT_EPSILON
+        ))
+    
+    @staticmethod
+    def query_timeseries(
+        trip_id: int,
+        db: Session,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        granularity: str = 'day'
+    ) -> List[dict]:
+        """
+        从按日汇总表读取日期区间内的支出时间序列（granularity: day|week，周以周一为起点）
+        
+        读取的行数与区间天数×分类×成员成正比，与交易笔数无关；区间内无支出的日期/周补零。
+        """
+        query = db.query(
+            DailyStats.day,
+            DailyStats.category_id,
+            DailyStats.member_id,
+            DailyStats.amount
+        ).filter(DailyStats.trip_id == trip_id)
+        if start_date:
+            query = query.filter(DailyStats.day >= start_date)
+        if end_date:
+            query = query.filter(DailyStats.day <= end_date)
+        rows = query.all()
+        
+        def bucket_of(day: date) -> date:
+            return day - timedelta(days=day.weekday()) if granularity == 'week' else day
+        
+        buckets = {}
+        days = [day for day, _, _, _ in rows]
+        first = start_date or (min(days) if days else None)
+        last = end_date or (max(days) if days else None)
+        if first and last:
+            step = timedelta(days=7 if granularity == 'week' else 1)
+            current = bucket_of(first)
+            while current <= last:
+                buckets[current] = {'total': 0.0, 'by_category': defaultdict(float), 'by_member': defaultdict(float)}
+                current += step
+        
+        for day, category_id, member_id, amount in rows:
+            bucket = buckets[bucket_of(day)]
+            bucket['total'] += amount
+            bucket['by_category'][str(category_id)] += amount
+            bucket['by_member'][str(member_id)] += amount
+        
+        return [
+            {
+                'period': period.strftime('%Y-%m-%d'),
+                'total': round(bucket['total'], 2),
+                'by_category': {key: round(value, 2) for key, value in bucket['by_category'].items()},
+                'by_member': {key: round(value, 2) for key, value in bucket['by_member'].items()}
+            }
+            for period, bucket in sorted(buckets.items())
+        ]
+    
+    @staticmethod
+    def _add_amount(totals: dict, key, delta: float):
+        value = totals.get(key, 0.0) + delta
+        if abs(value) < AMOUNT_EPSILON:
+            totals.pop(key, None)
+        else:
+            totals[key] = value
+    
+    @staticmethod
+    def verify_stats(trip_id: int, db: Session) -> List[dict]:
+        """将统计表与全量重算结果逐项比对，返回不一致项（用于校验增量维护）"""
+        mismatches = []
+        
+        def compare(scope, key, stored, expected):
+            if isinstance(expected, dict):
+                stored = stored or {}
+                for k in set(stored) | set(expected):
+                    compare(scope, f"{key}.{k}", stored.get(k, 0.0), expected.get(k, 0.0))
+            elif abs((stored or 0) - (expected or 0)) > AMOUNT_EPSILON * 2:
+                mismatches.append({"scope": scope, "field": key, "stored": stored, "expected": expected})
+        
+        expected = StatsService.compute_trip_rows(trip_id, db)
+        
+        expected_trip = expected['trip']
+        trip_stats = db.query(TripStats).filter(TripStats.trip_id == trip_id).first()
+        if expected_trip and not trip_stats:
+            mismatches.append({"scope": "trip", "field": "row", "stored": None, "expected": "present"})
+        elif expected_trip:
+            for key in ('total_expense', 'average_expense', 'member_count', 'transaction_count'):
+                compare("trip", key, getattr(trip_stats, key), expected_trip[key])
+            compare(
+                "trip", 'category_totals',
+                trip_stats.category_totals,
+                expected_trip['category_totals']
+            )
+        
+        stored_members = {
+            ms.member_id: ms
+            for ms in db.query(MemberStats).filter(MemberStats.trip_id == trip_id).all()
+        }
+        for row in expected['members']:
+            scope = f"member:{row['member_id']}"
+            ms = stored_members.get(row['member_id'])
+            if not ms:
+                mismatches.append({"scope": scope, "field": "row", "stored": None, "expected": "present"})
+                continue
+            compare(scope, 'total_amount', ms.total_amount, row['total_amount'])
+            compare(scope, 'actual_paid', ms.actual_paid, row['actual_paid'])
+            compare(scope, 'balance', ms.balance, row['balance'])
+            compare(
+                scope, 'by_category',
+                ms.by_category,
+                row['by_category']
+            )
+            compare(scope, 'by_wallet', ms.by_wallet, row['by_wallet'])
+        
+        stored_wallets = {
+            ws.wallet_id: ws
+            for ws in db.query(WalletStats).filter(WalletStats.trip_id == trip_id).all()
+        }
+        for row in expected['wallets']:
+            scope = f"wallet:{row['wallet_id']}"
+            ws = stored_wallets.get(row['wallet_id'])
+            if not ws:
+                mismatches.append({"scope": scope, "field": "row", "stored": None, "expected": "present"})
+                continue
+            for key in ('transaction_count', 'total_spent', 'total_deposited', 'total_balance'):
+                compare(scope, key, getattr(ws, key), row[key])
+        
+        stored_daily = {
+            (row.day, row.category_id, row.member_id): row.amount
+            for row in db.query(DailyStats).filter(DailyStats.trip_id == trip_id).all()
+        }
+        expected_daily = {(row['day'], row['category_id'], row['member_id']): row['amount'] for row in expected['daily']}
+        for key in set(stored_daily) | set(expected_daily):
+            day, category_id, member_id = key
+            compare(f"daily:{day}", f"{category_id}.{member_id}", stored_daily.get(key, 0.0), expected_daily.get(key, 0.0))
+        
+        return mismatches
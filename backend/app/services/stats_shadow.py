@@ -0,0 +1,159 @@
+from sqlalchemy import MetaData, text, select, union
+from sqlalchemy.engine import Engine
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List
+
+from app.core.database import SessionLocal
+from app.core.logging import get_logger
+from app.models.trip_stats import TripStats
+from app.services.stats_service import StatsService, STATS_TABLES
+from app.services.stats_queue import StatsRefreshQueue
+from app.services.stats_rebuild import rebuild_stats
+from app.services.stats_cache import stats_cache
+
+logger = get_logger(__name__)
+
+SHADOW_SUFFIX = "_shadow"
+RETIRED_SUFFIX = "_old"
+VERSION_BUMP_BATCH = 500
+
+
+def shadow_tables() -> dict:
+    """生成与正式统计表结构一致的影子表定义（索引名加后缀，避免SQLite全局索引名冲突）"""
+    metadata = MetaData()
+    tables = {}
+    for part, table in STATS_TABLES.items():
+        shadow = table.to_metadata(metadata, name=table.name + SHADOW_SUFFIX)
+        live_index_names = {
+            (tuple(column.name for column in index.columns), index.unique): index.name
+            for index in table.indexes
+        }
+        for index in shadow.indexes:
+            key = (tuple(column.name for column in index.columns), index.unique)
+            index.name = live_index_names[key] + SHADOW_SUFFIX
+        tables[part] = shadow
+    return tables
+
+
+def create_shadow_tables(engine: Engine) -> dict:
+    """创建空的影子表（已存在的残留影子表先删除）"""
+    tables = shadow_tables()
+    with engine.begin() as conn:
+        for part, table in tables.items():
+            live_name = STATS_TABLES[part].name
+            conn.execute(text(f"DROP TABLE IF EXISTS {table.name}"))
+            if engine.dialect.name == 'mysql':
+                # 沿用线上表的真实结构（字段注释、字符集等）
+                conn.execute(text(f"CREATE TABLE {table.name} LIKE {live_name}"))
+            else:
+                table.create(conn)
+    return tables
+
+
+@contextmanager
+def _ddl_transaction(engine: Engine):
+    """
+    在一个事务中执行 DDL
+    
+    pysqlite 默认只在 DML 前隐式开启事务，ALTER TABLE 等 DDL 会逐条自动提交；
+    SQLite 下关闭驱动的事务管理，显式 BEGIN IMMEDIATE / COMMIT，其他数据库直接用 engine.begin()。
+    """
+    if engine.dialect.name != 'sqlite':
+        with engine.begin() as conn:
+            yield conn
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        conn.exec_driver_sql("COMMIT")
+
+
+def swap_shadow_tables(engine: Engine):
+    """
+    原子替换：影子表改名为正式表，原正式表改名为 *_old
+    
+    MySQL 的多表 RENAME TABLE 是单条原子语句；SQLite 的改名与索引重建在同一个
+    BEGIN IMMEDIATE 事务内提交（见 _ddl_transaction），读者始终看到完整的一套统计表。
+    """
+    live_names = [table.name for table in STATS_TABLES.values()]
+    with _ddl_transaction(engine) as conn:
+        for name in live_names:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}{RETIRED_SUFFIX}"))
+        
+        if engine.dialect.name == 'mysql':
+            renames = []
+            for name in live_names:
+                renames.append(f"{name} TO {name}{RETIRED_SUFFIX}")
+                renames.append(f"{name}{SHADOW_SUFFIX} TO {name}")
+            conn.execute(text("RENAME TABLE " + ", ".join(renames)))
+        else:
+            for name in live_names:
+                conn.execute(text(f"ALTER TABLE {name} RENAME TO {name}{RETIRED_SUFFIX}"))
+                conn.execute(text(f"ALTER TABLE {name}{SHADOW_SUFFIX} RENAME TO {name}"))
+            # 索引随表改名后仍带影子后缀：删除旧表释放正式索引名，再按正式名重建
+            for table in STATS_TABLES.values():
+                conn.execute(text(f"DROP TABLE {table.name}{RETIRED_SUFFIX}"))
+                for index in table.indexes:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {index.name}{SHADOW_SUFFIX}"))
+                    columns = ", ".join(column.name for column in index.columns)
+                    unique = "UNIQUE " if index.unique else ""
+                    conn.execute(text(f"CREATE {unique}INDEX {index.name} ON {table.name} ({columns})"))
+
+
+def changed_trip_ids(engine: Engine, since: datetime, table_suffix: str = "") -> List[int]:
+    """查找 since 之后被写入过的行程（重建期间的增量更新需要在新表上补做）"""
+    metadata = MetaData()
+    queries = []
+    for table in STATS_TABLES.values():
+        source = table.to_metadata(metadata, name=table.name + table_suffix) if table_suffix else table
+        queries.append(select(source.c.trip_id).where(source.c.updated_at >= since))
+    with engine.connect() as conn:
+        return sorted({row[0] for row in conn.execute(union(*queries))})
+
+
+def rebuild_with_swap(engine: Engine, workers: int = 4, chunk_size: int = 50, progress=print) -> dict:
+    """在影子表中完整重建统计数据，然后原子替换正式表"""
+    started_at = datetime.now()
+    
+    progress("🧱 创建影子表...")
+    tables = create_shadow_tables(engine)
+    
+    progress("📊 在影子表中重建统计数据...")
+    result = rebuild_stats(workers=workers, chunk_size=chunk_size, tables=tables, progress=progress)
+    if result['failed']:
+        progress(f"❌ 有 {result['failed']} 个行程重建失败，保留原统计表不替换")
+        return result
+    
+    # 替换前先记录重建期间写过的行程；MySQL 下旧表在替换后仍保留，可再补查一次
+    catch_up = set(changed_trip_ids(engine, started_at))
+    progress("🔁 原子替换统计表...")
+    swap_shadow_tables(engine)
+    if engine.dialect.name == 'mysql':
+        catch_up.update(changed_trip_ids(engine, started_at, table_suffix=RETIRED_SUFFIX))
+        with engine.begin() as conn:
+            for table in STATS_TABLES.values():
+                conn.execute(text(f"DROP TABLE IF EXISTS {table.name}{RETIRED_SUFFIX}"))
+    
+    db = SessionLocal()
+    try:
+        # 新表已对外可见，递增全部行程的统计版本号使旧ETag失效
+        trip_ids = [trip_id for trip_id, in db.query(TripStats.trip_id).all()]
+        for i in range(0, len(trip_ids), VERSION_BUMP_BATCH):
+            StatsService.bump_versions(trip_ids[i:i + VERSION_BUMP_BATCH], db)
+            db.commit()
+        stats_cache.clear()
+        
+        # 重建期间发生增量更新的行程交给刷新队列在新表上重算
+        for trip_id in catch_up:
+            StatsRefreshQueue.enqueue(trip_id, db)
+    finally:
+        db.close()
+    progress(f"✅ 替换完成，{len(catch_up)} 个重建期间有变更的行程已登记补刷")
+    
+    result['catch_up'] = sorted(catch_up)
+    return result
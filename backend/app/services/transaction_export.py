@@ -0,0 +1,221 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+from xml.sax.saxutils import escape
+import csv
+import io
+import json
+import re
+import zipfile
+
+from app.core.config import settings
+from app.models.transaction import Transaction
+from app.models.wallet import Wallet
+from app.models.category import Category
+from app.models.member import Member
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# 前几列与 TransactionCreate 字段同名，导出的 CSV/NDJSON 可以直接用于批量导入
+EXPORT_COLUMNS = [
+    'id', 'trip_id', 'wallet_id', 'category_id', 'transaction_type', 'amount', 'payer_id',
+    'transaction_date', 'remark', 'wallet_name', 'category_name', 'payer_name', 'created_at'
+]
+
+# XML 1.0 不允许的控制字符，写入 xlsx 前去掉
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def load_name_maps(trip_id: int, db: Session) -> dict:
+    """预加载行程的钱包、成员名称与全部分类名称（都是小表，导出时按ID查字典）"""
+    return {
+        'wallets': dict(db.query(Wallet.id, Wallet.name).filter(Wallet.trip_id == trip_id).all()),
+        'categories': dict(db.query(Category.id, Category.name).all()),
+        'members': dict(db.query(Member.id, Member.name).filter(Member.trip_id == trip_id).all()),
+    }
+
+
+def iter_export_rows(query, name_maps: dict, batch_size: int = None) -> Iterator[list]:
+    """
+    用服务端游标逐批读取交易，按 EXPORT_COLUMNS 顺序产出每行的值
+    
+    只选取需要的列（不构造ORM对象），yield_per 同时开启 stream_results，
+    MySQL 下使用非缓冲游标，内存中只保留当前一批行。
+    """
+    batch_size = batch_size or settings.TRANSACTION_EXPORT_BATCH_SIZE
+    wallets, categories, members = name_maps['wallets'], name_maps['categories'], name_maps['members']
+    rows = query.with_entities(
+        Transaction.id,
+        Transaction.trip_id,
+        Transaction.wallet_id,
+        Transaction.category_id,
+        Transaction.transaction_type,
+        Transaction.amount,
+        Transaction.payer_id,
+        Transaction.transaction_date,
+        Transaction.remark,
+        Transaction.created_at
+    ).order_by(Transaction.transaction_date, Transaction.id).yield_per(batch_size)
+    
+    for (transaction_id, trip_id, wallet_id, category_id, transaction_type, amount,
+         payer_id, transaction_date, remark, created_at) in rows:
+        yield [
+            transaction_id,
+            trip_id,
+            wallet_id,
+            category_id,
+            transaction_type,
+            amount,
+            payer_id,
+            transaction_date.strftime('%Y-%m-%d'),
+            remark,
+            wallets.get(wallet_id),
+            categories.get(category_id) if category_id else None,
+            members.get(payer_id) if payer_id else None,
+            created_at.strftime('%Y-%m-%d %H:%M:%S') if created_at else None
+        ]
+
+
+def _chunked(rows: Iterable[list], size: int) -> Iterator[List[list]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def csv_stream(rows: Iterable[list], flush_rows: int = 500) -> Iterator[bytes]:
+    """CSV（带BOM，Excel可直接打开）：表头立即输出，之后每 flush_rows 行输出一块"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    for chunk in _chunked(rows, flush_rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(['' if value is None else value for value in row] for row in chunk)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def ndjson_stream(rows: Iterable[list], flush_rows: int = 500) -> Iterator[bytes]:
+    """NDJSON：每行一个JSON对象，字段名同 EXPORT_COLUMNS"""
+    for chunk in _chunked(rows, flush_rows):
+        yield ''.join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n'
+            for row in chunk
+        ).encode('utf-8')
+
+
+class _ChunkSink:
+    """
+    只写的文件对象，收集 zipfile 写出的字节供生成器分块取走
+    
+    不提供 tell/seek，zipfile 会按不可回退的流写入（每个文件后追加数据描述符），
+    因此整个 xlsx 无需在内存或磁盘中完整生成。
+    """
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="transactions" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value) -> str:
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values: list) -> str:
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def xlsx_stream(rows: Iterable[list], flush_rows: int = 500) -> Iterator[bytes]:
+    """
+    XLSX：用标准库 zipfile 流式写出最小工作簿（单个工作表、内联字符串，不需要共享字符串表）
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_row(EXPORT_COLUMNS)
+            ).encode('utf-8'))
+            yield sink.drain()
+            for chunk in _chunked(rows, flush_rows):
+                sheet.write(''.join(_xlsx_row(row) for row in chunk).encode('utf-8'))
+                yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+STREAM_WRITERS = {
+    'csv': csv_stream,
+    'ndjson': ndjson_stream,
+    'xlsx': xlsx_stream,
+}
+
+
+def export_filename(trip_id: int, file_format: str, now: Optional[datetime] = None) -> str:
+    return f"trip_{trip_id}_transactions_{(now or datetime.now()).strftime('%Y%m%d%H%M%S')}.{file_format}"
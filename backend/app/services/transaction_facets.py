@@ -0,0 +1,94 @@
+from sqlalchemy import String, cast, func, literal, select, union_all
+from sqlalchemy.orm import Session
+from collections import defaultdict
+
+from app.models.transaction import Transaction
+from app.models.wallet import Wallet
+from app.models.category import Category
+from app.models.member import Member
+
+FACETS = ('category', 'wallet', 'payer', 'day')
+
+
+def _facet_rows(query, db: Session) -> list:
+    """
+    一条语句统计当前筛选结果在各维度上的笔数和金额，返回 (维度, 取值, 笔数, 金额)
+    
+    PostgreSQL 用 GROUPING SETS 一次扫描得到全部维度；MySQL 只支持 ROLLUP（按列前缀汇总，
+    得不到互相独立的各维度分组）、SQLite 都不支持，改为把各维度的 GROUP BY 用 UNION ALL
+    合并成一条语句（一次往返，结果行数为各维度取值数之和）。
+    
+    MySQL 5.7 不支持 CTE，MySQL 8 也不保证 CTE 只物化一次，所以各分支都直接引用同一个派生表：
+    MySQL / SQLite 上筛选结果会按维度各扫描一遍（共4遍），筛选条件走索引时开销与结果集大小成正比。
+    """
+    filtered = query.with_entities(
+        Transaction.category_id.label('category'),
+        Transaction.wallet_id.label('wallet'),
+        Transaction.payer_id.label('payer'),
+        func.date(Transaction.transaction_date).label('day'),
+        Transaction.amount.label('amount')
+    )
+    is_postgresql = db.get_bind().dialect.name == 'postgresql'
+    base = filtered.subquery('facet_base')
+    columns = {facet: base.c[facet] for facet in FACETS}
+    count = func.count().label('count')
+    amount = func.sum(base.c.amount).label('amount')
+    
+    if is_postgresql:
+        stmt = select(
+            *columns.values(),
+            *(func.grouping(column).label(f'g_{facet}') for facet, column in columns.items()),
+            count,
+            amount
+        ).group_by(func.grouping_sets(*columns.values()))
+        rows = []
+        for row in db.execute(stmt).mappings():
+            facet = next(facet for facet in FACETS if row[f'g_{facet}'] == 0)
+            value = row[facet]
+            rows.append((facet, value.isoformat() if facet == 'day' else value, row['count'], row['amount']))
+        return rows
+    
+    stmt = union_all(*(
+        select(
+            literal(facet).label('facet'),
+            cast(column, String(32)).label('value'),
+            count,
+            amount
+        ).group_by(column)
+        for facet, column in columns.items()
+    ))
+    return [
+        (facet, value if facet == 'day' or value is None else int(value), row_count, row_amount)
+        for facet, value, row_count, row_amount in db.execute(stmt)
+    ]
+
+
+def compute_facets(query, db: Session) -> dict:
+    """
+    按分类、钱包、付款人、日期汇总当前筛选结果的笔数与金额
+    
+    统计只需一条分组查询；分类、钱包、成员名称再各批量查询1次，查询数与取值个数无关。
+    """
+    buckets = defaultdict(list)
+    for facet, value, row_count, row_amount in _facet_rows(query, db):
+        buckets[facet].append((value, int(row_count), round(float(row_amount or 0), 2)))
+    
+    names = {}
+    for facet, model in (('category', Category), ('wallet', Wallet), ('payer', Member)):
+        ids = [value for value, _, _ in buckets[facet] if value is not None]
+        names[facet] = dict(db.query(model.id, model.name).filter(model.id.in_(ids)).all()) if ids else {}
+    
+    result = {}
+    for facet in ('category', 'wallet', 'payer'):
+        result[facet] = sorted(
+            (
+                {"id": value, "name": names[facet].get(value), "count": row_count, "amount": row_amount}
+                for value, row_count, row_amount in buckets[facet]
+            ),
+            key=lambda bucket: (-bucket["count"], bucket["id"] is None, bucket["id"] or 0)
+        )
+    result['day'] = [
+        {"date": str(value), "count": row_count, "amount": row_amount}
+        for value, row_count, row_amount in sorted(buckets['day'], key=lambda bucket: str(bucket[0]))
+    ]
+    return result
@@ -0,0 +1,191 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from pydantic import ValidationError
+from datetime import datetime
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+import csv
+import io
+import json
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.transaction import Transaction
+from app.models.wallet import Wallet
+from app.models.category import Category
+from app.models.member import Member
+from app.schemas.transaction import TransactionCreate
+from app.services.stats_queue import StatsRefreshQueue
+
+logger = get_logger(__name__)
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+TRANSACTION_TYPES = ('expense', 'deposit')
+
+# 解析后的一行：(源文件行号, 字段字典, 解析错误)
+ImportRow = Tuple[int, Optional[dict], Optional[str]]
+
+
+def detect_format(filename: Optional[str], file_format: Optional[str] = None) -> str:
+    """确定导入格式：显式指定优先，否则按文件扩展名判断（.jsonl 视为 ndjson）"""
+    if file_format:
+        file_format = file_format.lower()
+    elif filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        file_format = 'ndjson'
+    else:
+        file_format = 'csv'
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(f"不支持的导入格式: {file_format}")
+    return file_format
+
+
+def iter_rows(stream: BinaryIO, file_format: str) -> Iterator[ImportRow]:
+    """
+    逐行解析上传文件，不把整个文件读入内存
+    
+    CSV 首行为表头（字段名同 TransactionCreate），空单元格视为未填写；NDJSON 每行一个JSON对象。
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if file_format == 'csv':
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, {
+                    key.strip(): value.strip() or None
+                    for key, value in row.items()
+                    if key and isinstance(value, str)
+                }, None
+        else:
+            for line_no, line in enumerate(text, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError as e:
+                    yield line_no, None, f"JSON解析失败: {e}"
+                    continue
+                if not isinstance(data, dict):
+                    yield line_no, None, "每行必须是一个JSON对象"
+                    continue
+                yield line_no, data, None
+    except UnicodeDecodeError:
+        yield 0, None, "文件编码必须为 UTF-8"
+    finally:
+        # 只解除包装，底层上传文件由框架关闭
+        text.detach()
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+def _insert_batch(batch: List[Tuple[int, TransactionCreate]], db: Session, result: dict):
+    """
+    校验一批行的钱包、分类、付款人归属后批量插入并提交
+    
+    每批只查询钱包、分类、成员各1次，合法行用一条 executemany 插入；涉及行程的统计重算
+    登记在同一事务内写入刷新队列，与本批交易一起提交，中途崩溃也不会留下未登记重算的交易。
+    某批写入失败时只影响该批，已提交的批次保留。
+    """
+    wallet_trips = dict(db.query(Wallet.id, Wallet.trip_id).filter(
+        Wallet.id.in_({data.wallet_id for _, data in batch})
+    ).all())
+    category_ids = {data.category_id for _, data in batch if data.category_id}
+    known_categories = {category_id for category_id, in db.query(Category.id).filter(
+        Category.id.in_(category_ids)
+    ).all()} if category_ids else set()
+    payer_ids = {data.payer_id for _, data in batch if data.payer_id}
+    member_trips = dict(db.query(Member.id, Member.trip_id).filter(
+        Member.id.in_(payer_ids)
+    ).all()) if payer_ids else {}
+    
+    now = datetime.now()
+    values, lines = [], []
+    for line_no, data in batch:
+        if data.transaction_type not in TRANSACTION_TYPES:
+            error = f"未知的交易类型: {data.transaction_type}"
+        elif wallet_trips.get(data.wallet_id) != data.trip_id:
+            error = "钱包不存在或不属于该行程"
+        elif data.category_id and data.category_id not in known_categories:
+            error = "分类不存在"
+        elif data.payer_id and member_trips.get(data.payer_id) != data.trip_id:
+            error = "付款人不属于该行程"
+        else:
+            error = None
+        if error:
+            _record_error(result, line_no, error)
+            continue
+        
+        row = data.model_dump()
+        row['transaction_date'] = datetime.strptime(row['transaction_date'], '%Y-%m-%d')
+        row['created_at'] = now
+        values.append(row)
+        lines.append(line_no)
+    
+    if not values:
+        return
+    try:
+        db.execute(insert(Transaction), values)
+        for trip_id in sorted({row['trip_id'] for row in values}):
+            StatsRefreshQueue.enqueue(trip_id, db, commit=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Failed to insert import batch (lines {lines[0]}-{lines[-1]}): {e}")
+        for line_no in lines:
+            _record_error(result, line_no, f"写入失败: {e}")
+        return
+    
+    result['imported'] += len(values)
+    result['trip_ids'].update(row['trip_id'] for row in values)
+    result['wallet_ids'].update(row['wallet_id'] for row in values)
+
+
+def _record_error(result: dict, line_no: int, error: str):
+    """记录一行错误；超过上限后只计数，错误列表不再增长"""
+    result['failed'] += 1
+    if len(result['errors']) < settings.TRANSACTION_IMPORT_MAX_ERRORS:
+        result['errors'].append({"line": line_no, "error": error})
+    else:
+        result['errors_truncated'] = True
+
+
+def import_transactions(rows: Iterable[ImportRow], db: Session, batch_size: int = None) -> dict:
+    """
+    按 TransactionCreate 校验并分批写入交易，返回逐行错误与涉及的行程、钱包
+    
+    同一时刻内存中最多只有一批待写入的行，与文件大小无关。统计不在请求内重算：
+    每批提交时登记刷新队列，同一行程的多次登记合并，由后台按行程各重算一次。
+    """
+    batch_size = batch_size or settings.TRANSACTION_IMPORT_BATCH_SIZE
+    result = {
+        'total_rows': 0,
+        'imported': 0,
+        'failed': 0,
+        'errors': [],
+        'errors_truncated': False,
+        'trip_ids': set(),
+        'wallet_ids': set()
+    }
+    
+    batch = []
+    for line_no, raw, error in rows:
+        result['total_rows'] += 1
+        if error is None:
+            try:
+                batch.append((line_no, TransactionCreate.model_validate(raw)))
+            except ValidationError as e:
+                error = _validation_message(e)
+        if error:
+            _record_error(result, line_no, error)
+            continue
+        if len(batch) >= batch_size:
+            _insert_batch(batch, db, result)
+            batch = []
+    if batch:
+        _insert_batch(batch, db, result)
+    
+    return result
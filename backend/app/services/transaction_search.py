@@ -0,0 +1,157 @@
+from sqlalchemy import column, literal_column, table, text
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+import threading
+
+from app.core.logging import get_logger
+from app.models.transaction import Transaction
+
+logger = get_logger(__name__)
+
+MYSQL_FULLTEXT_INDEX = "ft_transactions_remark"
+SQLITE_FTS_TABLE = "transactions_fts"
+
+# 分词粒度：MySQL ngram 默认 ngram_token_size=2，SQLite FTS5 trigram 为3；
+# 比粒度短的词无法走全文索引，退回 LIKE 过滤
+MYSQL_NGRAM_TOKEN_SIZE = 2
+SQLITE_TRIGRAM_SIZE = 3
+
+_fts = table(SQLITE_FTS_TABLE, column("rowid"))
+
+# SQLite 外部内容表通过触发器与 transactions 同步（包括批量导入等 Core 写入）
+_SQLITE_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        remark, content='transactions', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, remark) VALUES (new.id, new.remark);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_ad AFTER DELETE ON transactions BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, remark) VALUES ('delete', old.id, old.remark);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_au AFTER UPDATE OF remark ON transactions BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, remark) VALUES ('delete', old.id, old.remark);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, remark) VALUES (new.id, new.remark);
+    END
+    """,
+]
+
+_backend_lock = threading.Lock()
+_backends = {}
+
+
+def _index_exists(conn, dialect: str) -> bool:
+    if dialect == 'mysql':
+        return bool(conn.execute(text(
+            "SELECT COUNT(*) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = 'transactions' AND index_name = :name"
+        ), {"name": MYSQL_FULLTEXT_INDEX}).scalar())
+    if dialect == 'sqlite':
+        return bool(conn.execute(text(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = :name"
+        ), {"name": SQLITE_FTS_TABLE}).scalar())
+    return False
+
+
+def ensure_search_index(engine: Engine, rebuild: bool = False) -> str:
+    """
+    创建备注全文索引（已存在则跳过），返回检索方式
+    
+    MySQL 在 transactions.remark 上建 ngram 分词的 FULLTEXT 索引，由 InnoDB 随写入自动维护；
+    SQLite 建 FTS5 trigram 外部内容表和同步触发器，首次创建或 rebuild 时从现有交易回填。
+    其他数据库不建索引，检索退回 LIKE。
+    """
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        exists = _index_exists(conn, dialect)
+        if dialect == 'mysql' and not exists:
+            conn.execute(text(
+                f"ALTER TABLE transactions ADD FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} (remark) WITH PARSER ngram"
+            ))
+        elif dialect == 'sqlite':
+            for statement in _SQLITE_DDL:
+                conn.execute(text(statement))
+            if rebuild or not exists:
+                conn.execute(text(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')"))
+    
+    with _backend_lock:
+        _backends.pop(engine.url, None)
+    return search_backend(engine)
+
+
+def search_backend(engine: Engine) -> str:
+    """当前数据库可用的检索方式：fulltext（MySQL）、fts5（SQLite）或 like（未建索引）"""
+    with _backend_lock:
+        if engine.url not in _backends:
+            dialect = engine.dialect.name
+            with engine.connect() as conn:
+                available = _index_exists(conn, dialect)
+            if not available:
+                logger.warning("Remark full-text index not found, search falls back to LIKE")
+            _backends[engine.url] = {'mysql': 'fulltext', 'sqlite': 'fts5'}.get(dialect) if available else 'like'
+        return _backends[engine.url]
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def search_transactions(
+    query,
+    keywords: str,
+    db: Session,
+    skip: int = 0,
+    limit: int = 50
+) -> Tuple[str, List[Tuple[Transaction, Optional[float]]]]:
+    """
+    在已按行程、钱包、分类、日期过滤的交易查询上叠加备注检索，按相关度排序分页
+    
+    关键词按空白拆分，各词需同时命中；不足分词粒度的短词用 LIKE 补充过滤。
+    返回 (检索方式, [(交易, 相关度)])，相关度越大越相关，LIKE 检索时为 None。
+    """
+    backend = search_backend(db.get_bind())
+    terms = [term for term in keywords.split() if term]
+    min_size = MYSQL_NGRAM_TOKEN_SIZE if backend == 'fulltext' else SQLITE_TRIGRAM_SIZE
+    indexed = [term for term in terms if len(term) >= min_size] if backend != 'like' else []
+    
+    score = None
+    if backend == 'fulltext' and indexed:
+        # 布尔模式下 ngram 把每个带引号的词当作短语检索，+ 表示必须命中
+        against = " ".join('+"' + term.replace('"', '') + '"' for term in indexed)
+        score = match(Transaction.remark, against=against).in_boolean_mode()
+        query = query.filter(score > 0)
+    elif backend == 'fts5' and indexed:
+        # 每个词作为短语加引号，避免用户输入被解析为 FTS5 查询语法；多个短语为 AND 关系
+        phrase = " ".join('"' + term.replace('"', '""') + '"' for term in indexed)
+        query = query.join(_fts, _fts.c.rowid == Transaction.id).filter(
+            literal_column(SQLITE_FTS_TABLE).op('MATCH')(phrase)
+        )
+        score = -literal_column(f"bm25({SQLITE_FTS_TABLE})")
+    
+    for term in terms:
+        if term not in indexed:
+            query = query.filter(Transaction.remark.like(_like_pattern(term), escape='\\'))
+    
+    if score is not None:
+        rows = query.add_columns(score.label('score')).order_by(
+            text('score DESC'),
+            Transaction.transaction_date.desc(),
+            Transaction.id.desc()
+        ).offset(skip).limit(limit).all()
+        return backend if indexed else 'like', [(txn, float(value)) for txn, value in rows]
+    
+    transactions = query.order_by(
+        Transaction.transaction_date.desc(),
+        Transaction.id.desc()
+    ).offset(skip).limit(limit).all()
+    return 'like', [(txn, None) for txn in transactions]
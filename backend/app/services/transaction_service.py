@@ -0,0 +1,305 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import case, delete, insert, update
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.models.transaction import Transaction
+from app.models.transaction_split import TransactionSplit
+from app.models.wallet import Wallet
+from app.models.wallet_flow import WalletFlow
+from app.models.wallet_member import WalletMember
+from app.models.member import Member
+from app.schemas.transaction import ExpenseCreate, DepositCreate, TransactionUpdate
+from app.services.split_engine import SplitError, amount_to_cents, compute_split
+
+
+class TransactionError(ValueError):
+    """交易参数不合法（由接口层转换为400）"""
+
+
+class TransactionService:
+    """记账服务 - 在一个数据库事务内写入交易、分摊明细、余额流水并更新钱包成员余额（不提交，由调用方连同统计一起提交）"""
+    
+    @staticmethod
+    def compute_shares(
+        amount: float,
+        split_method: str,
+        split_members: Optional[List[int]],
+        split_ratios: Optional[Dict[int, float]],
+        wallet_member_ids: List[int]
+    ) -> Dict[int, int]:
+        """按分摊方式计算每位成员的份额（分），最大余数法取整，各份额之和等于交易金额；份额为0的成员不计入"""
+        try:
+            shares = compute_split(
+                amount_to_cents(amount),
+                split_method,
+                split_members=split_members,
+                split_ratios=split_ratios,
+                default_members=wallet_member_ids
+            )
+        except SplitError as e:
+            raise TransactionError(str(e))
+        return {member_id: cents for member_id, cents in shares.items() if cents > 0}
+    
+    @staticmethod
+    def _lock_balances(wallet_id: int, member_ids, db: Session) -> Dict[int, float]:
+        """锁定并读取钱包成员余额，用于生成流水的变更前后余额"""
+        return dict(db.query(
+            WalletMember.member_id,
+            WalletMember.balance
+        ).filter(
+            WalletMember.wallet_id == wallet_id,
+            WalletMember.member_id.in_(member_ids)
+        ).with_for_update().all())
+    
+    @staticmethod
+    def _adjust_balances(wallet_id: int, deltas: Dict[int, float], now: datetime, db: Session):
+        """一条UPDATE原地加减所有成员余额（balance = balance + CASE member_id ...）"""
+        db.execute(
+            update(WalletMember).where(
+                WalletMember.wallet_id == wallet_id,
+                WalletMember.member_id.in_(list(deltas))
+            ).values(
+                balance=WalletMember.balance + case(deltas, value=WalletMember.member_id, else_=0.0),
+                updated_at=now
+            ).execution_options(synchronize_session=False)
+        )
+    
+    @staticmethod
+    def _wallet_member_ids(wallet_id: int, db: Session) -> List[int]:
+        return [member_id for member_id, in db.query(WalletMember.member_id).filter(
+            WalletMember.wallet_id == wallet_id
+        ).all()]
+    
+    @staticmethod
+    def _book_expense(transaction: Transaction, shares: Dict[int, int], split_method: str, now: datetime, db: Session):
+        """按份额（分）批量写入分摊明细与扣款流水，并一条UPDATE扣减钱包成员余额"""
+        balances = TransactionService._lock_balances(transaction.wallet_id, list(shares), db)
+        missing = sorted(set(shares) - set(balances))
+        if missing:
+            raise TransactionError(f"成员不在该钱包中: {missing}")
+        
+        db.execute(insert(TransactionSplit), [
+            {
+                "transaction_id": transaction.id,
+                "member_id": member_id,
+                "amount": cents / 100,
+                "split_method": split_method,
+                "created_at": now
+            }
+            for member_id, cents in shares.items()
+        ])
+        db.execute(insert(WalletFlow), [
+            {
+                "wallet_id": transaction.wallet_id,
+                "transaction_id": transaction.id,
+                "member_id": member_id,
+                "flow_type": "expense_out",
+                "amount": cents / 100,
+                "balance_before": balances[member_id],
+                "balance_after": balances[member_id] - cents / 100,
+                "created_at": now
+            }
+            for member_id, cents in shares.items()
+        ])
+        TransactionService._adjust_balances(
+            transaction.wallet_id,
+            {member_id: -cents / 100 for member_id, cents in shares.items()},
+            now,
+            db
+        )
+    
+    @staticmethod
+    def _book_deposit(transaction: Transaction, now: datetime, db: Session):
+        """写入存入流水并增加存入成员（payer_id）在钱包中的余额，首次存入时创建钱包成员"""
+        member_id = transaction.payer_id
+        balances = TransactionService._lock_balances(transaction.wallet_id, [member_id], db)
+        if member_id not in balances:
+            db.add(WalletMember(wallet_id=transaction.wallet_id, member_id=member_id, balance=0.0))
+            db.flush()
+            balances[member_id] = 0.0
+        
+        db.execute(insert(WalletFlow), [{
+            "wallet_id": transaction.wallet_id,
+            "transaction_id": transaction.id,
+            "member_id": member_id,
+            "flow_type": "deposit_in",
+            "amount": transaction.amount,
+            "balance_before": balances[member_id],
+            "balance_after": balances[member_id] + transaction.amount,
+            "created_at": now
+        }])
+        TransactionService._adjust_balances(transaction.wallet_id, {member_id: transaction.amount}, now, db)
+    
+    @staticmethod
+    def _reverse_ledger(transaction: Transaction, now: datetime, db: Session) -> bool:
+        """
+        撤销交易的记账：按余额流水把扣减/存入的金额加回或减去，再删除流水与分摊明细
+        
+        每个钱包一次加锁、一条UPDATE；返回交易是否有余额流水（普通交易没有，只删除分摊明细）。
+        """
+        flows = db.query(
+            WalletFlow.wallet_id,
+            WalletFlow.member_id,
+            WalletFlow.flow_type,
+            WalletFlow.amount
+        ).filter(WalletFlow.transaction_id == transaction.id).all()
+        
+        deltas = defaultdict(lambda: defaultdict(float))
+        for wallet_id, member_id, flow_type, amount in flows:
+            deltas[wallet_id][member_id] += amount if flow_type == "expense_out" else -amount
+        for wallet_id, member_deltas in deltas.items():
+            TransactionService._lock_balances(wallet_id, list(member_deltas), db)
+            TransactionService._adjust_balances(wallet_id, dict(member_deltas), now, db)
+        
+        db.execute(delete(WalletFlow).where(WalletFlow.transaction_id == transaction.id))
+        db.execute(delete(TransactionSplit).where(TransactionSplit.transaction_id == transaction.id))
+        return bool(flows)
+    
+    @staticmethod
+    def create_expense(data: ExpenseCreate, db: Session) -> Tuple[Transaction, List[TransactionSplit]]:
+        """
+        创建支出：计算分摊，批量写入分摊明细与扣款流水，并原地扣减钱包成员余额
+        
+        语句数与分摊人数无关：钱包、付款人、钱包成员（加锁）各查询1次，交易、分摊、流水各插入1次，
+        余额更新1次。只写入当前事务（不提交），由调用方连同统计一起提交。
+        """
+        wallet = db.query(Wallet).filter(Wallet.id == data.wallet_id).first()
+        if not wallet or wallet.trip_id != data.trip_id:
+            raise TransactionError("钱包不存在或不属于该行程")
+        if not db.query(Member.id).filter(Member.id == data.payer_id, Member.trip_id == data.trip_id).scalar():
+            raise TransactionError("付款人不属于该行程")
+        
+        shares = TransactionService.compute_shares(
+            data.amount,
+            data.split_method,
+            data.split_members,
+            data.split_ratios,
+            TransactionService._wallet_member_ids(data.wallet_id, db)
+        )
+        
+        now = datetime.now()
+        transaction = Transaction(
+            trip_id=data.trip_id,
+            wallet_id=data.wallet_id,
+            category_id=data.category_id,
+            transaction_type="expense",
+            amount=data.amount,
+            payer_id=data.payer_id,
+            transaction_date=datetime.strptime(data.transaction_date, '%Y-%m-%d'),
+            remark=data.remark,
+            created_at=now
+        )
+        db.add(transaction)
+        db.flush()
+        TransactionService._book_expense(transaction, shares, data.split_method, now, db)
+        
+        splits = db.query(TransactionSplit).filter(TransactionSplit.transaction_id == transaction.id).all()
+        return transaction, splits
+    
+    @staticmethod
+    def create_deposit(data: DepositCreate, db: Session) -> Transaction:
+        """创建存入：写入交易与存入流水，并原地增加成员在钱包中的余额（首次存入时创建钱包成员），不提交"""
+        wallet = db.query(Wallet).filter(Wallet.id == data.wallet_id).first()
+        if not wallet:
+            raise TransactionError("钱包不存在")
+        if not db.query(Member.id).filter(Member.id == data.member_id, Member.trip_id == wallet.trip_id).scalar():
+            raise TransactionError("成员不属于该行程")
+        
+        now = datetime.now()
+        transaction = Transaction(
+            trip_id=wallet.trip_id,
+            wallet_id=data.wallet_id,
+            category_id=None,
+            transaction_type="deposit",
+            amount=data.amount,
+            payer_id=data.member_id,
+            transaction_date=datetime.strptime(data.transaction_date, '%Y-%m-%d'),
+            remark=data.remark,
+            created_at=now
+        )
+        db.add(transaction)
+        db.flush()
+        TransactionService._book_deposit(transaction, now, db)
+        return transaction
+    
+    @staticmethod
+    def update_transaction(transaction: Transaction, data: TransactionUpdate, db: Session) -> Transaction:
+        """
+        修改交易（不提交）
+        
+        通过 /expense、/deposit 记账的交易（有余额流水）修改金额、钱包或分摊方式时，先按流水撤销原记账，
+        再按新参数重新分摊、写流水并调整余额；未指定分摊参数时沿用原分摊（等额分摊保持原成员，其余按原金额比例）。
+        只改分类、日期、备注，或交易没有余额流水时原地更新。
+        """
+        update_data = data.model_dump(exclude_unset=True)
+        split_spec = {key: update_data.pop(key) for key in ('split_method', 'split_members', 'split_ratios') if key in update_data}
+        if 'transaction_date' in update_data:
+            update_data['transaction_date'] = datetime.strptime(update_data['transaction_date'], '%Y-%m-%d')
+        
+        booked = db.query(WalletFlow.id).filter(WalletFlow.transaction_id == transaction.id).first() is not None
+        if split_spec and not (booked and transaction.transaction_type == "expense"):
+            raise TransactionError("只有分摊支出可以修改分摊方式")
+        rebook = booked and (
+            split_spec
+            or ('amount' in update_data and update_data['amount'] != transaction.amount)
+            or ('wallet_id' in update_data and update_data['wallet_id'] != transaction.wallet_id)
+        )
+        if not rebook:
+            for key, value in update_data.items():
+                setattr(transaction, key, value)
+            db.flush()
+            return transaction
+        
+        wallet_id = update_data.get('wallet_id', transaction.wallet_id)
+        wallet = db.query(Wallet).filter(Wallet.id == wallet_id).first()
+        if not wallet or wallet.trip_id != transaction.trip_id:
+            raise TransactionError("钱包不存在或不属于该行程")
+        old_splits = db.query(
+            TransactionSplit.member_id,
+            TransactionSplit.amount,
+            TransactionSplit.split_method
+        ).filter(TransactionSplit.transaction_id == transaction.id).all()
+        
+        now = datetime.now()
+        TransactionService._reverse_ledger(transaction, now, db)
+        for key, value in update_data.items():
+            setattr(transaction, key, value)
+        db.flush()
+        
+        if transaction.transaction_type == "deposit":
+            TransactionService._book_deposit(transaction, now, db)
+            return transaction
+        
+        old_method = old_splits[0].split_method if old_splits else "equal"
+        wallet_member_ids = TransactionService._wallet_member_ids(transaction.wallet_id, db)
+        if split_spec:
+            split_method = split_spec.get('split_method') or old_method
+            shares = TransactionService.compute_shares(
+                transaction.amount,
+                split_method,
+                split_spec.get('split_members'),
+                split_spec.get('split_ratios'),
+                wallet_member_ids
+            )
+        else:
+            # 沿用原分摊：等额分摊保持原成员；按比例、自定义分摊按原分摊金额的比例重新分摊
+            split_method = old_method
+            old_amounts = {member_id: amount for member_id, amount, _ in old_splits}
+            shares = TransactionService.compute_shares(
+                transaction.amount,
+                "equal" if split_method == "equal" or not old_amounts else "ratio",
+                list(old_amounts) or None,
+                old_amounts,
+                wallet_member_ids
+            )
+        TransactionService._book_expense(transaction, shares, split_method, now, db)
+        return transaction
+    
+    @staticmethod
+    def delete_transaction(transaction: Transaction, db: Session):
+        """删除交易（不提交）：按流水恢复钱包成员余额，删除流水、分摊明细与交易本身"""
+        TransactionService._reverse_ledger(transaction, datetime.now(), db)
+        db.delete(transaction)
+        db.flush()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+列表接口读取基准测试 - 比较常规模式与轻量模式（fast=true）的吞吐量
+运行方式: python3 bench_reads.py [--transactions 20000] [--trips 200] [--rounds 10]
+
+在内存 SQLite 中生成测试数据，通过 TestClient 走完整的请求处理流程（查询、组装、校验、JSON 编码），
+并校验两种模式返回的数据一致。
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base, get_db
+from app.core.fast_json import orjson
+from app.models import Category, Member, Trip, Wallet
+from app.models.transaction import Transaction
+from app.models.transaction_split import TransactionSplit
+from app.models.wallet_member import WalletMember
+from main import app
+
+
+def seed(session_factory, trips: int, transactions: int, rng: random.Random):
+    db = session_factory()
+    now = datetime.now()
+    db.execute(insert(Category), [{"name": f"分类{i}", "type": "expense", "sort_order": i} for i in range(1, 8)])
+    db.execute(insert(Trip), [
+        {"name": f"行程{i}", "status": "ongoing", "start_date": now, "end_date": now + timedelta(days=5),
+         "created_at": now - timedelta(minutes=i), "updated_at": now}
+        for i in range(trips)
+    ])
+    db.execute(insert(Member), [{"name": f"成员{t}-{i}", "trip_id": t + 1} for t in range(trips) for i in range(5)])
+    db.execute(insert(Wallet), [
+        {"name": f"钱包{t}-{i}", "trip_id": t + 1, "created_at": now, "updated_at": now}
+        for t in range(trips) for i in range(2)
+    ])
+    db.execute(insert(WalletMember), [
+        {"wallet_id": t * 2 + w + 1, "member_id": t * 5 + m + 1, "balance": float(rng.randint(0, 5000))}
+        for t in range(trips) for w in range(2) for m in range(5)
+    ])
+    rows = []
+    for i in range(transactions):
+        trip = i % trips
+        rows.append({
+            "trip_id": trip + 1,
+            "wallet_id": trip * 2 + rng.randint(1, 2),
+            "category_id": rng.randint(1, 7),
+            "transaction_type": "expense",
+            "amount": round(rng.uniform(1, 500), 2),
+            "payer_id": trip * 5 + rng.randint(1, 5),
+            "transaction_date": now - timedelta(days=rng.randint(0, 30)),
+            "remark": f"备注{i}",
+            "created_at": now
+        })
+    db.execute(insert(Transaction), rows)
+    db.execute(insert(TransactionSplit), [
+        {"transaction_id": i + 1, "member_id": (i % trips) * 5 + m + 1, "amount": 1.0, "split_method": "equal",
+         "created_at": now}
+        for i in range(transactions) for m in range(5)
+    ])
+    db.commit()
+    db.close()
+
+
+def measure(client: TestClient, path: str, params: dict, rounds: int):
+    timings, payload = [], None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        response = client.get(path, params=params)
+        timings.append(time.perf_counter() - started)
+        response.raise_for_status()
+        payload = response.json()
+    return payload, sorted(timings)[len(timings) // 2]
+
+
+def run(trips: int, transactions: int, rounds: int, seed_value: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    seed(session_factory, trips, transactions, random.Random(seed_value))
+    
+    def override_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+    
+    app.dependency_overrides[get_db] = override_db
+    client = TestClient(app)
+    
+    cases = [
+        ("交易列表", "/api/transactions/", {"trip_id": 1, "limit": 1000}),
+        ("交易列表(全部行程)", "/api/transactions/", {"limit": 1000}),
+        ("交易列表+分摊", "/api/transactions/", {"limit": 1000, "include": "splits"}),
+        ("行程列表", "/api/trips/", {}),
+        ("钱包列表", "/api/wallets/", {}),
+    ]
+    print(f"JSON 编码器: {'orjson' if orjson is not None else 'json（未安装 orjson）'}")
+    print(f"{'接口':<16}{'行数':>8}{'常规(ms)':>12}{'轻量(ms)':>12}{'常规 行/秒':>14}{'轻量 行/秒':>14}{'提升':>8}{'一致':>6}")
+    print("-" * 92)
+    for name, path, params in cases:
+        normal, normal_time = measure(client, path, params, rounds)
+        fast, fast_time = measure(client, path, {**params, "fast": "true"}, rounds)
+        rows = len(normal)
+        same = json.dumps(normal, sort_keys=True) == json.dumps(fast, sort_keys=True)
+        print(
+            f"{name:<16}{rows:>8}{normal_time * 1000:>12.1f}{fast_time * 1000:>12.1f}"
+            f"{rows / normal_time:>14.0f}{rows / fast_time:>14.0f}{normal_time / fast_time:>7.1f}x{'是' if same else '否':>6}"
+        )
+    app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="列表接口读取基准测试")
+    parser.add_argument("--trips", type=int, default=200, help="行程数")
+    parser.add_argument("--transactions", type=int, default=20000, help="交易数")
+    parser.add_argument("--rounds", type=int, default=10, help="每个接口的请求次数（取中位数）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+    
+    run(trips=args.trips, transactions=args.transactions, rounds=args.rounds, seed_value=args.seed)
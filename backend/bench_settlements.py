@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+结算方案求解基准测试 - 比较各策略在不同人数下的转账笔数与求解耗时
+运行方式: python3 bench_settlements.py [--sizes 5,10,15,30,80] [--rounds 5] [--time-budget 0.5]
+
+- random: 完全随机的净额（通常不存在零和子组，各策略转账数接近 n-1）
+- clustered: 由若干2~4人零和小组打乱组成（模拟多次AA小账），最少转账数明显低于贪心
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.services.settlement import EXACT_MAX_MEMBERS, solve_settlements
+
+
+def random_balances(n: int, rng: random.Random) -> dict:
+    values = [rng.randint(-50000, 50000) for _ in range(n - 1)]
+    values.append(-sum(values))
+    return dict(enumerate(values, start=1))
+
+
+def clustered_balances(n: int, rng: random.Random) -> dict:
+    values = []
+    while len(values) < n:
+        size = min(rng.randint(2, 4), n - len(values))
+        if size == 1:
+            # 剩下一人无法单独成组，视为已结清
+            values.append(0)
+            break
+        group = [rng.randint(-30000, 30000) for _ in range(size - 1)]
+        group.append(-sum(group))
+        values.extend(group)
+    rng.shuffle(values)
+    return dict(enumerate(values, start=1))
+
+
+def run(sizes, rounds, time_budget, seed):
+    rng = random.Random(seed)
+    print(f"{'场景':<10}{'人数':>6}{'策略':>12}{'平均转账数':>12}{'平均耗时(ms)':>14}{'最大耗时(ms)':>14}")
+    print("-" * 68)
+    for scenario, generate in (("random", random_balances), ("clustered", clustered_balances)):
+        for n in sizes:
+            cases = [generate(n, rng) for _ in range(rounds)]
+            strategies = ['greedy', 'heuristic', 'auto']
+            if n <= EXACT_MAX_MEMBERS:
+                strategies.insert(1, 'exact')
+            for strategy in strategies:
+                counts, timings = [], []
+                for balances in cases:
+                    started = time.perf_counter()
+                    transfers = solve_settlements(balances, strategy, time_budget)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    counts.append(len(transfers))
+                print(
+                    f"{scenario:<10}{n:>6}{strategy:>12}"
+                    f"{sum(counts) / len(counts):>12.1f}"
+                    f"{sum(timings) / len(timings):>14.2f}{max(timings):>14.2f}"
+                )
+        print("-" * 68)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="结算方案求解基准测试")
+    parser.add_argument("--sizes", default="5,8,10,12,14,16,30,50,80", help="逗号分隔的人数列表")
+    parser.add_argument("--rounds", type=int, default=5, help="每个人数的随机样本数")
+    parser.add_argument("--time-budget", type=float, default=0.5, help="求解时间预算（秒）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+    
+    run(
+        sizes=[int(size) for size in args.sizes.split(',') if size.strip()],
+        rounds=args.rounds,
+        time_budget=args.time_budget,
+        seed=args.seed
+    )
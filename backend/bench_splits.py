@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+分摊计算基准测试 - 测量各分摊方式在不同人数下的耗时，并校验份额之和与取整偏差
+运行方式: python3 bench_splits.py [--sizes 2,10,100,500,1000] [--rounds 200]
+
+- 取整偏差：份额与精确值 total * w / W 之差的最大绝对值（分），最大余数法保证小于1分
+- naive: 原按比例分摊算法（逐人截断，误差全部计入最后一人），作为对照
+"""
+
+import argparse
+import random
+import sys
+import time
+from fractions import Fraction
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.services.split_engine import ratio_weights, split_custom, split_equal, split_ratio
+
+
+def naive_ratio(total: int, ratios: dict) -> dict:
+    ratio_total = sum(ratios.values())
+    member_ids = sorted(ratios)
+    shares = {member_id: int(total * ratios[member_id] / ratio_total) for member_id in member_ids}
+    shares[member_ids[-1]] += total - sum(shares.values())
+    return shares
+
+
+def max_deviation(total: int, ratios: dict, shares: dict) -> float:
+    member_ids = sorted(ratios)
+    weights = dict(zip(member_ids, ratio_weights([ratios[member_id] for member_id in member_ids])))
+    weight_total = sum(weights.values())
+    return float(max(abs(shares[member_id] - Fraction(total * weights[member_id], weight_total)) for member_id in member_ids))
+
+
+def make_case(n: int, rng: random.Random) -> tuple:
+    total = rng.randint(100, 10_000_000)
+    ratios = {member_id: round(rng.uniform(0.1, 5.0), rng.randint(0, 3)) or 1.0 for member_id in range(1, n + 1)}
+    cut = sorted(rng.sample(range(1, total), n - 1)) if total > n else []
+    bounds = [0] + cut + [total]
+    amounts = {member_id: (bounds[member_id] - bounds[member_id - 1]) / 100 for member_id in range(1, n + 1)} if cut else None
+    return total, ratios, amounts
+
+
+def timed(func, cases) -> tuple:
+    started = time.perf_counter()
+    results = [func(case) for case in cases]
+    return (time.perf_counter() - started) * 1_000_000 / len(cases), results
+
+
+def run(sizes, rounds, seed):
+    rng = random.Random(seed)
+    print(f"{'人数':>6}{'方式':>10}{'平均耗时(μs)':>14}{'总和一致':>10}{'最大偏差(分)':>14}")
+    print("-" * 56)
+    for n in sizes:
+        cases = [make_case(n, rng) for _ in range(rounds)]
+        methods = [
+            ("equal", lambda case: split_equal(case[0], case[1].keys())),
+            ("ratio", lambda case: split_ratio(case[0], case[1])),
+            ("naive", lambda case: naive_ratio(case[0], case[1])),
+        ]
+        if all(case[2] for case in cases):
+            methods.append(("custom", lambda case: split_custom(case[0], case[2])))
+        for name, func in methods:
+            micros, results = timed(func, cases)
+            exact = all(sum(shares.values()) == case[0] for case, shares in zip(cases, results))
+            deviation = "-"
+            if name in ("ratio", "naive"):
+                deviation = f"{max(max_deviation(case[0], case[1], shares) for case, shares in zip(cases, results)):.2f}"
+            print(f"{n:>6}{name:>10}{micros:>14.1f}{'是' if exact else '否':>10}{deviation:>14}")
+        print("-" * 56)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分摊计算基准测试")
+    parser.add_argument("--sizes", default="2,5,10,50,100,500,1000", help="逗号分隔的人数列表")
+    parser.add_argument("--rounds", type=int, default=200, help="每个人数的随机样本数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+    
+    run(
+        sizes=[int(size) for size in args.sizes.split(',') if size.strip()],
+        rounds=args.rounds,
+        seed=args.seed
+    )
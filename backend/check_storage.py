@@ -20,9 +20,9 @@ def check_storage_format():
             print("📊 trip_stats表:")
             print(f"  trip_id: {row[0]}")
             print(f"  category_totals 类型: {type(row[1])}")
-            print(f"  category_totals 内容: {row[1][:100]}...")
+            print(f"  category_totals 内容: {str(row[1])[:100]}...")
             print(f"  category_ratios 类型: {type(row[2])}")
-            print(f"  category_ratios 内容: {row[2][:100]}...")
+            print(f"  category_ratios 内容: {str(row[2])[:100]}...")
             print()
         
         # 检查member_stats表
@@ -32,7 +32,7 @@ def check_storage_format():
             print("👥 member_stats表:")
             print(f"  member_id: {row[0]}")
             print(f"  by_category 类型: {type(row[1])}")
-            print(f"  by_category 内容: {row[1][:100]}...")
+            print(f"  by_category 内容: {str(row[1])[:100]}...")
             print(f"  by_wallet 类型: {type(row[2])}")
             print()
         
@@ -43,10 +43,10 @@ def check_storage_format():
             print("💰 wallet_stats表:")
             print(f"  wallet_id: {row[0]}")
             print(f"  balance_by_member 类型: {type(row[1])}")
-            print(f"  balance_by_member 内容: {row[1][:100]}...")
+            print(f"  balance_by_member 内容: {str(row[1])[:100]}...")
             print()
         
-        print("✅ 验证完成：JSON对象以TEXT字符串形式存储在数据库中")
+        print("✅ 验证完成：汇总字段以原生JSON列存储（键为分类/钱包/成员ID）")
 
 
 if __name__ == "__main__":
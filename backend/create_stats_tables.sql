@@ -5,8 +5,8 @@ CREATE TABLE IF NOT EXISTS trip_stats (
     total_expense FLOAT DEFAULT 0.0 COMMENT '总支出',
     average_expense FLOAT DEFAULT 0.0 COMMENT '人均支出',
     member_count INT DEFAULT 0 COMMENT '成员数量',
-    category_totals JSON COMMENT '分类汇总',
-    category_ratios JSON COMMENT '分类占比',
+    category_totals JSON COMMENT '分类汇总（键为分类ID）',
+    category_ratios JSON COMMENT '分类占比（键为分类ID）',
     transaction_count INT DEFAULT 0 COMMENT '交易总数',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
@@ -22,8 +22,8 @@ CREATE TABLE IF NOT EXISTS member_stats (
     member_id INT NOT NULL,
     member_name VARCHAR(100) COMMENT '成员名称冗余字段',
     total_amount FLOAT DEFAULT 0.0 COMMENT '总支出',
-    by_category JSON COMMENT '按分类统计',
-    by_wallet JSON COMMENT '按钱包统计',
+    by_category JSON COMMENT '按分类统计（键为分类ID）',
+    by_wallet JSON COMMENT '按钱包统计（键为钱包ID）',
     should_pay FLOAT DEFAULT 0.0 COMMENT '应付金额（平均值）',
     actual_paid FLOAT DEFAULT 0.0 COMMENT '实际支付金额',
     balance FLOAT DEFAULT 0.0 COMMENT '差额（实际-应付）',
@@ -42,7 +42,7 @@ CREATE TABLE IF NOT EXISTS wallet_stats (
     trip_id INT NOT NULL,
     wallet_id INT NOT NULL UNIQUE,
     wallet_name VARCHAR(100) COMMENT '钱包名称冗余字段',
-    balance_by_member JSON COMMENT '成员余额',
+    balance_by_member JSON COMMENT '成员余额（键为成员ID）',
     total_balance FLOAT DEFAULT 0.0 COMMENT '总余额',
     transaction_count INT DEFAULT 0 COMMENT '交易数量',
     total_deposited FLOAT DEFAULT 0.0 COMMENT '总存入',
@@ -56,3 +56,19 @@ CREATE TABLE IF NOT EXISTS wallet_stats (
     FOREIGN KEY (trip_id) REFERENCES trips(id) ON DELETE CASCADE,
     FOREIGN KEY (wallet_id) REFERENCES wallets(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='钱包统计表';
+
+-- 创建按日支出汇总表
+CREATE TABLE IF NOT EXISTS daily_stats (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    trip_id INT NOT NULL,
+    day DATE NOT NULL COMMENT '交易日期',
+    category_id INT NOT NULL COMMENT '分类ID',
+    member_id INT NOT NULL COMMENT '成员ID',
+    amount FLOAT DEFAULT 0.0 COMMENT '当日分摊金额',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX ix_daily_stats_trip_day (trip_id, day),
+    INDEX ix_daily_stats_updated_at (updated_at),
+    UNIQUE INDEX ix_daily_stats_trip_day_category_member (trip_id, day, category_id, member_id),
+    FOREIGN KEY (trip_id) REFERENCES trips(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='按日支出汇总表';
@@ -1,10 +1,12 @@
 from app.core.database import engine, Base, SessionLocal
 from app.models import Category, Trip, Member, Wallet
+from app.services.transaction_search import ensure_search_index
 from datetime import datetime, timedelta
 
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    ensure_search_index(engine)
     db = SessionLocal()
     
     existing_categories = db.query(Category).first()
@@ -1,59 +1,73 @@
 #!/usr/bin/env python3
 """
-初始化统计表 - 为现有行程数据生成统计记录
-运行方式: python3 init_stats.py
+初始化/重建统计表 - 为现有行程数据生成统计记录
+运行方式: python3 init_stats.py [--workers 8] [--chunk-size 50] [--since 2024-01-01] [--reset]
+
+- 多线程并行重建，每个worker处理一个行程ID区间并使用独立的数据库会话
+- 进度写入检查点文件，中断后重跑自动跳过已完成的行程（全部成功后自动清除）
+- --since 只重建该时间之后有变更的行程：行程更新、新增交易、统计版本号递增（交易增删改）、
+  登记过统计重算（成员、钱包、钱包余额变更）
 """
 
+import argparse
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from sqlalchemy.orm import Session
-from app.core.database import engine, SessionLocal
-from app.models.trip import Trip
-from app.services.stats_service import StatsService
+from dateutil.parser import parse
+from app.core.config import settings
+from app.services.stats_rebuild import rebuild_stats
+
 
+DEFAULT_CHECKPOINT = settings.DATA_DIR / "stats_rebuild_checkpoint.json"
 
-def init_all_stats():
+
+def init_all_stats(workers=4, chunk_size=50, since=None, checkpoint_path=DEFAULT_CHECKPOINT, reset=False):
     """为所有现有行程生成统计数据"""
-    db: Session = SessionLocal()
     try:
         print("🔍 开始查找现有行程...")
+        result = rebuild_stats(
+            workers=workers,
+            chunk_size=chunk_size,
+            since=since,
+            checkpoint_path=checkpoint_path,
+            reset=reset
+        )
         
-        # 获取所有行程
-        trips = db.query(Trip).all()
-        
-        if not trips:
-            print("❌ 数据库中没有行程数据")
+        if result['total'] == 0:
+            print("❌ 数据库中没有需要处理的行程数据")
             return
         
-        print(f"✅ 找到 {len(trips)} 个行程")
-        
-        success_count = 0
-        failed_count = 0
-        
-        for trip in trips:
-            print(f"\n📊 正在处理行程: {trip.name} (ID: {trip.id})")
-            try:
-                StatsService.update_all_stats(trip.id, db)
-                print(f"✅ 行程 {trip.name} 统计数据生成成功")
-                success_count += 1
-            except Exception as e:
-                print(f"❌ 行程 {trip.name} 统计数据生成失败: {e}")
-                failed_count += 1
-        
         print(f"\n{'='*50}")
         print(f"📈 初始化完成")
-        print(f"✅ 成功: {success_count} 个行程")
-        print(f"❌ 失败: {failed_count} 个行程")
+        print(f"⏭️  跳过: {result['skipped']} 个行程（检查点已完成）")
+        print(f"✅ 成功: {result['success']} 个行程")
+        print(f"❌ 失败: {result['failed']} 个行程")
+        print(f"⚡ 耗时: {result['elapsed_seconds']:.1f} 秒，{result['trips_per_second']:.1f} 行程/秒")
+        for trip_id, error in result['failures']:
+            print(f"   - 行程 {trip_id}: {error}")
+        if result['failed']:
+            print(f"💡 重新运行将跳过已成功的行程，检查点: {checkpoint_path}")
         print(f"{'='*50}")
         
     except Exception as e:
         print(f"❌ 初始化失败: {e}")
-    finally:
-        db.close()
 
 
 if __name__ == "__main__":
-    init_all_stats()
+    parser = argparse.ArgumentParser(description="并行重建行程统计数据")
+    parser.add_argument("--workers", type=int, default=4, help="并行worker数量")
+    parser.add_argument("--chunk-size", type=int, default=50, help="每个区间包含的行程数")
+    parser.add_argument("--since", type=parse, default=None, help="只重建该时间之后有变更的行程（行程更新、新增/修改/删除交易、成员或钱包变更）")
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT, help="检查点文件路径")
+    parser.add_argument("--reset", action="store_true", help="忽略已有检查点，从头重建")
+    args = parser.parse_args()
+    
+    init_all_stats(
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        since=args.since,
+        checkpoint_path=args.checkpoint,
+        reset=args.reset
+    )
@@ -5,6 +5,7 @@ from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.core.logging import setup_logging, get_logger
 from app.api import categories, transactions, trips, members, wallets, stats, wallet_flows, reconciliation
+from app.services.stats_queue import StatsRefreshWorker
 
 logger = get_logger(__name__)
 
@@ -13,8 +14,17 @@ logger = get_logger(__name__)
 async def lifespan(app: FastAPI):
     setup_logging(log_dir=settings.DATA_DIR)
     logger.info("Application starting up...")
+    
+    stats_worker = None
+    if settings.STATS_QUEUE_ENABLED:
+        stats_worker = StatsRefreshWorker()
+        stats_worker.start()
+    
     yield
+    
     logger.info("Application shutting down...")
+    if stats_worker:
+        stats_worker.stop()
 
 
 app = FastAPI(
@@ -30,6 +40,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 app.include_router(categories.router, prefix="/api/categories", tags=["分类"])
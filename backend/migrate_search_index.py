@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+创建交易备注全文索引
+
+运行方式:
+  python3 migrate_search_index.py            创建索引（已存在则跳过）
+  python3 migrate_search_index.py --rebuild  SQLite 下从 transactions 重新回填 FTS5 索引
+
+- MySQL: transactions.remark 上的 FULLTEXT 索引（ngram 分词，支持中文），InnoDB 随写入自动维护
+- SQLite: FTS5 trigram 外部内容表 transactions_fts，由触发器随交易增删改同步
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.database import engine
+from app.services.transaction_search import ensure_search_index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="交易备注全文索引迁移")
+    parser.add_argument("--rebuild", action="store_true", help="重新回填索引（SQLite FTS5）")
+    args = parser.parse_args()
+    
+    print("🔎 创建交易备注全文索引...")
+    mode = ensure_search_index(engine, rebuild=args.rebuild)
+    print(f"✅ 完成，当前检索方式: {mode}")
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 """
 创建统计表的迁移脚本（无外键约束版本）
+
+运行方式:
+  python3 migrate_stats_tables.py          删除并重建统计表（首次部署/表结构变更）
+  python3 migrate_stats_tables.py --swap   在影子表中重建数据后原子替换，重建期间读接口不受影响
 """
 
+import argparse
 import sys
 from pathlib import Path
 
@@ -10,13 +15,15 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from sqlalchemy import text
 from app.core.database import engine
+from app.services.stats_shadow import rebuild_with_swap
 
 
 def create_stats_tables():
-    """创建统计表（JSON对象以Text字符串存储）"""
+    """创建统计表（分类/钱包/成员维度的汇总使用原生JSON列，以ID为键）"""
     
     sql_statements = [
         # 删除旧表（如果存在）
+        "DROP TABLE IF EXISTS daily_stats",
         "DROP TABLE IF EXISTS wallet_stats",
         "DROP TABLE IF EXISTS member_stats",
         "DROP TABLE IF EXISTS trip_stats",
@@ -29,8 +36,8 @@ def create_stats_tables():
             total_expense FLOAT DEFAULT 0.0 COMMENT '总支出',
             average_expense FLOAT DEFAULT 0.0 COMMENT '人均支出',
             member_count INT DEFAULT 0 COMMENT '成员数量',
-            category_totals TEXT COMMENT '分类汇总JSON字符串',
-            category_ratios TEXT COMMENT '分类占比JSON字符串',
+            category_totals JSON COMMENT '分类汇总（键为分类ID）',
+            category_ratios JSON COMMENT '分类占比（键为分类ID）',
             transaction_count INT DEFAULT 0 COMMENT '交易总数',
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
@@ -47,8 +54,8 @@ def create_stats_tables():
             member_id INT NOT NULL,
             member_name VARCHAR(100) COMMENT '成员名称冗余字段',
             total_amount FLOAT DEFAULT 0.0 COMMENT '总支出',
-            by_category TEXT COMMENT '按分类统计JSON字符串',
-            by_wallet TEXT COMMENT '按钱包统计JSON字符串',
+            by_category JSON COMMENT '按分类统计（键为分类ID）',
+            by_wallet JSON COMMENT '按钱包统计（键为钱包ID）',
             should_pay FLOAT DEFAULT 0.0 COMMENT '应付金额（平均值）',
             actual_paid FLOAT DEFAULT 0.0 COMMENT '实际支付金额',
             balance FLOAT DEFAULT 0.0 COMMENT '差额（实际-应付）',
@@ -67,7 +74,7 @@ def create_stats_tables():
             trip_id INT NOT NULL,
             wallet_id INT NOT NULL UNIQUE,
             wallet_name VARCHAR(100) COMMENT '钱包名称冗余字段',
-            balance_by_member TEXT COMMENT '成员余额JSON字符串',
+            balance_by_member JSON COMMENT '成员余额（键为成员ID）',
             total_balance FLOAT DEFAULT 0.0 COMMENT '总余额',
             transaction_count INT DEFAULT 0 COMMENT '交易数量',
             total_deposited FLOAT DEFAULT 0.0 COMMENT '总存入',
@@ -79,6 +86,23 @@ def create_stats_tables():
             INDEX idx_wallet_stats_wallet_id (wallet_id),
             INDEX idx_wallet_stats_updated_at (updated_at)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='钱包统计表'
+        """,
+        
+        # 创建daily_stats表
+        """
+        CREATE TABLE daily_stats (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            trip_id INT NOT NULL,
+            day DATE NOT NULL COMMENT '交易日期',
+            category_id INT NOT NULL COMMENT '分类ID',
+            member_id INT NOT NULL COMMENT '成员ID',
+            amount FLOAT DEFAULT 0.0 COMMENT '当日分摊金额',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX ix_daily_stats_trip_day (trip_id, day),
+            INDEX ix_daily_stats_updated_at (updated_at),
+            UNIQUE INDEX ix_daily_stats_trip_day_category_member (trip_id, day, category_id, member_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='按日支出汇总表'
         """
     ]
     
@@ -94,5 +118,23 @@ def create_stats_tables():
     print("\n✅ 统计表迁移完成")
 
 
+def swap_rebuild_stats_tables(workers: int = 4, chunk_size: int = 50):
+    """零停机重建：先填充影子表，再原子替换正式统计表"""
+    result = rebuild_with_swap(engine, workers=workers, chunk_size=chunk_size)
+    if result['failed']:
+        print("\n❌ 影子表重建未完成，正式统计表保持不变")
+    else:
+        print(f"\n✅ 统计表零停机重建完成（{result['success']} 个行程，{result['trips_per_second']:.1f} 行程/秒）")
+
+
 if __name__ == "__main__":
-    create_stats_tables()
+    parser = argparse.ArgumentParser(description="统计表迁移")
+    parser.add_argument("--swap", action="store_true", help="影子表重建并原子替换（不删除线上表）")
+    parser.add_argument("--workers", type=int, default=4, help="重建并行worker数量（--swap模式）")
+    parser.add_argument("--chunk-size", type=int, default=50, help="每个区间包含的行程数（--swap模式）")
+    args = parser.parse_args()
+    
+    if args.swap:
+        swap_rebuild_stats_tables(workers=args.workers, chunk_size=args.chunk_size)
+    else:
+        create_stats_tables()
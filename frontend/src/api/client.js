@@ -23,8 +23,19 @@ export const apiClient = {
   },
   transactions: {
     list: (params) => api.get('/transactions/', { params }),
+    page: (params) => api.get('/transactions/page', { params }),
+    search: (params) => api.get('/transactions/search', { params }),
+    facets: (params) => api.get('/transactions/facets', { params }),
+    exportUrl: (params) => `${api.defaults.baseURL}/transactions/export?${new URLSearchParams(params)}`,
     get: (id) => api.get(`/transactions/${id}`),
     create: (data) => api.post('/transactions/', data),
+    createExpense: (data) => api.post('/transactions/expense', data),
+    createDeposit: (data) => api.post('/transactions/deposit', data),
+    import: (file, format) => {
+      const form = new FormData()
+      form.append('file', file)
+      return api.post('/transactions/import', form, { params: format ? { format } : {} })
+    },
     update: (id, data) => api.put(`/transactions/${id}`, data),
     delete: (id) => api.delete(`/transactions/${id}`)
   },
@@ -35,6 +46,7 @@ export const apiClient = {
   },
   stats: {
     perPerson: (tripId) => api.get(`/stats/per-person/${tripId}`),
+    batch: (tripIds) => api.get('/stats/batch', { params: tripIds ? { trip_ids: tripIds.join(',') } : {} }),
     walletSummary: (tripId) => api.get(`/stats/wallet-summary/${tripId}`)
   }
 }